@@ -0,0 +1,164 @@
+"""
+Analytics Benchmark
+
+Compares the data processing and metric calculation of e_shop_analytics on a
+synthetic order history (5 million order lines by default):
+- "before": per-row regex city extraction, per-row strftime and separate groupbys
+- "after":  vectorized derivation (order_data.add_derived_columns) and a single
+            grouped aggregation (e_shop_analytics.calculate_metrics)
+
+Both produce the same metric tables, which the benchmark checks.
+
+Usage:
+    python benchmark_analytics.py --rows 5000000
+
+Author: Rytis Bimbiras
+"""
+
+import re                               # For the original city extraction
+import time                             # For timing
+import argparse                         # For command-line options
+import numpy as np                      # For generating the synthetic data
+import pandas as pd                     # For data handling
+
+import e_shop_analytics
+from order_data import add_derived_columns
+
+# =========================
+# Synthetic Order History
+# =========================
+
+CITIES = ["Vilnius", "Kaunas", "Klaipėda", "Šiauliai", "Panevėžys", "Alytus", "Marijampolė", "Mažeikiai"]
+SHOPS = ["k_mega", "v_outlet", "v_ozas"]
+PAYMENT_STATUSES = ["received", "not_received"]
+DELIVERY_METHODS = ["by_courier", "parcel_locker", "pickup_in_store"]
+
+def make_orders(rows, seed=42):
+    """
+    Generates an order history with the columns of orders.xlsx used by the analytics.
+
+    Args:
+        rows (int): Number of order lines
+        seed (int): Random seed
+    Returns:
+        pandas.DataFrame: Synthetic order lines (about two lines per order)
+    """
+    rng = np.random.default_rng(seed)
+    orders = max(1, rows // 2)
+
+    # Order level attributes, every line inherits the attributes of its order
+    order_dates = pd.Timestamp("2022-01-01") + pd.to_timedelta(rng.integers(0, 3 * 365, orders), unit="D")
+    street_numbers = rng.integers(1, 200, orders)
+    order_cities = rng.integers(0, len(CITIES), orders)
+    order_of_line = np.sort(rng.integers(0, orders, rows))
+
+    addresses = pd.Series([f"Gatvės g. {number}, {CITIES[city]}, LT-{10000 + number:05d}"
+                           for number, city in zip(street_numbers, order_cities)])
+    return pd.DataFrame({
+        "order_id": order_of_line + 1,
+        "date": order_dates[order_of_line],
+        "shop": np.array(SHOPS)[rng.integers(0, len(SHOPS), orders)][order_of_line],
+        "address": addresses.to_numpy()[order_of_line],
+        "delivery_method": np.array(DELIVERY_METHODS)[rng.integers(0, len(DELIVERY_METHODS), orders)][order_of_line],
+        "payment_status": np.array(PAYMENT_STATUSES)[rng.integers(0, 2, orders)][order_of_line],
+        "order_processed": np.where(rng.random(orders) < 0.8, "yes", "no")[order_of_line],
+        "ordered_quantity": rng.integers(1, 4, rows),
+        "item_price": rng.integers(5, 300, rows).astype(float),
+    })
+
+# =========================
+# Previous Implementation (for comparison)
+# =========================
+
+def process_data_before(raw_df):
+    # The original process_data: per-row regex and strftime
+    df = raw_df.copy()
+    df['date'] = pd.to_datetime(df['date'], errors='coerce')
+    df['week'] = df['date'].dt.to_period('W').dt.start_time
+    df['month'] = df['date'].dt.strftime('%Y-%m')
+    df['total_price'] = df['item_price'] * df['ordered_quantity']
+
+    def extract_city(address):
+        if pd.isna(address):
+            return 'Unknown'
+        match = re.search(r',\s*([^,]+),\s*LT-\d+', str(address))
+        return match.group(1).strip() if match else 'Unknown'
+
+    df['city'] = df['address'].apply(extract_city)
+    return df
+
+def calculate_metrics_before(clean_df):
+    # The original calculate_metrics: a separate scan of all lines per table
+    metrics = {}
+    for name, key in [('weekly', 'week'), ('monthly', 'month'), ('shop_perf', 'shop')]:
+        table = clean_df.groupby(key).agg(
+            revenue=('total_price', 'sum'),
+            sales=('ordered_quantity', 'sum'),
+            orders=('order_id', 'nunique')
+        ).reset_index()
+        if name != 'shop_perf':
+            table['avg_order_value'] = table['revenue'] / table['orders']
+        metrics[name] = table
+    metrics['payment_month'] = pd.crosstab(clean_df['month'], clean_df['payment_status'])
+    metrics['fulfillment_month'] = pd.crosstab(clean_df['month'], clean_df['order_processed'])
+    metrics['city_month'] = pd.crosstab(clean_df['month'], clean_df['city'])
+    return metrics
+
+# =========================
+# Benchmark
+# =========================
+
+def tables_match(before, after):
+    """
+    Checks two metric tables hold the same labels and (numerically) the same values.
+    """
+    before, after = before.reset_index(), after.reset_index()
+    if list(map(str, before.columns)) != list(map(str, after.columns)) or len(before) != len(after):
+        return False
+    for before_column, after_column in zip(before.columns, after.columns):
+        left, right = before[before_column], after[after_column]
+        if pd.api.types.is_numeric_dtype(left) and pd.api.types.is_numeric_dtype(right):
+            if not np.allclose(left.to_numpy(float), right.to_numpy(float)):
+                return False
+        elif not (left.astype(str).to_numpy() == right.astype(str).to_numpy()).all():
+            return False
+    return True
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+def run_benchmark(rows):
+    """
+    Times both implementations on the same synthetic data and prints the results.
+
+    Args:
+        rows (int): Number of synthetic order lines
+    """
+    print(f"Generating {rows:,} synthetic order lines...")
+    raw_df = make_orders(rows)
+    e_shop_analytics.DEBUG_MODE = False
+
+    clean_before, process_before = timed(process_data_before, raw_df)
+    metrics_before, calculate_before = timed(calculate_metrics_before, clean_before)
+    del clean_before
+
+    clean_after, process_after = timed(add_derived_columns, raw_df)
+    metrics_after, calculate_after = timed(e_shop_analytics.calculate_metrics, clean_after)
+
+    print(f"\n📈 {rows:,} order lines")
+    print(f"   {'':<20}{'before':>10}{'after':>10}")
+    print(f"   {'process_data':<20}{process_before:>9.2f}s{process_after:>9.2f}s")
+    print(f"   {'calculate_metrics':<20}{calculate_before:>9.2f}s{calculate_after:>9.2f}s")
+    total_before, total_after = process_before + calculate_before, process_after + calculate_after
+    print(f"   {'total':<20}{total_before:>9.2f}s{total_after:>9.2f}s  ({total_before / total_after:.1f}× faster)")
+
+    mismatched = [name for name in metrics_before if not tables_match(metrics_before[name], metrics_after[name])]
+    print("✅ All metric tables match" if not mismatched else f"❌ Metric tables differ: {mismatched}")
+
+# Check if script is run directly (not imported)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the analytics processing on synthetic data.")
+    parser.add_argument("--rows", type=int, default=5_000_000, help="Number of synthetic order lines")
+    run_benchmark(parser.parse_args().rows)
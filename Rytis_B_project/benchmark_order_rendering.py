@@ -0,0 +1,166 @@
+"""
+Order Rendering Benchmark
+
+Measures the per-order render time (Word document + PDFs) of e_shop_project:
+- "before": product images attached through temporary JPEG files on disk
+- "after":  product images encoded once and embedded from memory
+
+Images and the logo are served by a local HTTP server, so the benchmark runs
+offline and measures rendering rather than the network.
+
+Usage:
+    python benchmark_order_rendering.py --input orders.xlsx --rounds 3
+
+Author: Rytis Bimbiras
+"""
+
+import os                               # For file and directory operations
+import time                             # For timing the renders
+import argparse                         # For command-line options
+import tempfile                         # For an isolated working directory
+import threading                        # For running the local image server
+import statistics                       # For median / mean render times
+from functools import partial           # For binding the served directory
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler # For serving images locally
+import pandas as pd                     # For reading the orders
+from PIL import Image                   # For generating stand-in product photos
+from docx.shared import Inches          # For attaching images the old way
+
+import e_shop_project
+from image_cache import ImageCache
+
+# =========================
+# Stand-in images and server
+# =========================
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass # Keep the benchmark output readable
+
+#
+# ------------------------------------------------------------
+# Write one photo per distinct image URL plus a logo, and serve them
+# ------------------------------------------------------------
+def serve_stand_in_images(image_urls, directory):
+    """
+    Generates stand-in product photos and serves them from a local HTTP server.
+
+    Args:
+        image_urls (list): Original image URLs of the orders
+        directory (str): Directory the images are written to
+    Returns:
+        tuple: (server, dict mapping each original URL to its local URL, local logo URL)
+    """
+    for index, _ in enumerate(image_urls):
+        # Noise compresses like a real photo, unlike a flat colour
+        Image.effect_noise((800, 800), 40 + index % 50).convert("RGB").save(os.path.join(directory, f"{index}.jpg"))
+    Image.new("RGB", (440, 120), "black").save(os.path.join(directory, "logo.png"))
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(QuietHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    url_map = {url: f"{base_url}/{index}.jpg" for index, url in enumerate(image_urls)}
+    return server, url_map, f"{base_url}/logo.png"
+
+# =========================
+# Old implementation (for comparison)
+# =========================
+
+def attach_image_via_temp_file(document, image, description=None):
+    # The original attach_image_to_document: save, re-read and delete a temporary JPEG
+    if image is None:
+        if description:
+            document.add_paragraph(f"⚠️ {description}")
+        return
+    image_path = f"temp_{os.getpid()}_processed.jpg"
+    image.save(image_path)
+    document.add_picture(image_path, width=Inches(2))
+    os.remove(image_path)
+
+# =========================
+# Benchmark
+# =========================
+
+#
+# ------------------------------------------------------------
+# Render every order once and return the per-order times
+# ------------------------------------------------------------
+def time_orders(orders, images):
+    """
+    Renders all orders in this process, one after another.
+
+    Args:
+        orders (list): (order_id, order_items DataFrame) pairs
+        images (dict): Prefetched images keyed by image URL
+    Returns:
+        list: Render time of every order in seconds
+    """
+    seconds = []
+    for order_id, order_items in orders:
+        start = time.perf_counter()
+        e_shop_project.render_order_documents(order_id, order_items, images)
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+def summarize(name, seconds):
+    print(f"   {name:<7} median {statistics.median(seconds) * 1000:7.1f} ms/order, "
+          f"mean {statistics.mean(seconds) * 1000:7.1f} ms/order, total {sum(seconds):.2f} s")
+
+def run_benchmark(filename, rounds):
+    """
+    Runs the before/after comparison and prints the results.
+
+    Args:
+        filename (str): Path to the orders Excel file
+        rounds (int): How many times every order is rendered per variant
+    """
+    orders_dataframe = pd.read_excel(filename)
+    orders = list(orders_dataframe.groupby("order_id"))
+    image_urls = list(orders_dataframe["image_url"].dropna().unique())
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        image_dir = os.path.join(work_dir, "www")
+        os.makedirs(image_dir)
+        server, url_map, logo_url = serve_stand_in_images(image_urls, image_dir)
+
+        # Point the orders, the logo and the image cache at the local stand-ins
+        orders = [(order_id, order_items.assign(image_url=order_items["image_url"].map(url_map)))
+                  for order_id, order_items in orders]
+        e_shop_project.LOGO_URL = logo_url
+        e_shop_project.IMAGE_CACHE = ImageCache(os.path.join(work_dir, "cache"))
+        e_shop_project.load_invoice_logo.cache_clear()
+
+        # Documents are written to the temporary work directory
+        original_dir = os.getcwd()
+        original_attach = e_shop_project.attach_image_to_document
+        os.chdir(work_dir)
+        try:
+            encoded_images = e_shop_project.prefetch_order_images(orders)
+            pil_images = {url: e_shop_project.download_and_process_image(url) for url in encoded_images}
+
+            before, after = [], []
+            for _ in range(rounds):
+                e_shop_project.attach_image_to_document = attach_image_via_temp_file
+                before += time_orders(orders, pil_images)
+                e_shop_project.attach_image_to_document = original_attach
+                after += time_orders(orders, encoded_images)
+        finally:
+            e_shop_project.attach_image_to_document = original_attach
+            os.chdir(original_dir)
+            server.shutdown()
+            server.server_close()
+
+    print(f"\n📈 Per-order render time ({len(orders)} orders × {rounds} rounds, {len(image_urls)} images)")
+    summarize("before", before)
+    summarize("after", after)
+    print(f"   Speed-up: {statistics.median(before) / statistics.median(after):.2f}× (median)")
+
+# Check if script is run directly (not imported)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark per-order document rendering.")
+    parser.add_argument("--input", default="orders.xlsx", help="Orders Excel file")
+    parser.add_argument("--rounds", type=int, default=3, help="Renders of every order per variant")
+    arguments = parser.parse_args()
+
+    run_benchmark(os.path.abspath(arguments.input), arguments.rounds)
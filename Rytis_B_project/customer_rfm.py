@@ -0,0 +1,179 @@
+"""
+Customer RFM Features
+
+Recency, Frequency and Monetary value per customer for the segmentation script.
+The order dates are converted once and all three metrics come from one grouped
+aggregation, instead of a Python function per customer that re-scanned the whole
+order history for its latest date.
+
+RFMBuilder keeps running per-customer totals, so a later run only has to add the
+orders placed since (update() with the new order lines, save()/load() between runs).
+
+Author: Rytis Bimbiras
+"""
+
+import os                               # For the state directory
+import pandas as pd                     # For data handling
+from joblib import Parallel, delayed    # For running the cluster sweep in parallel
+from sklearn.cluster import KMeans      # For clustering
+from sklearn.metrics import silhouette_score # For evaluating clusters
+
+# =========================
+# Configuration and Constants
+# =========================
+
+RFM_COLUMNS = ['Customer', 'Recency', 'Frequency', 'Monetary']
+
+# Above this many customers the silhouette score is estimated on a random sample
+# (the exact score compares every customer with every other one)
+SILHOUETTE_SAMPLE_SIZE = 10000
+
+# =========================
+# RFM Features
+# =========================
+
+class RFMBuilder:
+    """
+    Keeps running per-customer totals so RFM features can be updated incrementally.
+
+    Example:
+        builder = RFMBuilder()
+        builder.update(orders)          # full history once
+        builder.update(new_orders)      # later: only the orders added since
+        customer_rfm = builder.table()
+    """
+
+    def __init__(self):
+        # Last purchase date and total spent per customer
+        self.customers = pd.DataFrame(
+            {'last_purchase': pd.Series(dtype='datetime64[ns]'), 'monetary': pd.Series(dtype='float64')}
+        ).rename_axis('client')
+        # Every (customer, order) pair seen so far, so an order counts once even if
+        # its lines arrive in different batches
+        self.client_orders = pd.DataFrame({'client': pd.Series(dtype='object'), 'order_id': pd.Series(dtype='int64')})
+        # Latest order date seen, the reference point of Recency
+        self.reference_date = None
+
+    def update(self, orders):
+        """
+        Adds order lines to the running totals.
+
+        Args:
+            orders (pandas.DataFrame): Order lines with client, order_id, date and either
+                total_price or item_price and ordered_quantity
+        Returns:
+            RFMBuilder: self, so calls can be chained
+        """
+        if orders.empty:
+            return self
+
+        # Convert the dates once for the whole batch
+        dates = pd.to_datetime(orders['date'])
+        spent = orders['total_price'] if 'total_price' in orders else orders['item_price'] * orders['ordered_quantity']
+        batch = pd.DataFrame({'client': orders['client'].astype(str).to_numpy(), 'order_id': orders['order_id'].to_numpy(),
+                              'date': dates.to_numpy(), 'spent': spent.to_numpy()})
+
+        # One grouped aggregation per batch, merged with the running totals
+        totals = batch.groupby('client').agg(last_purchase=('date', 'max'), monetary=('spent', 'sum'))
+        self.customers = pd.concat([self.customers, totals]).groupby(level=0).agg(
+            last_purchase=('last_purchase', 'max'), monetary=('monetary', 'sum')
+        ).rename_axis('client')
+
+        # Remember which orders each customer placed (Frequency = distinct orders)
+        self.client_orders = pd.concat(
+            [self.client_orders, batch[['client', 'order_id']].drop_duplicates()]
+        ).drop_duplicates(ignore_index=True)
+
+        batch_max = dates.max()
+        if self.reference_date is None or batch_max > self.reference_date:
+            self.reference_date = batch_max
+        return self
+
+    def table(self):
+        """
+        Returns:
+            pandas.DataFrame: One row per customer with the RFM_COLUMNS
+        """
+        frequency = self.client_orders.groupby('client').size()
+        rfm = pd.DataFrame({
+            'Customer': self.customers.index,
+            'Recency': (self.reference_date - self.customers['last_purchase']).dt.days.to_numpy(),  # Days since last purchase
+            'Frequency': frequency.reindex(self.customers.index, fill_value=0).to_numpy(),     # Number of orders
+            'Monetary': self.customers['monetary'].to_numpy(),                                 # Total amount spent
+        })
+        return rfm[RFM_COLUMNS]
+
+    def save(self, directory):
+        """
+        Stores the running totals, so the next run only needs the new orders.
+
+        Args:
+            directory (str): Directory for the state files
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.customers.reset_index().to_parquet(os.path.join(directory, 'customers.parquet'), index=False)
+        self.client_orders.to_parquet(os.path.join(directory, 'client_orders.parquet'), index=False)
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Args:
+            directory (str): Directory written by save()
+        Returns:
+            RFMBuilder: Builder with the stored running totals
+        """
+        builder = cls()
+        builder.customers = pd.read_parquet(os.path.join(directory, 'customers.parquet')).set_index('client')
+        builder.client_orders = pd.read_parquet(os.path.join(directory, 'client_orders.parquet'))
+        if not builder.customers.empty:
+            builder.reference_date = builder.customers['last_purchase'].max()
+        return builder
+
+
+#
+# ------------------------------------------------------------
+# RFM table of a complete order history in one call
+# ------------------------------------------------------------
+def build_rfm(orders):
+    """
+    Builds the RFM table of a complete order history.
+
+    Args:
+        orders (pandas.DataFrame): Order lines (see RFMBuilder.update)
+    Returns:
+        pandas.DataFrame: One row per customer with the RFM_COLUMNS
+    """
+    return RFMBuilder().update(orders).table()
+
+
+# =========================
+# Choosing the Number of Clusters
+# =========================
+
+def _score_clusters(data, k, sample_size, random_state):
+    labels = KMeans(n_clusters=k, random_state=random_state).fit_predict(data)
+    return silhouette_score(data, labels, sample_size=sample_size, random_state=random_state)
+
+
+#
+# ------------------------------------------------------------
+# Silhouette score for every candidate number of clusters
+# ------------------------------------------------------------
+def silhouette_sweep(data, cluster_range, sample_size=SILHOUETTE_SAMPLE_SIZE, n_jobs=-1, random_state=42):
+    """
+    Fits KMeans for every number of clusters in parallel and scores each with the silhouette score.
+
+    Args:
+        data (array-like): Standardized features
+        cluster_range (iterable): Numbers of clusters to try
+        sample_size (int): Score on a random sample of this size when there are more rows
+        n_jobs (int): Parallel jobs (-1 = all CPU cores)
+        random_state (int): Seed of KMeans and of the silhouette sample
+    Returns:
+        list: Silhouette score of every number of clusters, in the order of cluster_range
+    """
+    sample = sample_size if len(data) > sample_size else None
+    # Threads: KMeans and the silhouette distances release the GIL, and no data is copied
+    return Parallel(n_jobs=n_jobs, prefer='threads')(
+        delayed(_score_clusters)(data, k, sample, random_state) for k in cluster_range
+    )
@@ -6,30 +6,24 @@ Author: Rytis Bimbiras
 # ========== SECTION 1: CONFIGURATION ==========
 # Import libraries with standard aliases
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import re
 import sys
 from datetime import datetime
-from matplotlib.backends.backend_pdf import PdfPages
+from order_data import load_orders, add_derived_columns, DERIVED_COLUMNS
+from report_engine import build_report, DEFAULT_WORKERS, REPORT_CACHE_DIR
 
-# Configure global settings
-sns.set(style="whitegrid")  # Set consistent visual style
-plt.rcParams['font.size'] = 10  # Base font size for all plots
+# Configure global settings (chart style: see report_engine.apply_style)
 DEBUG_MODE = True  # Set to False to disable debug prints
 
 # ========== SECTION 2: DATA LOADING & VALIDATION ==========
 def load_and_validate_data(filename):
     """
     Load and validate the input Excel file
+    (through the shared Parquet cache, see order_data.py)
     Returns DataFrame if successful, exits program otherwise
     """
     try:
-        # Load data with strict dtype checking
-        df = pd.read_excel(filename, engine='openpyxl')
-        
-        # Strip whitespace from column names
-        df.columns = df.columns.str.strip()
+        # Load typed data with derived columns, re-parsing the workbook only when it changed
+        df = load_orders(filename)
         
         # Validate required columns
         required_columns = {
@@ -57,30 +51,16 @@ def process_data(raw_df):
     Returns processed DataFrame
     """
     try:
-        # Create copy to avoid modifying original data
-        df = raw_df.copy()
+        # Derived columns (dates, weeks, months, total_price, city) and the
+        # categorical dtypes normally come precomputed from the cache – derive
+        # them (vectorized, see order_data.add_derived_columns) only for raw data
+        if set(DERIVED_COLUMNS).issubset(raw_df.columns):
+            df = raw_df.copy()  # Copy to avoid modifying original data
+        else:
+            df = add_derived_columns(raw_df)
         
-        # ------ DateTime Conversion ------
-        df['date'] = pd.to_datetime(df['date'], errors='coerce')
         if df['date'].isna().any():
             print("⚠️ Warning: Some dates could not be parsed")
-            
-        # ------ Time Period Calculations ------
-        df['week'] = df['date'].dt.to_period('W').dt.start_time
-        df['month'] = df['date'].dt.strftime('%Y-%m')  # More readable format
-        
-        # ------ Financial Calculations ------
-        df['total_price'] = df['item_price'] * df['ordered_quantity']
-        
-        # ------ Address Parsing ------
-        def extract_city(address):
-            """Helper function to extract city from address string"""
-            if pd.isna(address):
-                return 'Unknown'
-            match = re.search(r',\s*([^,]+),\s*LT-\d+', str(address))
-            return match.group(1).strip() if match else 'Unknown'
-            
-        df['city'] = df['address'].apply(extract_city)
         
         if DEBUG_MODE:
             print("✅ Data processing completed")
@@ -101,40 +81,57 @@ def calculate_metrics(clean_df):
     metrics = {}
     
     try:
-        # ------ Weekly Metrics ------
-        weekly = clean_df.groupby('week').agg(
+        # ------ Single Pass over the Order Lines ------
+        # One grouped aggregation over all reporting dimensions; the additive
+        # metrics (revenue, units, line counts) of every table below are rolled
+        # up from this small cube instead of rescanning the order lines
+        dimensions = ['week', 'month', 'shop', 'payment_status', 'order_processed', 'city']
+        cube = clean_df.groupby(dimensions, observed=True, dropna=False, sort=False).agg(
             revenue=('total_price', 'sum'),
             sales=('ordered_quantity', 'sum'),
-            orders=('order_id', 'nunique')
+            lines=('order_id', 'size')
         ).reset_index()
+        # Distinct orders don't add up across the cube: they are counted on the
+        # distinct (order, week, month, shop) rows, found in the same single pass
+        # (an order's lines share its week, month and shop: about one row per order)
+        orders = clean_df[['order_id', 'week', 'month', 'shop']].drop_duplicates()
+        
+        def summarize(by):
+            """Revenue, units sold and distinct orders per value of *by*"""
+            table = cube.groupby(by, observed=True, dropna=False)[['revenue', 'sales']].sum()
+            # Lines with a missing value of *by* form their own group in both, like in the cube
+            table['orders'] = orders.groupby(by, observed=True, dropna=False)['order_id'].count()
+            return table.reset_index()
+        
+        def count_lines(index, columns):
+            """Number of order lines per index/column pair (like pd.crosstab)"""
+            return cube.pivot_table(
+                index=index, columns=columns, values='lines',
+                aggfunc='sum', fill_value=0, observed=True
+            )
+        
+        # ------ Weekly Metrics ------
+        weekly = summarize('week')
         weekly['avg_order_value'] = weekly['revenue'] / weekly['orders']
         metrics['weekly'] = weekly
         
         # ------ Monthly Metrics ------
-        monthly = clean_df.groupby('month').agg(
-            revenue=('total_price', 'sum'),
-            sales=('ordered_quantity', 'sum'),
-            orders=('order_id', 'nunique')
-        ).reset_index()
+        monthly = summarize('month')
         monthly['avg_order_value'] = monthly['revenue'] / monthly['orders']
         metrics['monthly'] = monthly
         
         # ------ Shop Performance ------
-        metrics['shop_perf'] = clean_df.groupby('shop').agg(
-            revenue=('total_price', 'sum'),
-            sales=('ordered_quantity', 'sum'),
-            orders=('order_id', 'nunique')
-        ).reset_index()
+        metrics['shop_perf'] = summarize('shop')
         
         # ------ Payment vs Fulfillment ------
         # KEY DIFFERENCE: 
         # Payment Methods = how customers paid (credit card, cash, etc)
         # Fulfillment Status = order processing status (completed, pending, etc)
-        metrics['payment_month'] = pd.crosstab(clean_df['month'], clean_df['payment_status'])
-        metrics['fulfillment_month'] = pd.crosstab(clean_df['month'], clean_df['order_processed'])
+        metrics['payment_month'] = count_lines('month', 'payment_status')
+        metrics['fulfillment_month'] = count_lines('month', 'order_processed')
         
         # ------ Customer Geography ------
-        metrics['city_month'] = pd.crosstab(clean_df['month'], clean_df['city'])
+        metrics['city_month'] = count_lines('month', 'city')
         
         if DEBUG_MODE:
             print("✅ Metrics calculated")
@@ -146,54 +143,20 @@ def calculate_metrics(clean_df):
         sys.exit(1)
 
 # ========== SECTION 5: VISUALIZATION ==========
-def create_visualizations(metrics, output_file):
+def create_visualizations(metrics, output_file, workers=DEFAULT_WORKERS, cache_dir=REPORT_CACHE_DIR):
     """
     Generate professional visualizations and save to PDF
+    (one page per metric group, drawn in parallel and cached, see report_engine.py)
     """
     try:
-        with PdfPages(output_file) as pdf:
-            # ------ Helper Functions ------
-            def style_plot(ax, title, ylabel, xlabel=None):
-                """Standardize plot styling"""
-                ax.set_title(title, pad=20)
-                ax.set_ylabel(ylabel)
-                if xlabel:
-                    ax.set_xlabel(xlabel)
-                ax.grid(True, alpha=0.3)
-                plt.tight_layout()
-                
-            # ------ Revenue Analysis ------
-            fig, ax = plt.subplots(figsize=(12, 6))
-            sns.lineplot(
-                x=metrics['weekly']['week'], 
-                y=metrics['weekly']['revenue'],
-                marker='o',
-                ax=ax
-            )
-            style_plot(ax, 'Weekly Revenue Trend', 'Revenue (€)', 'Week')
-            pdf.savefig()
-            plt.close()
-            
-            # ------ Payment vs Fulfillment Comparison ------
-            fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10))
-            
-            # Payment Methods
-            metrics['payment_month'].plot(kind='bar', stacked=True, ax=ax1, cmap='Pastel1')
-            style_plot(ax1, 'Payment Methods per Month', 'Number of Orders')
-            
-            # Fulfillment Status
-            metrics['fulfillment_month'].plot(kind='bar', stacked=True, ax=ax2, cmap='Set2')
-            style_plot(ax2, 'Order Fulfillment Status per Month', 'Number of Orders')
-            
-            plt.tight_layout()
-            pdf.savefig()
-            plt.close()
-            
-            # ------ Additional Recommended Visualizations ------
-            # (Add more plots as needed following same pattern)
+        # Pages: weekly revenue, monthly revenue/AOV, payment vs fulfillment,
+        # shop performance and customer geography
+        report = build_report(metrics, output_file, workers=workers, cache_dir=cache_dir)
             
         if DEBUG_MODE:
             print(f"✅ Report saved to {output_file}")
+            print(f"📄 {report['pages']} pages ({report['rendered']} drawn, "
+                  f"{report['cached']} unchanged) in {report['seconds']:.2f}s")
             
     except Exception as e:
         print(f"❌ Visualization error: {str(e)}")
@@ -22,18 +22,22 @@ Last Updated: May 3, 2025
 # `process_all_orders()` is called from the `if __name__ == "__main__":`
 # guard at the very bottom.  The high‑level flow is:
 #
-#     Excel → pandas.DataFrame  → per‑order grouping → Word/PDF generation
-#                          ↑                         ↓
-#                      status flag            updated Excel saved
+#     Excel → pending rows → per‑order grouping → Word/PDF generation
+#               ↑                                         ↓
+#          order ledger (SQLite) ←──── status recorded per order
 #
-# Each helper in the “Utility”, “Image Processing”, “PDF Generation”, and
-# “Document Creation” sections manipulates a **single, well‑defined piece**
+# Each helper in the “Utility”, “Image Processing”, “Document Templates”,
+# “PDF Generation”, and “Document Creation” sections manipulates a **single, well‑defined piece**
 # of that pipeline.  The comments sprinkled throughout the functions below
 # try to explain *why* something is happening – not just *what*.
 # ---------------------------------------------------------------------------
 
 # Import necessary libraries for file handling, data processing, and document generation
 import os                               # For file and directory operations
+import time                             # For measuring processing throughput
+import argparse                         # For command-line options (number of workers)
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor # For parallel order processing
+from functools import lru_cache         # For loading the invoice logo once per process
 import pandas as pd                     # For Excel file manipulation and data processing
 import requests                         # For making HTTP requests to download images
 from io import BytesIO                  # For handling binary data streams (images)
@@ -41,7 +45,7 @@ from PIL import Image, ImageOps, UnidentifiedImageError # For image processing o
 from datetime import datetime # For date and time operations
 
 # Import libraries for PDF generation
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image as RLImage
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak, Image as RLImage
 from reportlab.lib import colors # For color definitions in PDFs
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle # For text styling in PDFs
 from reportlab.lib.enums import TA_LEFT, TA_CENTER, TA_RIGHT # For text alignment options
@@ -54,6 +58,13 @@ from reportlab.pdfgen import canvas # For low-level PDF operations
 from docx import Document # For creating Word documents
 from docx.shared import Inches # For measurement units in Word docs
 
+# Import the persistent image cache (product photos and the shop logo)
+from image_cache import ImageCache
+
+# Import the processing ledger (which orders are already done)
+from order_ledger import OrderLedger, DEFAULT_LEDGER_FILE, STATUS_DONE, STATUS_FAILED, STATUS_IMPORTED, order_key
+from openpyxl import load_workbook # For streaming rows of the orders workbook
+
 # Import libraries for barcode generation
 from reportlab.graphics.barcode import eanbc # For EAN barcode generation
 from reportlab.graphics.shapes import Drawing # For vector drawing operations
@@ -96,6 +107,22 @@ COMPANY_INFO = {
     "vat_code": "LT225713515"
 }
 
+# Parallel processing settings
+# Orders are rendered (ReportLab/python-docx, CPU-bound) in a pool of worker processes,
+# product images are downloaded (network-bound) beforehand in a bounded pool of threads
+DEFAULT_WORKERS = os.cpu_count() or 1
+IMAGE_DOWNLOAD_THREADS = 8
+
+# Downloaded images are kept on disk between runs and revalidated with the image server
+# (ETag / Last-Modified), so unchanged product photos and the logo are never downloaded twice
+LOGO_URL = "https://www.winnersport.lt/static/v2/img/logo.png"
+IMAGE_CACHE_DIR = ".image_cache"
+IMAGE_CACHE_MAX_BYTES = 200 * 1024 * 1024
+IMAGE_CACHE = ImageCache(IMAGE_CACHE_DIR, max_bytes=IMAGE_CACHE_MAX_BYTES)
+
+# Logo bytes handed to this process by the parent (see use_invoice_logo), fetched from the cache if None
+INVOICE_LOGO_BYTES = None
+
 # =========================
 # Utility Functions
 # =========================
@@ -182,35 +209,96 @@ def load_orders_from_excel(filename):
 
 #
 # ------------------------------------------------------------
-# Quick check to see if the given order is already marked done
+# Stream the workbook and keep only orders missing from the ledger
 # ------------------------------------------------------------
-def is_order_already_processed(order_items):
+def load_pending_orders(filename, ledger, retry_failed=False):
     """
-    Checks if an order has already been marked as processed.
+    Loads the items of orders that still need processing.
+
+    Rows are streamed from the workbook and rows of already processed orders
+    are dropped right away, so they never become part of a DataFrame.
+    Orders flagged "yes" in the workbook but missing from the ledger (history
+    from before the ledger existed) are imported into the ledger and skipped.
 
     Args:
-        order_items (pandas.DataFrame): DataFrame containing order items
+        filename (str): Path to the Excel file
+        ledger (OrderLedger): Processing ledger
+        retry_failed (bool): Load orders whose rendering failed in an earlier run again
     Returns:
-        bool: True if order is already processed, False otherwise
+        tuple: (list of (order_id, order_items DataFrame) pairs, number of skipped orders)
+    Raises:
+        ValueError: If the workbook has no order_id column
     """
-    # Get the 'order_processed' value from the first row, convert to string, strip whitespace,
-    # convert to lowercase, and check if it equals "yes"
-    return str(order_items.iloc[0].get("order_processed", "")).strip().lower() == "yes"
+    workbook = load_workbook(filename, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        
+        # Strip whitespace from column names for consistency
+        columns = [str(column).strip() for column in next(rows, ())]
+        if "order_id" not in columns:
+            raise ValueError(f"Required column 'order_id' missing, columns found: {columns}")
+        order_id_column = columns.index("order_id")
+        flag_column = columns.index("order_processed") if "order_processed" in columns else None
+        
+        done = ledger.processed_ids(include_failed=not retry_failed)
+        # The workbook flag only counts for orders the ledger doesn't know (an exported flag
+        # of a failed order must not turn it into an imported one)
+        known = ledger.processed_ids()
+        skipped = set()
+        pending_rows = []
+        for row in rows:
+            key = order_key(row[order_id_column])
+            if key in done:
+                skipped.add(key)
+                continue
+            if (key not in known and flag_column is not None
+                    and str(row[flag_column]).strip().lower() == "yes"):
+                ledger.mark_processed(key, status=STATUS_IMPORTED)
+                done.add(key)
+                known.add(key)
+                skipped.add(key)
+                continue
+            pending_rows.append(row)
+    finally:
+        workbook.close()
+    
+    orders_dataframe = pd.DataFrame(pending_rows, columns=columns)
+    return list(orders_dataframe.groupby("order_id")), len(skipped)
 
 #
 # ------------------------------------------------------------
 # Flag an order as processed so we don't duplicate work later
 # ------------------------------------------------------------
-def mark_order_as_processed(orders_dataframe, order_id):
+def mark_order_as_processed(ledger, order_id, status=STATUS_DONE, files=0, error=None):
     """
-    Marks an order as processed in the DataFrame.
+    Records an order as processed in the ledger (a single indexed write).
 
     Args:
-        orders_dataframe (pandas.DataFrame): DataFrame containing orders
+        ledger (OrderLedger): Processing ledger
         order_id: ID of the order to mark as processed
+        status (str): Outcome of the order (done / failed)
+        files (int): Number of generated documents
+        error (str, optional): Error message of a failed order
+    """
+    ledger.mark_processed(order_id, status=status, files=files, error=error)
+
+#
+# ------------------------------------------------------------
+# Optional export: write the ledger back into the workbook flags
+# ------------------------------------------------------------
+def export_processed_flags(filename, ledger, output_filename=None):
+    """
+    Sets the order_processed column of the workbook from the ledger.
+
+    Args:
+        filename (str): Path to the orders Excel file
+        ledger (OrderLedger): Processing ledger
+        output_filename (str, optional): Where to save the workbook (defaults to filename)
     """
-    # Update 'order_processed' column to 'yes' for rows with matching order_id
-    orders_dataframe.loc[orders_dataframe["order_id"] == order_id, "order_processed"] = "yes"
+    orders_dataframe = load_orders_from_excel(filename)
+    processed = orders_dataframe["order_id"].map(order_key).isin(ledger.processed_ids())
+    orders_dataframe["order_processed"] = processed.map({True: "yes", False: "no"})
+    orders_dataframe.to_excel(output_filename or filename, index=False)
 
 # =========================
 # Image Processing
@@ -237,26 +325,93 @@ def download_and_process_image(image_url, size=200, border_width=5, border_color
         return None # Return None if URL is invalid
     
     try:
-        # Download the product photo (fail fast after 10 s to avoid long stalls)
-        response = requests.get(image_url, timeout=10)
-        response.raise_for_status() # Raise exception for unsuccessful HTTP requests
-        
-        # Open image from response content and convert to RGB format
-        image = Image.open(BytesIO(response.content)).convert("RGB")
-        
-        # Preserve aspect ratio while shrinking so neither side exceeds *size* px
-        image.thumbnail((size, size))
-        
-        # Create new white background image of target size
-        image_with_padding = Image.new("RGB", (size, size), color="white")
-        
-        # Paste resized image onto white background, centered
-        image_with_padding.paste(image, ((size - image.width) // 2, (size - image.height) // 2))
-        
-        # Add border around the image
-        image_with_frame = ImageOps.expand(image_with_padding, border=border_width, fill=border_color)
-        
-        return image_with_frame
+        # Get the product photo from the cache (downloaded only when new or changed)
+        return frame_image(IMAGE_CACHE.get(image_url), size, border_width, border_color)
+    
+    except (requests.exceptions.RequestException, UnidentifiedImageError) as exception:
+        # Handle network errors and image processing errors
+        print(f"Error processing image: {exception}")
+        return None
+
+#
+# ------------------------------------------------------------
+# Resize, pad and border downloaded image bytes
+# ------------------------------------------------------------
+def frame_image(image_content, size=200, border_width=5, border_color="black"):
+    """
+    Turns a downloaded product photo into the framed square shown in the documents.
+
+    Args:
+        image_content (bytes): Downloaded image
+        size (int): Target size (width/height) for the image
+        border_width (int): Width of border to add around image
+        border_color (str): Color of the border
+    Returns:
+        PIL.Image.Image: Processed image
+    Raises:
+        PIL.UnidentifiedImageError: If the bytes are not an image
+    """
+    # Open image from the downloaded content and convert to RGB format
+    image = Image.open(BytesIO(image_content)).convert("RGB")
+    
+    # Preserve aspect ratio while shrinking so neither side exceeds *size* px
+    image.thumbnail((size, size))
+    
+    # Create new white background image of target size
+    image_with_padding = Image.new("RGB", (size, size), color="white")
+    
+    # Paste resized image onto white background, centered
+    image_with_padding.paste(image, ((size - image.width) // 2, (size - image.height) // 2))
+    
+    # Add border around the image
+    return ImageOps.expand(image_with_padding, border=border_width, fill=border_color)
+
+#
+# ------------------------------------------------------------
+# Encode a PIL image once into in-memory bytes (no temp files)
+# ------------------------------------------------------------
+def encode_image(image, image_format="JPEG"):
+    """
+    Encodes an image into bytes that python-docx and ReportLab can both read from memory.
+
+    Args:
+        image (PIL.Image.Image): Image to encode
+        image_format (str): Pillow format name
+    Returns:
+        bytes: Encoded image
+    """
+    buffer = BytesIO()
+    image.save(buffer, format=image_format)
+    return buffer.getvalue()
+
+#
+# ------------------------------------------------------------
+# Download + process + encode a product photo in one step
+# ------------------------------------------------------------
+def download_and_encode_image(image_url, size=200, border_width=5, border_color="black"):
+    """
+    Downloads and processes a product image, then encodes it as JPEG.
+    The encoded image is cached with the photo, so an unchanged photo is only
+    processed once for the same size and border.
+
+    Args:
+        image_url (str): URL of the image to download
+        size (int): Target size (width/height) for the image
+        border_width (int): Width of border to add around image
+        border_color (str): Color of the border
+    Returns:
+        bytes or None: Encoded image or None if processing failed
+    """
+    # Check if image URL is valid
+    if not pd.notna(image_url) or not isinstance(image_url, str) or not image_url.strip():
+        return None # Return None if URL is invalid
+    
+    try:
+        return IMAGE_CACHE.get_variant(
+            image_url,
+            f"jpeg {size}px border {border_width} {border_color}",
+            lambda image_content: encode_image(frame_image(image_content, size, border_width, border_color)),
+        )
     
     except (requests.exceptions.RequestException, UnidentifiedImageError) as exception:
         # Handle network errors and image processing errors
@@ -267,14 +422,13 @@ def download_and_process_image(image_url, size=200, border_width=5, border_color
 # ------------------------------------------------------------
 # Safely add an image (or placeholder text) into the Word doc
 # ------------------------------------------------------------
-def attach_image_to_document(document, image, order_id, description=None):
+def attach_image_to_document(document, image, description=None):
     """
     Attaches an image to a Word document, with error handling.
 
     Args:
         document (docx.Document): Word document to attach image to
-        image (PIL.Image.Image): Image to attach
-        order_id: ID of the order (used for temporary file naming)
+        image (bytes or PIL.Image.Image): Encoded image (see encode_image) or image to attach
         description (str, optional): Description text if image cannot be attached
     """
     # Check if image is available
@@ -284,17 +438,131 @@ def attach_image_to_document(document, image, order_id, description=None):
             document.add_paragraph(f"⚠️ {description}")
         return
     
-    # Create a temporary file path for the image
-    image_path = f"temp_{order_id}_processed.jpg"
-    
-    # Save image to temporary file
-    image.save(image_path)
-    
-    # Add image to document with width of 2 inches
-    document.add_picture(image_path, width=Inches(2))
+    # Encode PIL images here, already encoded images are embedded as they are
+    image_bytes = image if isinstance(image, bytes) else encode_image(image)
     
-    # Remove temporary image file
-    os.remove(image_path)
+    # Add image to document with width of 2 inches, straight from memory –
+    # no temporary file to write, read back and delete (and no name clashes between runs)
+    document.add_picture(BytesIO(image_bytes), width=Inches(2))
+
+# =========================
+# Document Templates
+# =========================
+
+# Styles, static flowables and table styles are built once per process and
+# shared by every document – each document only fills in its own order data.
+
+#
+# ------------------------------------------------------------
+# Paragraph styles of the A7 shipping labels
+# ------------------------------------------------------------
+@lru_cache(maxsize=None)
+def get_label_styles():
+    """
+    Builds the text styles of shipping labels (once per process).
+
+    Returns:
+        reportlab.lib.styles.StyleSheet1: Sample styles plus "Left" and "LeftBold"
+    """
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(name="LeftBold", alignment=TA_LEFT, fontName="DejaVuSans-Bold", fontSize=9, leading=11))
+    styles.add(ParagraphStyle(name="Left", alignment=TA_LEFT, fontName="DejaVuSans", fontSize=9, leading=11))
+    return styles
+
+#
+# ------------------------------------------------------------
+# Paragraph styles of the A4 invoices
+# ------------------------------------------------------------
+@lru_cache(maxsize=None)
+def get_invoice_styles():
+    """
+    Builds the text styles of invoices (once per process).
+
+    Returns:
+        reportlab.lib.styles.StyleSheet1: Sample styles plus the invoice styles
+    """
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(name="Left", alignment=TA_LEFT, fontName="DejaVuSans", fontSize=10, leading=13))
+    styles.add(ParagraphStyle(name="LeftBold", alignment=TA_LEFT, fontName="DejaVuSans-Bold", fontSize=10))
+    styles.add(ParagraphStyle(name="CenterBold", alignment=TA_CENTER, fontName="DejaVuSans-Bold", fontSize=14, spaceAfter=10))
+    styles.add(ParagraphStyle(name="RightBold", alignment=TA_RIGHT, fontName="DejaVuSans-Bold", fontSize=10))
+    styles.add(ParagraphStyle(name="Right", alignment=TA_RIGHT, fontName="DejaVuSans", fontSize=10))
+    return styles
+
+# Width of the invoice content (A4 minus 30 pt margins on both sides)
+INVOICE_CONTENT_WIDTH = A4[0] - 60
+
+# Layout of the seller/buyer block on invoices
+INVOICE_INFO_TABLE_STYLE = TableStyle([
+    ("VALIGN", (0, 0), (-1, -1), "TOP"), # Align content to top
+    ("ALIGN", (0, 0), (-1, -1), "LEFT"), # Align content to left
+    ("LEFTPADDING", (0, 0), (-1, -1), 0), # No left padding
+    ("RIGHTPADDING", (0, 0), (-1, -1), 12), # Right padding of 12 points
+])
+
+# Layout of the invoice items table
+INVOICE_ITEMS_TABLE_STYLE = TableStyle([
+    ("FONTNAME", (0, 0), (-1, 0), "DejaVuSans-Bold"), # Bold font for header row
+    ("FONTNAME", (0, 1), (-1, -1), "DejaVuSans"), # Regular font for data rows
+    ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey), # Gray background for header
+    ("GRID", (0, 0), (-1, -1), 0.5, colors.grey), # Grid lines
+    ("ALIGN", (2, 0), (-1, 0), "CENTER"), # Center align header text
+    ("ALIGN", (2, 1), (-1, -1), "RIGHT"), # Right align numeric values
+    ("VALIGN", (0, 0), (-1, -1), "MIDDLE"), # Vertically center all content
+    ("BOTTOMPADDING", (0, 0), (-1, 0), 6), # Bottom padding for header
+    ("TOPPADDING", (0, 0), (-1, 0), 6), # Top padding for header
+])
+
+#
+# ------------------------------------------------------------
+# "From:" block of a shipping label, one per shop
+# ------------------------------------------------------------
+@lru_cache(maxsize=None)
+def get_label_sender_block(shop):
+    """
+    Builds the sender information of shipping labels sent from a shop.
+
+    Args:
+        shop (str): Shop identifier (e.g., 'k_mega', 'v_outlet')
+    Returns:
+        tuple: Flowables of the sender block, shared by all labels of the shop
+    """
+    styles = get_label_styles()
+    return (
+        Paragraph("From:", styles["LeftBold"]),
+        Paragraph(COMPANY_INFO["name"], styles["LeftBold"]),
+        Paragraph(get_shop_info(shop, 'address'), styles["Left"]),
+        Paragraph(f"Tel: {COMPANY_INFO['phone']}", styles["Left"]),
+        Paragraph(COMPANY_INFO["email"], styles["Left"]),
+        Spacer(1, 12), # Add vertical space
+    )
+
+#
+# ------------------------------------------------------------
+# Seller column of the invoice header (same on every invoice)
+# ------------------------------------------------------------
+@lru_cache(maxsize=None)
+def get_invoice_seller_paragraph(style):
+    """
+    Builds the company information paragraph of invoices.
+
+    Args:
+        style (ParagraphStyle): Style of the paragraph
+    Returns:
+        Paragraph: Seller information, shared by all invoices
+    """
+    company_info = "<br/>".join([
+        f'Seller: {COMPANY_INFO["name"]}',
+        f'Account No.: {COMPANY_INFO["account_no"]}',
+        f'Bank: {COMPANY_INFO["bank"]}',
+        f'Bank code: {COMPANY_INFO["bank_code"]}',
+        f'Swift code: {COMPANY_INFO["swift_code"]}',
+        f'Company code: {COMPANY_INFO["company_code"]}',
+        f'VAT code: {COMPANY_INFO["vat_code"]}',
+        f'Tel.: {COMPANY_INFO["phone"]}',
+        f'Email: {COMPANY_INFO["email"]}'
+    ])
+    return Paragraph(company_info, style)
 
 # =========================
 # PDF Generation
@@ -302,31 +570,24 @@ def attach_image_to_document(document, image, order_id, description=None):
 
 #
 # ------------------------------------------------------------
-# Build a compact A7 PDF shipping label with barcode & COD info
+# Lay out one A7 shipping label: addresses, COD info and barcode
 # ------------------------------------------------------------
-def generate_shipping_label_pdf(filename, order_item, payment_status):
+def create_shipping_label_elements(order_item, payment_status):
     """
-    Creates a shipping label PDF for an order item.
+    Creates the flowables of a shipping label for an order item.
 
     Args:
-        filename (str): Output PDF filename
         order_item (dict): Dictionary containing order item details
         payment_status (str): Payment status (affects COD amount display)
+    Returns:
+        list: Document elements of one label page
     """
     # ------- Recipient / Sender information block ---------------------
     # Get shop identifier from order item
     shop = order_item.get("shop", "")
     
-    # Get shop's address using shop identifier
-    shop_address = get_shop_info(shop, 'address')
-    
-    # Define text styles for the document
-    styles = getSampleStyleSheet()
-    styles.add(ParagraphStyle(name="LeftBold", alignment=TA_LEFT, fontName="DejaVuSans-Bold", fontSize=9, leading=11))
-    styles.add(ParagraphStyle(name="Left", alignment=TA_LEFT, fontName="DejaVuSans", fontSize=9, leading=11))
-    
-    # Create PDF document with A7 size (small for shipping label)
-    document = SimpleDocTemplate(filename, pagesize=A7, leftMargin=10, rightMargin=10, topMargin=10, bottomMargin=10)
+    # Text styles are shared by all labels
+    styles = get_label_styles()
     
     # List to hold all elements in the document
     elements = []
@@ -339,13 +600,8 @@ def generate_shipping_label_pdf(filename, order_item, payment_status):
     elements.append(Paragraph(order_item.get("email", ""), styles["Left"]))
     elements.append(Spacer(1, 12)) # Add vertical space
     
-    # Add sender information to shipping label
-    elements.append(Paragraph("From:", styles["LeftBold"]))
-    elements.append(Paragraph(COMPANY_INFO["name"], styles["LeftBold"]))
-    elements.append(Paragraph(shop_address, styles["Left"]))
-    elements.append(Paragraph(f"Tel: {COMPANY_INFO['phone']}", styles["Left"]))
-    elements.append(Paragraph(COMPANY_INFO["email"], styles["Left"]))
-    elements.append(Spacer(1, 12)) # Add vertical space
+    # Add sender information to shipping label (prebuilt once per shop)
+    elements.extend(get_label_sender_block(shop))
     
     # If payment hasn’t been received, print COD so the courier knows the
     # amount to collect.
@@ -393,9 +649,91 @@ def generate_shipping_label_pdf(filename, order_item, payment_status):
         # Add error message if barcode generation fails
         elements.append(Paragraph("⚠️ Invalid Barcode", styles["Left"]))
     
+    return elements
+
+#
+# ------------------------------------------------------------
+# Build a compact A7 PDF shipping label with barcode & COD info
+# ------------------------------------------------------------
+def generate_shipping_label_pdf(filename, order_item, payment_status):
+    """
+    Creates a shipping label PDF for an order item.
+
+    Args:
+        filename (str): Output PDF filename
+        order_item (dict): Dictionary containing order item details
+        payment_status (str): Payment status (affects COD amount display)
+    """
+    generate_shipping_labels_pdf(filename, [(order_item, payment_status)])
+
+#
+# ------------------------------------------------------------
+# Bulk mode: many A7 labels as pages of one PDF (courier batches)
+# ------------------------------------------------------------
+def generate_shipping_labels_pdf(filename, labels):
+    """
+    Creates one multi-page PDF with a shipping label per page.
+
+    Building a single document avoids the per-file ReportLab overhead
+    when a courier batch needs many labels at once.
+
+    Args:
+        filename (str): Output PDF filename
+        labels (list): (order_item, payment_status) pairs, one per label
+    """
+    # Create PDF document with A7 size (small for shipping label)
+    document = SimpleDocTemplate(filename, pagesize=A7, leftMargin=10, rightMargin=10, topMargin=10, bottomMargin=10)
+    
+    # Every label starts on a new page
+    elements = []
+    for label_index, (order_item, payment_status) in enumerate(labels):
+        if label_index:
+            elements.append(PageBreak())
+        elements.extend(create_shipping_label_elements(order_item, payment_status))
+    
     # Build final PDF with all elements
     document.build(elements)
 
+#
+# ------------------------------------------------------------
+# Hand the logo downloaded by the parent process to a worker
+# ------------------------------------------------------------
+def use_invoice_logo(logo_bytes):
+    """
+    Sets the logo bytes invoices are rendered with (worker process initializer).
+
+    Args:
+        logo_bytes (bytes or None): The logo image, or None to fetch it from the image cache
+    """
+    global INVOICE_LOGO_BYTES
+    INVOICE_LOGO_BYTES = logo_bytes
+    load_invoice_logo.cache_clear()
+
+#
+# ------------------------------------------------------------
+# Fetch and size the shop logo once per process for all invoices
+# ------------------------------------------------------------
+@lru_cache(maxsize=None)
+def load_invoice_logo(max_width=220, max_height=60):
+    """
+    Loads the company logo and calculates its size on the invoice.
+
+    Args:
+        max_width (int): Maximum logo width in points
+        max_height (int): Maximum logo height in points
+    Returns:
+        tuple or None: (logo bytes, width, height), or None if the logo is unavailable
+    """
+    try:
+        logo_bytes = INVOICE_LOGO_BYTES or IMAGE_CACHE.get(LOGO_URL)
+        with Image.open(BytesIO(logo_bytes)) as logo_pil_image:
+            # Calculate logo size with proper aspect ratio
+            ratio = min(max_width / logo_pil_image.width, max_height / logo_pil_image.height)
+            return logo_bytes, logo_pil_image.width * ratio, logo_pil_image.height * ratio
+    except Exception:
+        # Skip logo if there's any error
+        return None
+
 #
 # ------------------------------------------------------------
 # Assemble the logo + seller/buyer blocks for invoice PDFs
@@ -414,34 +752,18 @@ def create_invoice_header(first_order_item, styles, doc_type="Invoice"):
     # Initialize list for document elements
     elements = []
     
-    try:
-        # Add company logo
-        logo_url = "https://www.winnersport.lt/static/v2/img/logo.png"
-        logo_resp = requests.get(logo_url, timeout=10)
-        logo_image_bytes = BytesIO(logo_resp.content)
-        logo_pil_image = Image.open(logo_image_bytes)
-        
-        # Calculate logo size with proper aspect ratio
-        max_width = 220
-        max_height = 60
-        ratio = min(max_width / logo_pil_image.width, max_height / logo_pil_image.height)
-        logo_width = logo_pil_image.width * ratio
-        logo_height = logo_pil_image.height * ratio
+    # Add company logo (decoded and sized once per process, skipped if unavailable)
+    logo = load_invoice_logo()
+    if logo is not None:
+        logo_bytes, logo_width, logo_height = logo
         
-        # Reset BytesIO position to beginning
-        logo_image_bytes.seek(0)
-        
-        # Create ReportLab image from logo bytes
-        logo_image = RLImage(logo_image_bytes, width=logo_width, height=logo_height)
+        # Create ReportLab image from the in-memory logo bytes
+        logo_image = RLImage(BytesIO(logo_bytes), width=logo_width, height=logo_height)
         logo_image.hAlign = 'LEFT'
         
         # Add logo to document
         elements.append(logo_image)
     
-    except Exception:
-        # Skip logo if there's any error
-        pass
-    
     # Add vertical space after logo
     elements.append(Spacer(1, 14))
     
@@ -459,21 +781,7 @@ def create_invoice_header(first_order_item, styles, doc_type="Invoice"):
         order_date = datetime.today().strftime("%Y-%m-%d")
     
     # Calculate content width based on page size
-    page_width = A4[0]
-    content_width = page_width - 60
-    
-    # Create company information text block
-    company_info = "<br/>".join([
-        f'Seller: {COMPANY_INFO["name"]}',
-        f'Account No.: {COMPANY_INFO["account_no"]}',
-        f'Bank: {COMPANY_INFO["bank"]}',
-        f'Bank code: {COMPANY_INFO["bank_code"]}',
-        f'Swift code: {COMPANY_INFO["swift_code"]}',
-        f'Company code: {COMPANY_INFO["company_code"]}',
-        f'VAT code: {COMPANY_INFO["vat_code"]}',
-        f'Tel.: {COMPANY_INFO["phone"]}',
-        f'Email: {COMPANY_INFO["email"]}'
-    ])
+    content_width = INVOICE_CONTENT_WIDTH
     
     # Create buyer information text block
     buyer_info = "<br/>".join([
@@ -484,19 +792,15 @@ def create_invoice_header(first_order_item, styles, doc_type="Invoice"):
     ])
     
     # Create table with company and buyer information in two columns
+    # (the seller column is the same on every invoice and built only once)
     info_table = [[
-        Paragraph(company_info, styles["Left"]),
+        get_invoice_seller_paragraph(styles["Left"]),
         Paragraph(buyer_info, styles["Left"])
     ]]
     
     # Create and style the information table
     info = Table(info_table, colWidths=[content_width/2, content_width/2], hAlign='LEFT')
-    info.setStyle(TableStyle([
-        ("VALIGN", (0, 0), (-1, -1), "TOP"), # Align content to top
-        ("ALIGN", (0, 0), (-1, -1), "LEFT"), # Align content to left
-        ("LEFTPADDING", (0, 0), (-1, -1), 0), # No left padding
-        ("RIGHTPADDING", (0, 0), (-1, -1), 12), # Right padding of 12 points
-    ]))
+    info.setStyle(INVOICE_INFO_TABLE_STYLE)
     
     # Add info table to document
     elements.append(info)
@@ -600,25 +904,14 @@ def create_invoice_items_table(order_items, styles):
         ])
     
     # Calculate page and column widths
-    page_width = A4[0]
-    content_width = page_width - 60
+    content_width = INVOICE_CONTENT_WIDTH
     col_widths = [40, content_width-305, 40, 75, 75, 75]
     
     # Create table with calculated widths
     table = Table(table_data, colWidths=col_widths, hAlign='LEFT')
     
-    # Apply styles to table
-    table.setStyle(TableStyle([
-        ("FONTNAME", (0, 0), (-1, 0), "DejaVuSans-Bold"), # Bold font for header row
-        ("FONTNAME", (0, 1), (-1, -1), "DejaVuSans"), # Regular font for data rows
-        ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey), # Gray background for header
-        ("GRID", (0, 0), (-1, -1), 0.5, colors.grey), # Grid lines
-        ("ALIGN", (2, 0), (-1, 0), "CENTER"), # Center align header text
-        ("ALIGN", (2, 1), (-1, -1), "RIGHT"), # Right align numeric values
-        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"), # Vertically center all content
-        ("BOTTOMPADDING", (0, 0), (-1, 0), 6), # Bottom padding for header
-        ("TOPPADDING", (0, 0), (-1, 0), 6), # Top padding for header
-    ]))
+    # Apply styles to table (shared table style, see Document Templates)
+    table.setStyle(INVOICE_ITEMS_TABLE_STYLE)
     
     # Calculate VAT and grand total
     vat = subtotal * 0.21
@@ -642,13 +935,8 @@ def generate_invoice_pdf(order_id, order_items, output_path, doc_type="Invoice")
     Returns:
         str: Path to the generated PDF file
     """
-    # Define paragraph styles for the document
-    styles = getSampleStyleSheet()
-    styles.add(ParagraphStyle(name="Left", alignment=TA_LEFT, fontName="DejaVuSans", fontSize=10, leading=13))
-    styles.add(ParagraphStyle(name="LeftBold", alignment=TA_LEFT, fontName="DejaVuSans-Bold", fontSize=10))
-    styles.add(ParagraphStyle(name="CenterBold", alignment=TA_CENTER, fontName="DejaVuSans-Bold", fontSize=14, spaceAfter=10))
-    styles.add(ParagraphStyle(name="RightBold", alignment=TA_RIGHT, fontName="DejaVuSans-Bold", fontSize=10))
-    styles.add(ParagraphStyle(name="Right", alignment=TA_RIGHT, fontName="DejaVuSans", fontSize=10))
+    # Paragraph styles are built once per process and shared by all invoices
+    styles = get_invoice_styles()
     
     # Initialize list for document elements
     elements = []
@@ -687,16 +975,21 @@ def generate_invoice_pdf(order_id, order_items, output_path, doc_type="Invoice")
 # ------------------------------------------------------------
 # Generate the internal Word doc used by shop staff for picking
 # ------------------------------------------------------------
-def create_order_document(order_id, order_items):
+def create_order_document(order_id, order_items, images=None):
     """
     Creates a Word document for an order containing instructions and item details with images.
 
     Args:
         order_id: ID of the order
         order_items (pandas.DataFrame): DataFrame containing order items
+        images (dict, optional): Already downloaded, encoded images keyed by image URL;
+            images missing from it are downloaded here
     Returns:
         docx.Document: Generated Word document
     """
+    # Each image is encoded only once, even if the order lists the same product twice
+    images = dict(images or {})
+    
     # Create a new Word document
     document = Document()
     
@@ -750,17 +1043,19 @@ def create_order_document(order_id, order_items):
         # Add item description
         document.add_paragraph(f" - Item: {item_name}, size {size}, {barcode} ({item['ordered_quantity']} pcs)")
         
-        # Get and process product image
+        # Get and process product image (reuse the prefetched one when available)
         image_url = item.get("image_url", "")
-        image = download_and_process_image(image_url)
+        if image_url not in images:
+            images[image_url] = download_and_encode_image(image_url)
+        image = images[image_url]
         
         # Gracefully degrade: if the image URL is broken, leave a note instead
         if image is None:
             error_msg = f"Could not download image: {image_url}"
-            attach_image_to_document(document, None, order_id, error_msg)
+            attach_image_to_document(document, None, error_msg)
         else:
             # Attach image to document
-            attach_image_to_document(document, image, order_id)
+            attach_image_to_document(document, image)
     
     return document
 
@@ -772,7 +1067,7 @@ def create_order_document(order_id, order_items):
 # ------------------------------------------------------------
 # Produce per-order PDFs: invoices and shipping labels as needed
 # ------------------------------------------------------------
-def generate_order_pdf_attachments(order_id, order_items, order_folder):
+def generate_order_pdf_attachments(order_id, order_items, order_folder, include_labels=True):
     """
     Generates PDF attachments (invoices, shipping labels) for an order.
 
@@ -780,6 +1075,8 @@ def generate_order_pdf_attachments(order_id, order_items, order_folder):
         order_id: ID of the order
         order_items (pandas.DataFrame): DataFrame containing order items
         order_folder (str): Path to folder where PDF files should be saved
+        include_labels (bool): Whether to generate per-item shipping label files
+            (False when labels are printed in bulk, see generate_shipping_labels_pdf)
     Returns:
         list: List of paths to generated PDF files
     """
@@ -801,6 +1098,10 @@ def generate_order_pdf_attachments(order_id, order_items, order_folder):
         generate_invoice_pdf(order_num, order_items, invoice_pdf, doc_type="Invoice")
         pdf_files.append(invoice_pdf)
         
+        # Labels printed in bulk are generated later for the whole batch
+        if not include_labels:
+            return pdf_files
+        
         # Generate shipping label for each item
         for _, item in order_items.iterrows():
             item_id = int(item["item_id"])
@@ -835,21 +1136,20 @@ def generate_order_pdf_attachments(order_id, order_items, order_folder):
 
 #
 # ------------------------------------------------------------
-# High‑level wrapper that handles one order from start to finish
+# Create the order folder, Word doc and PDFs for a single order
 # ------------------------------------------------------------
-def process_individual_order(order_id, order_items, orders_dataframe):
+def render_order_documents(order_id, order_items, images=None, include_labels=True):
     """
-    Processes a single order, generating all necessary documents.
+    Generates all documents of a single order, without touching the orders DataFrame.
 
     Args:
         order_id: ID of the order to process
         order_items (pandas.DataFrame): DataFrame containing items for this order
-        orders_dataframe (pandas.DataFrame): Complete orders DataFrame (to mark as processed)
+        images (dict, optional): Already downloaded product images keyed by image URL
+        include_labels (bool): Whether to generate per-item shipping label files
+    Returns:
+        list: Paths to all generated files (Word document last)
     """
-    # Mark early to avoid double‑processing even if later steps error out
-    # Mark the order as processed in the DataFrame
-    mark_order_as_processed(orders_dataframe, order_id)
-    
     # Create folder structure for order attachments
     attachments_folder = "order_attachments"
     os.makedirs(attachments_folder, exist_ok=True) # Create main attachments folder if it doesn't exist
@@ -860,10 +1160,10 @@ def process_individual_order(order_id, order_items, orders_dataframe):
     
     # Word doc doubles as both packing slip and e‑mail body template
     # Create main order document (Word format)
-    document = create_order_document(order_id, order_items)
+    document = create_order_document(order_id, order_items, images)
     
     # Generate PDF attachments (invoices, shipping labels, etc.)
-    pdf_files = generate_order_pdf_attachments(order_id, order_items, order_folder)
+    pdf_files = generate_order_pdf_attachments(order_id, order_items, order_folder, include_labels)
     
     # Add list of attachments to the document if any were created
     if pdf_files:
@@ -874,6 +1174,136 @@ def process_individual_order(order_id, order_items, orders_dataframe):
     # Save the Word document
     doc_filename = os.path.join(order_folder, f"Order_{int(float(order_id))}.docx")
     document.save(doc_filename)
+    
+    return pdf_files + [doc_filename]
+
+#
+# ------------------------------------------------------------
+# Download every distinct product image once, several at a time
+# ------------------------------------------------------------
+def prefetch_order_images(orders, max_threads=IMAGE_DOWNLOAD_THREADS):
+    """
+    Downloads and processes the product images of many orders concurrently.
+
+    Downloads are network-bound, so a bounded pool of threads keeps several
+    requests in flight without flooding the image server.
+
+    Args:
+        orders (list): (order_id, order_items DataFrame) pairs
+        max_threads (int): Maximum number of simultaneous downloads
+    Returns:
+        dict: Processed images encoded as JPEG bytes (or None when the download failed) keyed by image URL
+    """
+    # Collect each valid URL only once – the same product often appears in several orders
+    image_urls = {
+        url
+        for _, order_items in orders
+        for url in order_items.get("image_url", pd.Series(dtype=object))
+        if isinstance(url, str) and url.strip()
+    }
+    
+    with ThreadPoolExecutor(max_workers=max(1, max_threads)) as executor:
+        images = dict(zip(image_urls, executor.map(download_and_encode_image, image_urls)))
+    
+    # Record when the cached images were last used, for the next run's eviction
+    IMAGE_CACHE.flush()
+    return images
+
+#
+# ------------------------------------------------------------
+# Download the invoice logo once for all worker processes
+# ------------------------------------------------------------
+def prefetch_invoice_logo():
+    """
+    Downloads the shop logo in the parent process, to be handed to the workers.
+
+    Returns:
+        bytes or None: The logo image, or None when the download failed
+    """
+    try:
+        return IMAGE_CACHE.get(LOGO_URL)
+    except requests.exceptions.RequestException as exception:
+        print(f"Error downloading logo: {exception}")
+        return None
+
+#
+# ------------------------------------------------------------
+# Gather the shipping labels of courier / parcel locker orders
+# ------------------------------------------------------------
+def collect_shipping_labels(orders):
+    """
+    Lists the shipping labels needed by a batch of orders, one per item.
+
+    Args:
+        orders (list): (order_id, order_items DataFrame) pairs
+    Returns:
+        list: (order_item, payment_status) pairs for generate_shipping_labels_pdf
+    """
+    labels = []
+    for _, order_items in orders:
+        # Only out-of-store deliveries get labels (same rule as generate_order_pdf_attachments)
+        if order_items.iloc[0]["delivery_method"] not in ["by_courier", "parcel_locker"]:
+            continue
+        payment_status = order_items.iloc[0]["payment_status"]
+        labels.extend((item, payment_status) for _, item in order_items.iterrows())
+    return labels
+
+#
+# ------------------------------------------------------------
+# Worker entry point: render one order and report the outcome
+# ------------------------------------------------------------
+def process_order_worker(order_id, order_items, images, include_labels=True):
+    """
+    Renders the documents of one order in a worker process.
+
+    Errors are caught and returned instead of raised, so one broken order
+    never stops the others.
+
+    Args:
+        order_id: ID of the order to process
+        order_items (pandas.DataFrame): DataFrame containing items for this order
+        images (dict): Prefetched product images of this order keyed by image URL
+        include_labels (bool): Whether to generate per-item shipping label files
+    Returns:
+        dict: Order ID, success flag, generated files, error message and render time
+    """
+    start = time.perf_counter()
+    try:
+        files = render_order_documents(order_id, order_items, images, include_labels)
+        return {"order_id": order_id, "ok": True, "files": files, "error": None,
+                "seconds": time.perf_counter() - start}
+    except Exception as exception:
+        return {"order_id": order_id, "ok": False, "files": [], "error": str(exception),
+                "seconds": time.perf_counter() - start}
+
+#
+# ------------------------------------------------------------
+# Print how many orders per minute the run achieved
+# ------------------------------------------------------------
+def print_throughput_report(results, workers, download_seconds, total_seconds):
+    """
+    Prints a summary of the processing run.
+
+    Args:
+        results (list): Per-order result dictionaries from process_order_worker
+        workers (int): Number of worker processes used
+        download_seconds (float): Wall time spent prefetching images
+        total_seconds (float): Wall time of the whole run
+    """
+    succeeded = sum(result["ok"] for result in results)
+    render_seconds = sum(result["seconds"] for result in results)
+    documents = sum(len(result["files"]) for result in results)
+    
+    print("\n📈 Throughput report")
+    print(f"   Workers: {workers}")
+    print(f"   Orders: {len(results)} ({succeeded} succeeded, {len(results) - succeeded} failed)")
+    print(f"   Documents generated: {documents}")
+    print(f"   Image download time: {download_seconds:.2f} s")
+    if results:
+        print(f"   Average render time per order: {render_seconds / len(results):.2f} s")
+    print(f"   Total time: {total_seconds:.2f} s")
+    if total_seconds > 0:
+        print(f"   Throughput: {len(results) / total_seconds * 60:.1f} orders/min")
 
 # =========================
 # Main Entrypoint
@@ -883,65 +1313,129 @@ def process_individual_order(order_id, order_items, orders_dataframe):
 # ------------------------------------------------------------
 # Entry point: iterate through Excel and trigger processing
 # ------------------------------------------------------------
-def process_all_orders():
+def process_all_orders(filename="orders.xlsx", workers=DEFAULT_WORKERS, image_threads=IMAGE_DOWNLOAD_THREADS,
+                       bulk_labels=False, ledger_file=DEFAULT_LEDGER_FILE, export_excel=False, retry_failed=False):
     """
     Main function that orchestrates the order processing workflow.
-    Loads orders from Excel, processes unprocessed orders, and updates the Excel file.
+    Loads pending orders from Excel, processes them, and records them in the ledger.
+
+    Args:
+        filename (str): Path to the orders Excel file
+        workers (int): Number of worker processes rendering orders (1 = render in this process)
+        image_threads (int): Number of simultaneous product image downloads
+        bulk_labels (bool): Print all shipping labels of the run into one multi-page PDF
+            instead of one file per item
+        ledger_file (str): Path to the SQLite processing ledger
+        export_excel (bool): Also write the order_processed flags back into the Excel file
+        retry_failed (bool): Render the orders that failed in an earlier run again
     """
-    # NOTE: The Excel sheet acts as the single source of truth.  We load it,
-    # mark rows as processed *in‑memory*, and re‑write the same file at the
-    # end so that a second run won’t duplicate documents.
-    # Define input Excel filename
-    filename = "orders.xlsx"
+    # NOTE: The Excel sheet is the source of the orders, the ledger is the
+    # source of truth for what has been processed.  Each order is recorded
+    # as soon as it is rendered, so a second run won’t duplicate documents –
+    # and the workbook no longer has to be rewritten on every run.
+    run_start = time.perf_counter()
     
     print(f"📄 Loading Excel file: {filename}")
+    ledger = OrderLedger(ledger_file)
     
     try:
-        # Load orders from Excel file
-        orders_dataframe = load_orders_from_excel(filename)
-        print(f"✅ Loaded {len(orders_dataframe)} rows from Excel")
+        # Load only the orders the ledger doesn't know yet
+        pending_orders, skipped = load_pending_orders(filename, ledger, retry_failed)
+        print(f"✅ Loaded {len(pending_orders)} pending orders from Excel")
+        print(f"⏭️ Skipping {skipped} already processed orders")
     except Exception as exception:
-        # Handle Excel loading errors
+        # Handle Excel loading errors (including missing columns)
         print(f"❌ Failed to load Excel file: {exception}")
+        ledger.close()
         return
     
-    # Check if required columns exist in the Excel file
-    if "order_id" not in orders_dataframe.columns or "order_processed" not in orders_dataframe.columns:
-        print("❌ Required columns missing in the Excel file.")
-        print(f"📊 Columns found: {list(orders_dataframe.columns)}")
-        return
+    # Download all product images up front, several at a time
+    download_start = time.perf_counter()
+    images = prefetch_order_images(pending_orders, image_threads)
+    logo_bytes = prefetch_invoice_logo()
+    download_seconds = time.perf_counter() - download_start
+    print(f"🖼️ Prefetched {len(images)} product images in {download_seconds:.2f} s "
+          f"({IMAGE_CACHE.stats['downloaded']} downloaded, {IMAGE_CACHE.stats['revalidated']} revalidated, "
+          f"{IMAGE_CACHE.stats['disk_hits'] + IMAGE_CACHE.stats['memory_hits']} from cache, "
+          f"{IMAGE_CACHE.stats['variant_hits']} already processed)")
     
     # ---------------------------------------------------------------
-    # Main loop – executed once per *unique* order_id in the sheet
+    # Render every pending order – in parallel worker processes
     # ---------------------------------------------------------------
-    # Group orders by order_id and process each order
-    for order_id, order_items in orders_dataframe.groupby("order_id"):
-        print(f"\n🔍 Checking order {order_id}...")
-        
-        # Skip already processed orders
-        if is_order_already_processed(order_items):
-            print(f"⏭️ Skipping already processed order {order_id}")
-            continue
-        
-        print(f"⚙️ Processing order {order_id} with {len(order_items)} items...")
-        
-        try:
-            # Process the order
-            process_individual_order(order_id, order_items, orders_dataframe)
+    def order_images(order_items):
+        # Ship each worker only the images its order needs
+        return {url: images[url] for url in order_items.get("image_url", []) if url in images}
+    
+    def record(result):
+        # Attempted orders are recorded even when they failed, so a rerun never duplicates documents
+        # (failed ones are rendered again with --retry-failed)
+        order_id = result["order_id"]
+        if result["ok"]:
+            mark_order_as_processed(ledger, order_id, STATUS_DONE, files=len(result["files"]))
             print(f"✅ Order {order_id} processed successfully.")
-        except Exception as exception:
+        else:
             # Handle processing errors
-            print(f"❌ Error processing order {order_id}: {exception}")
+            mark_order_as_processed(ledger, order_id, STATUS_FAILED, error=result["error"])
+            print(f"❌ Error processing order {order_id}: {result['error']}")
+        results.append(result)
+    
+    results = []
+    if workers > 1 and len(pending_orders) > 1:
+        # Workers get the logo once, when they start, and the images of each order with it
+        with ProcessPoolExecutor(max_workers=workers, initializer=use_invoice_logo,
+                                 initargs=(logo_bytes,)) as executor:
+            futures = [
+                executor.submit(process_order_worker, order_id, order_items, order_images(order_items),
+                                not bulk_labels)
+                for order_id, order_items in pending_orders
+            ]
+            for future in futures:
+                record(future.result())
+    else:
+        use_invoice_logo(logo_bytes)
+        for order_id, order_items in pending_orders:
+            record(process_order_worker(order_id, order_items, order_images(order_items), not bulk_labels))
+    
+    # Courier batch: every label of the successfully rendered orders in one PDF
+    if bulk_labels:
+        succeeded_ids = {result["order_id"] for result in results if result["ok"]}
+        labels = collect_shipping_labels([order for order in pending_orders if order[0] in succeeded_ids])
+        if labels:
+            labels_pdf = os.path.join("order_attachments", f"shipping_labels_{datetime.now():%Y%m%d_%H%M%S}.pdf")
+            generate_shipping_labels_pdf(labels_pdf, labels)
+            print(f"🏷️ {len(labels)} shipping labels saved to {labels_pdf}")
+    
+    print(f"\n💾 Ledger updated: {ledger_file} {ledger.counts()}")
+    
+    if export_excel:
+        try:
+            # Optional: mirror the ledger into the order_processed column of the workbook
+            export_processed_flags(filename, ledger)
+            print(f"💾 Updated Excel file saved: {filename}")
+        except Exception as exception:
+            # Handle Excel saving errors
+            print(f"❌ Failed to save updated Excel file: {exception}")
     
-    try:
-        # Save updated Excel file with processed orders marked
-        orders_dataframe.to_excel(filename, index=False)
-        print(f"\n💾 Updated Excel file saved: {filename}")
-    except Exception as exception:
-        # Handle Excel saving errors
-        print(f"❌ Failed to save updated Excel file: {exception}")
+    ledger.close()
+    print_throughput_report(results, workers, download_seconds, time.perf_counter() - run_start)
 
 # Check if script is run directly (not imported)
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate order documents from the orders Excel file.")
+    parser.add_argument("--input", default="orders.xlsx", help="Path to the orders Excel file")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Number of worker processes rendering orders (1 = no parallelism)")
+    parser.add_argument("--image-threads", type=int, default=IMAGE_DOWNLOAD_THREADS,
+                        help="Number of simultaneous product image downloads")
+    parser.add_argument("--bulk-labels", action="store_true",
+                        help="Print all shipping labels of the run into one multi-page PDF")
+    parser.add_argument("--ledger", default=DEFAULT_LEDGER_FILE, help="Path to the SQLite processing ledger")
+    parser.add_argument("--export-excel", action="store_true",
+                        help="Write the order_processed flags from the ledger back into the Excel file")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="Render the orders that failed in an earlier run again")
+    args = parser.parse_args()
+    
     print("✅ Script started...")
-    process_all_orders()
+    process_all_orders(args.input, args.workers, args.image_threads, args.bulk_labels,
+                       args.ledger, args.export_excel, args.retry_failed)
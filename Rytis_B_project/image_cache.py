@@ -0,0 +1,403 @@
+"""
+Image Cache
+
+Persistent, content-addressed cache for downloaded images (product photos, the shop logo).
+It provides:
+- An in-memory tier for images used repeatedly within one run
+- A disk tier that survives between runs, with each distinct image stored once under its SHA-256
+- HTTP revalidation with ETag / Last-Modified, so unchanged images are never downloaded again
+- A size cap on the disk tier, evicting the least recently used images first
+- An SQLite index, so processes sharing the cache directory update single entries
+  instead of overwriting each other's index
+- Variants derived from an image (e.g. resized and encoded), made once per image content
+
+Author: Rytis Bimbiras
+"""
+
+import os                               # For file and directory operations
+import time                             # For freshness and LRU timestamps
+import sqlite3                          # For the cache index
+import hashlib                          # For content addressing
+import threading                        # For safe use from download threads
+from contextlib import contextmanager   # For index transactions
+from collections import OrderedDict     # For the in-memory LRU tier
+import requests                         # For making HTTP requests to download images
+
+# =========================
+# Configuration and Constants
+# =========================
+
+# Where cached images live between runs, and how much disk they may use
+DEFAULT_CACHE_DIR = ".image_cache"
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+# How many images the in-memory tier keeps
+DEFAULT_MEMORY_ITEMS = 256
+
+# Cached images younger than this are used without asking the server (seconds)
+DEFAULT_MAX_AGE = 24 * 60 * 60
+
+# Fail fast after 10 s to avoid long stalls (same as the original downloads)
+DEFAULT_TIMEOUT = 10
+
+# Cache hits update last_used (for LRU eviction) in memory, written to the index
+# this many at a time, before evicting and on flush()
+TOUCH_BATCH_SIZE = 64
+
+
+class ImageCache:
+    """
+    Two-tier (memory + disk) cache of image bytes keyed by URL.
+
+    The disk tier is content-addressed: the index (`<cache_dir>/index.sqlite`) maps
+    each URL to the SHA-256 of its content, and the bytes are stored once per
+    distinct content in `<cache_dir>/blobs/<sha256>`.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES,
+                 memory_items=DEFAULT_MEMORY_ITEMS, max_age=DEFAULT_MAX_AGE,
+                 timeout=DEFAULT_TIMEOUT, session=None):
+        """
+        Args:
+            cache_dir (str): Directory holding the index and image blobs
+            max_bytes (int): Disk size cap of the cached images
+            memory_items (int): Number of images kept in memory
+            max_age (float): Seconds a cached image is used without revalidation
+            timeout (float): HTTP timeout in seconds
+            session (requests.Session, optional): Session used for downloads
+        """
+        self.cache_dir = cache_dir
+        self.blob_dir = os.path.join(cache_dir, "blobs")
+        self.index_path = os.path.join(cache_dir, "index.sqlite")
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self.max_age = max_age
+        self.timeout = timeout
+        self.session = session or requests.Session()
+
+        # Hit/miss counters, useful to check the cache actually works
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "revalidated": 0, "downloaded": 0, "evicted": 0,
+                      "variant_hits": 0, "variants_made": 0}
+
+        self._memory = OrderedDict()
+        self._touched = {}
+        self._lock = threading.Lock()
+        self._connection = None
+        self._connection_pid = None
+        os.makedirs(self.blob_dir, exist_ok=True)
+        with self._lock:
+            self._index()
+
+    # ------------------------------------------------------------
+    # Index persistence
+    # ------------------------------------------------------------
+    def _index(self):
+        # One connection per process: a connection inherited by a forked worker must not be used
+        if self._connection is None or self._connection_pid != os.getpid():
+            connection = sqlite3.connect(self.index_path, timeout=30, isolation_level=None,
+                                         check_same_thread=False)
+            connection.row_factory = sqlite3.Row
+            # Readers never wait for a process that is writing
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS images (
+                    url           TEXT PRIMARY KEY,
+                    sha256        TEXT NOT NULL,
+                    size          INTEGER NOT NULL,
+                    etag          TEXT,
+                    last_modified TEXT,
+                    fetched_at    REAL NOT NULL,
+                    last_used     REAL NOT NULL
+                )
+                """
+            )
+            # Derived images, valid while the image of their URL still has the content they were made from
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS variants (
+                    url           TEXT NOT NULL,
+                    variant       TEXT NOT NULL,
+                    source_sha256 TEXT NOT NULL,
+                    sha256        TEXT NOT NULL,
+                    size          INTEGER NOT NULL,
+                    PRIMARY KEY (url, variant)
+                )
+                """
+            )
+            self._connection, self._connection_pid = connection, os.getpid()
+        return self._connection
+
+    @contextmanager
+    def _transaction(self):
+        # IMMEDIATE: other processes wait until the whole read-modify-write is committed
+        index = self._index()
+        index.execute("BEGIN IMMEDIATE")
+        try:
+            yield index
+        except BaseException:
+            index.execute("ROLLBACK")
+            raise
+        index.execute("COMMIT")
+
+    def _entry(self, url):
+        row = self._index().execute("SELECT * FROM images WHERE url = ?", (url,)).fetchone()
+        return dict(row) if row else None
+
+    def _blob_path(self, sha256):
+        return os.path.join(self.blob_dir, sha256)
+
+    # ------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------
+    def get(self, url):
+        """
+        Returns the image bytes of a URL, downloading them only when needed.
+
+        Args:
+            url (str): Image URL
+        Returns:
+            bytes: Image content
+        Raises:
+            requests.exceptions.RequestException: If the image can not be downloaded
+                and no cached copy exists
+        """
+        return self._fetch(url)[1]
+
+    def get_variant(self, url, variant, make):
+        """
+        Returns bytes derived from the image of a URL (e.g. resized and encoded),
+        made only once per content of the image and kept on disk with it.
+
+        Args:
+            url (str): Image URL
+            variant (str): Key of the derivation, e.g. its parameters
+            make (callable): Makes the variant bytes from the image bytes
+        Returns:
+            bytes: Variant content
+        Raises:
+            requests.exceptions.RequestException: If the image can not be downloaded
+                and no cached copy exists
+        """
+        entry, content = self._fetch(url)
+        with self._lock:
+            row = self._index().execute(
+                "SELECT sha256 FROM variants WHERE url = ? AND variant = ? AND source_sha256 = ?",
+                (url, variant, entry["sha256"]),
+            ).fetchone()
+            cached = self._read_blob(row) if row else None
+            if cached is not None:
+                self.stats["variant_hits"] += 1
+                return cached
+
+        # Made outside the lock, so other threads keep using the cache
+        derived = make(content)
+
+        with self._lock:
+            sha256 = self._write_blob(derived)
+            with self._transaction() as index:
+                previous = index.execute("SELECT sha256 FROM variants WHERE url = ? AND variant = ?",
+                                         (url, variant)).fetchone()
+                index.execute("INSERT OR REPLACE INTO variants VALUES (?, ?, ?, ?, ?)",
+                              (url, variant, entry["sha256"], sha256, len(derived)))
+                if previous and previous["sha256"] != sha256:
+                    self._remove_blob_if_unused(index, previous["sha256"])
+                self._evict(index, keep=url)
+            self.stats["variants_made"] += 1
+        return derived
+
+    def flush(self):
+        """Writes the pending last_used timestamps of cache hits to the index."""
+        with self._lock:
+            self._flush_touched()
+
+    def clear_memory(self):
+        """Empties the in-memory tier (the disk tier is kept)."""
+        with self._lock:
+            self._memory.clear()
+
+    def close(self):
+        """Flushes the index and closes it (it is reopened on the next use)."""
+        with self._lock:
+            self._flush_touched()
+            if self._connection is not None and self._connection_pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+
+    # ------------------------------------------------------------
+    # Lookup and download
+    # ------------------------------------------------------------
+    def _fetch(self, url):
+        # Returns (index entry, image bytes)
+        with self._lock:
+            # ------- 1. Memory tier -------------------------------------
+            cached = self._memory.get(url)
+            if cached and self._is_fresh(cached[0]):
+                self._memory.move_to_end(url)
+                self.stats["memory_hits"] += 1
+                self._touch(url)
+                return cached
+
+            # ------- 2. Disk tier, still fresh ---------------------------
+            entry = self._entry(url)
+            content = self._read_blob(entry) if entry else None
+            if content is None:
+                # Blob deleted (e.g. by hand or evicted by another process): download it again
+                entry = None
+            elif self._is_fresh(entry):
+                self.stats["disk_hits"] += 1
+                self._touch(url)
+                self._remember(url, entry, content)
+                return entry, content
+
+        # ------- 3. Ask the server (conditionally if we have a copy) -----
+        # Network calls happen outside the lock, so other threads keep using the cache
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+            if response.status_code != 304:
+                response.raise_for_status()
+        except requests.exceptions.RequestException:
+            # Serve a stale copy rather than nothing when the server is unreachable
+            if content is None:
+                raise
+            return entry, content
+
+        with self._lock:
+            if response.status_code == 304 and entry:
+                # Not modified – our copy is still valid, only refresh its timestamps
+                self.stats["revalidated"] += 1
+                entry["fetched_at"] = entry["last_used"] = time.time()
+                self._index().execute("UPDATE images SET fetched_at = ?, last_used = ? WHERE url = ?",
+                                      (entry["fetched_at"], entry["last_used"], url))
+                self._touched.pop(url, None)
+                self._remember(url, entry, content)
+                return entry, content
+
+            content = response.content
+            entry = self._store(url, content, response.headers)
+            self.stats["downloaded"] += 1
+            return entry, content
+
+    # ------------------------------------------------------------
+    # Internals (callers hold the lock)
+    # ------------------------------------------------------------
+    def _is_fresh(self, entry):
+        return time.time() - entry.get("fetched_at", 0) < self.max_age
+
+    def _read_blob(self, entry):
+        try:
+            with open(self._blob_path(entry["sha256"]), "rb") as blob_file:
+                return blob_file.read()
+        except OSError:
+            return None
+
+    def _touch(self, url):
+        self._touched[url] = time.time()
+        if len(self._touched) >= TOUCH_BATCH_SIZE:
+            self._flush_touched()
+
+    def _flush_touched(self):
+        if not self._touched:
+            return
+        with self._transaction() as index:
+            index.executemany("UPDATE images SET last_used = MAX(last_used, ?) WHERE url = ?",
+                              [(last_used, url) for url, last_used in self._touched.items()])
+        self._touched.clear()
+
+    def _remember(self, url, entry, content):
+        self._memory[url] = (entry, content)
+        self._memory.move_to_end(url)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _write_blob(self, content):
+        sha256 = hashlib.sha256(content).hexdigest()
+        blob_path = self._blob_path(sha256)
+
+        # Identical content (e.g. the same photo under two URLs) is stored only once
+        if not os.path.exists(blob_path):
+            temporary_path = f"{blob_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temporary_path, "wb") as blob_file:
+                blob_file.write(content)
+            os.replace(temporary_path, blob_path)
+        return sha256
+
+    def _store(self, url, content, headers):
+        sha256 = self._write_blob(content)
+        now = time.time()
+        entry = {
+            "url": url,
+            "sha256": sha256,
+            "size": len(content),
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "fetched_at": now,
+            "last_used": now,
+        }
+
+        # Eviction below uses the latest last_used of this process's hits
+        self._flush_touched()
+        with self._transaction() as index:
+            previous = index.execute("SELECT sha256 FROM images WHERE url = ?", (url,)).fetchone()
+            index.execute("INSERT OR REPLACE INTO images VALUES (:url, :sha256, :size, :etag, "
+                          ":last_modified, :fetched_at, :last_used)", entry)
+            # The image changed on the server – drop the old content and its variants
+            # unless another URL still uses them
+            if previous and previous["sha256"] != sha256:
+                self._remove_blob_if_unused(index, previous["sha256"])
+                self._drop_variants(index, url, keep_source=sha256)
+            self._evict(index, keep=url)
+        self._remember(url, entry, content)
+        return entry
+
+    def _evict(self, index, keep):
+        rows = index.execute("SELECT url, sha256, size FROM images ORDER BY last_used").fetchall()
+        variant_rows = index.execute("SELECT sha256, size FROM variants").fetchall()
+
+        # Size of the disk tier counts each distinct blob (image or variant) once
+        total = sum({row["sha256"]: row["size"] for row in rows + variant_rows}.values())
+
+        # Evict least recently used URLs until the disk tier fits the cap
+        # (the image just stored is always kept, even when it alone exceeds the cap)
+        for row in rows:
+            if total <= self.max_bytes:
+                break
+            if row["url"] == keep:
+                continue
+            index.execute("DELETE FROM images WHERE url = ?", (row["url"],))
+            self._memory.pop(row["url"], None)
+            self._touched.pop(row["url"], None)
+            self.stats["evicted"] += 1
+
+            # Delete the blob only when no other URL still points at it
+            if self._remove_blob_if_unused(index, row["sha256"]):
+                total -= row["size"]
+            total -= self._drop_variants(index, row["url"])
+
+    def _drop_variants(self, index, url, keep_source=None):
+        # Deletes the variants of a URL (except those made from keep_source), returns the bytes freed
+        rows = index.execute("SELECT variant, sha256, size FROM variants WHERE url = ? AND source_sha256 IS NOT ?",
+                             (url, keep_source)).fetchall()
+        freed = 0
+        for row in rows:
+            index.execute("DELETE FROM variants WHERE url = ? AND variant = ?", (url, row["variant"]))
+            if self._remove_blob_if_unused(index, row["sha256"]):
+                freed += row["size"]
+        return freed
+
+    def _remove_blob_if_unused(self, index, sha256):
+        if (index.execute("SELECT 1 FROM images WHERE sha256 = ? LIMIT 1", (sha256,)).fetchone()
+                or index.execute("SELECT 1 FROM variants WHERE sha256 = ? LIMIT 1", (sha256,)).fetchone()):
+            return False
+        try:
+            os.remove(self._blob_path(sha256))
+        except OSError:
+            pass
+        return True
@@ -1,11 +1,11 @@
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import GradientBoostingRegressor
-from sklearn.model_selection import TimeSeriesSplit, GridSearchCV
 from sklearn.metrics import r2_score, mean_absolute_error
+from order_data import load_orders
+from revenue_model import train_revenue_model
 
-# Load and preprocess data
-orders = pd.read_excel("orders.xlsx")
+# Load and preprocess data (cached as Parquet, see order_data.py)
+orders = load_orders("orders.xlsx")
 orders['date'] = pd.to_datetime(orders['date'])
 orders['weekday'] = orders['date'].dt.day_name()
 
@@ -35,30 +35,22 @@ daily_data = create_features(daily_data)
 X = daily_data.drop(columns=['date', 'item_price', 'weekday'])
 y = daily_data['item_price']
 
-# Time-series cross-validation
-tscv = TimeSeriesSplit(n_splits=5)
-
-# Model with hyperparameter grid
-model = GradientBoostingRegressor(random_state=42)
-param_grid = {
-    'n_estimators': [100, 200],
-    'learning_rate': [0.01, 0.05],
-    'max_depth': [3, 5],
-    'subsample': [0.8, 1.0],
-    'min_samples_split': [2, 5]
-}
-
-# Grid search with time-series validation
-grid_search = GridSearchCV(model, param_grid, cv=tscv, 
-                          scoring='r2', n_jobs=-1)
-grid_search.fit(X, y)
+# Successive halving with time-series validation, reused while the data is unchanged
+# (see revenue_model.py)
+training = train_revenue_model(X, y)
 
 # Best model
-best_model = grid_search.best_estimator_
+best_model = training['model']
 y_pred = best_model.predict(X)
 
 # Evaluation
-print(f"Best Parameters: {grid_search.best_params_}")
+if training['from_cache']:
+    print(f"Loaded stored model (data fingerprint {training['fingerprint'][:12]})")
+print(f"Model: {training['method']}")
+print(f"Fit time: {training['fit_seconds']:.2f}s, {training['candidates']} candidates, "
+      f"{training['candidate_fits']} cross-validation fits")
+print(f"Best Parameters: {training['best_params']}")
+print(f"CV R²: {training['cv_score']:.3f}")
 print(f"Training R²: {r2_score(y, y_pred):.3f}")
 print(f"MAE: {mean_absolute_error(y, y_pred):.2f}")
 
@@ -6,17 +6,15 @@ import pandas as pd                                  # For data handling
 import matplotlib.pyplot as plt                      # For creating charts
 from sklearn.preprocessing import StandardScaler     # For standardizing our data
 from sklearn.cluster import KMeans                   # For clustering
-from sklearn.metrics import silhouette_score         # For evaluating clusters
 import seaborn as sns                                # For better visualizations
+from order_data import load_orders                   # For loading the cached order data
+from customer_rfm import build_rfm, silhouette_sweep # For RFM features and choosing the clusters
 
 # STEP 1: Load and prepare the data
 print("Loading the sales data...")
-orders = pd.read_excel('orders.xlsx')
+orders = load_orders('orders.xlsx')  # Parsed once, then read from a fast Parquet cache
 print(f"Loaded {len(orders)} order records from {len(orders['client'].unique())} unique customers.")
 
-# Calculate the total amount spent for each order line
-orders['total_spent'] = orders['item_price'] * orders['ordered_quantity']
-
 # STEP 2: Calculate RFM metrics
 print("\nCalculating customer shopping behavior metrics...")
 # RFM stands for Recency, Frequency, Monetary
@@ -24,15 +22,9 @@ print("\nCalculating customer shopping behavior metrics...")
 # - Frequency: How often does the customer purchase?
 # - Monetary: How much does the customer spend?
 
-# Group data by customer
-customer_rfm = orders.groupby('client').agg({
-    'date': lambda x: (pd.to_datetime(orders['date'].max()) - pd.to_datetime(x.max())).days,  # Days since last purchase
-    'order_id': 'nunique',                                                                    # Number of orders
-    'total_spent': 'sum'                                                                      # Total amount spent
-}).reset_index()
-
-# Rename columns for clarity
-customer_rfm.columns = ['Customer', 'Recency', 'Frequency', 'Monetary']
+# One pass over all orders: days since last purchase, number of orders and total amount spent
+# per customer (columns Customer, Recency, Frequency, Monetary)
+customer_rfm = build_rfm(orders)
 
 # Show the first few rows
 print("\nHere's what the customer data looks like:")
@@ -48,14 +40,11 @@ rfm_scaled = scaler.fit_transform(customer_rfm[['Recency', 'Frequency', 'Monetar
 # STEP 4: Find the optimal number of clusters
 print("\nFinding the best number of customer groups...")
 # The silhouette score helps us determine how well-separated the clusters are
-silhouette_scores = []
 cluster_range = range(2, 6)  # Try 2-5 clusters
 
-for k in cluster_range:
-    kmeans = KMeans(n_clusters=k, random_state=42)
-    cluster_labels = kmeans.fit_predict(rfm_scaled)
-    silhouette_avg = silhouette_score(rfm_scaled, cluster_labels)
-    silhouette_scores.append(silhouette_avg)
+# All candidates are fitted at the same time (sampled score for very many customers)
+silhouette_scores = silhouette_sweep(rfm_scaled, cluster_range)
+for k, silhouette_avg in zip(cluster_range, silhouette_scores):
     print(f"With {k} clusters, the silhouette score is {silhouette_avg:.3f}")
 
 # STEP 5: Visualize the silhouette scores
@@ -0,0 +1,204 @@
+"""
+Order Data Access
+
+Shared loader of the e-shop orders for the analytics report and the ML scripts.
+The workbook is parsed once and stored as a typed Parquet file with the derived
+columns already computed (date, week, month, total_price, city). Later runs read
+the Parquet file, which takes milliseconds instead of re-parsing the XLSX.
+
+The cache is rebuilt when the workbook changes: its modification time and size
+are checked first, and the content hash only when those differ.
+
+Author: Rytis Bimbiras
+"""
+
+import os                               # For file and directory operations
+import re                               # For extracting the city from addresses
+import json                             # For the cache metadata file
+import hashlib                          # For fingerprinting the workbook
+import numpy as np                      # For mapping cities back to rows
+import pandas as pd                     # For data handling
+
+# =========================
+# Configuration and Constants
+# =========================
+
+ORDERS_FILE = "orders.xlsx"
+CACHE_DIR = ".data_cache"
+
+# Bump when the derived columns change, so old caches are rebuilt
+CACHE_VERSION = 2
+
+# Columns computed from the raw workbook columns
+DERIVED_COLUMNS = ["week", "month", "total_price", "city"]
+
+# Matches the city in addresses like "Gatvės g. 45, Vilnius, LT-08100"
+CITY_PATTERN = re.compile(r',\s*([^,]+),\s*LT-\d+')
+
+# Low-cardinality columns stored as categoricals (less memory, faster grouping)
+CATEGORICAL_COLUMNS = ["shop", "city", "payment_status", "month"]
+
+
+#
+# ------------------------------------------------------------
+# Fingerprint of the source workbook
+# ------------------------------------------------------------
+def file_sha256(filename, chunk_size=1024 * 1024):
+    """
+    Args:
+        filename (str): Path to the file
+        chunk_size (int): Bytes read at a time
+    Returns:
+        str: SHA-256 of the file content
+    """
+    digest = hashlib.sha256()
+    with open(filename, "rb") as source:
+        for chunk in iter(lambda: source.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+#
+# ------------------------------------------------------------
+# Parse the workbook into consistently typed columns
+# ------------------------------------------------------------
+def read_orders_excel(filename):
+    """
+    Reads the orders workbook.
+
+    Args:
+        filename (str): Path to the Excel file
+    Returns:
+        pandas.DataFrame: Raw orders with stripped column names and typed columns
+    """
+    df = pd.read_excel(filename, engine="openpyxl")
+
+    # Strip whitespace from column names
+    df.columns = df.columns.str.strip()
+
+    # Mixed-type columns (e.g. sizes "M", 42, 44.5) become text, so they can be stored in Parquet
+    for column in df.columns[df.dtypes == object]:
+        df[column] = df[column].map(lambda value: value if pd.isna(value) else str(value)).astype("string")
+
+    return df
+
+
+#
+# ------------------------------------------------------------
+# Derived columns used by the reports and models
+# ------------------------------------------------------------
+def add_derived_columns(df):
+    """
+    Adds the date-based, price and city columns (vectorized, no per-row Python calls).
+
+    Args:
+        df (pandas.DataFrame): Raw orders
+    Returns:
+        pandas.DataFrame: Copy of the orders with parsed dates and DERIVED_COLUMNS
+    """
+    df = df.copy()
+
+    # ------ DateTime Conversion ------
+    df['date'] = pd.to_datetime(df['date'], errors='coerce')
+
+    # ------ Time Period Calculations ------
+    df['week'] = df['date'].dt.to_period('W').dt.start_time
+
+    # "YYYY-MM" labels, formatted once per distinct month instead of once per row
+    month_codes, months = pd.factorize(df['date'].dt.to_period('M'), sort=True)
+    df['month'] = pd.Categorical.from_codes(month_codes, categories=months.strftime('%Y-%m'))
+
+    # ------ Financial Calculations ------
+    df['total_price'] = df['item_price'] * df['ordered_quantity']
+
+    # ------ Address Parsing ------
+    if 'address' in df.columns:
+        # Customers reorder to the same address, so the pattern runs once per distinct address
+        address_codes, addresses = pd.factorize(df['address'])
+        cities = pd.Series(addresses, dtype='string').str.extract(CITY_PATTERN, expand=False).str.strip()
+        # Code -1 (missing address) picks the trailing 'Unknown'
+        cities = np.append(cities.fillna('Unknown').to_numpy(dtype=object), 'Unknown')
+        df['city'] = cities[address_codes]
+    else:
+        df['city'] = 'Unknown'
+
+    # ------ Categorical Columns ------
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype('category')
+
+    return df
+
+
+#
+# ------------------------------------------------------------
+# Cache bookkeeping
+# ------------------------------------------------------------
+def cache_paths(filename, cache_dir=CACHE_DIR):
+    """
+    Args:
+        filename (str): Path to the source workbook
+        cache_dir (str): Cache directory
+    Returns:
+        tuple: (Parquet file path, metadata file path)
+    """
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    return os.path.join(cache_dir, f"{stem}.parquet"), os.path.join(cache_dir, f"{stem}.meta.json")
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path, encoding="utf-8") as meta_file:
+            return json.load(meta_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_meta(meta_path, meta):
+    temporary_path = f"{meta_path}.{os.getpid()}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as meta_file:
+        json.dump(meta, meta_file)
+    os.replace(temporary_path, meta_path)
+
+
+#
+# ------------------------------------------------------------
+# Public entry point: cached, typed, derived orders
+# ------------------------------------------------------------
+def load_orders(filename=ORDERS_FILE, cache_dir=CACHE_DIR, refresh=False):
+    """
+    Loads the orders with derived columns, from the Parquet cache when it is up to date.
+
+    Args:
+        filename (str): Path to the orders Excel file
+        cache_dir (str): Directory of the Parquet cache
+        refresh (bool): Rebuild the cache even if it looks up to date
+    Returns:
+        pandas.DataFrame: Orders including DERIVED_COLUMNS
+    """
+    parquet_path, meta_path = cache_paths(filename, cache_dir)
+    stat = os.stat(filename)
+    meta = _read_meta(meta_path)
+    cache_usable = not refresh and meta.get("version") == CACHE_VERSION and os.path.exists(parquet_path)
+
+    # Fast path: the workbook was not touched since the cache was written
+    if cache_usable and meta.get("mtime_ns") == stat.st_mtime_ns and meta.get("size") == stat.st_size:
+        return pd.read_parquet(parquet_path)
+
+    # Touched (e.g. copied or re-saved) but maybe unchanged – compare the content
+    sha256 = file_sha256(filename)
+    if cache_usable and meta.get("sha256") == sha256:
+        _write_meta(meta_path, {**meta, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size})
+        return pd.read_parquet(parquet_path)
+
+    # Changed or never cached: parse the workbook and store the result
+    df = add_derived_columns(read_orders_excel(filename))
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        df.to_parquet(parquet_path, index=False)
+        _write_meta(meta_path, {"version": CACHE_VERSION, "mtime_ns": stat.st_mtime_ns,
+                                "size": stat.st_size, "sha256": sha256})
+    except ImportError as exception:
+        # No Parquet engine (pyarrow) installed – still return the data, just uncached
+        print(f"⚠️ Orders cache disabled: {exception}")
+    return df
@@ -0,0 +1,112 @@
+"""
+Order Ledger
+
+Durable record of which orders have been processed, kept in a local SQLite file.
+It replaces rewriting the `order_processed` column of the orders workbook on every run:
+- Looking up or recording an order is a single indexed query (O(1) per order)
+- Every order is recorded as soon as it is rendered, so an interrupted run loses nothing
+- Writing the flags back into the workbook becomes an optional export step
+
+Author: Rytis Bimbiras
+"""
+
+import sqlite3                          # For the ledger database
+from datetime import datetime           # For processing timestamps
+
+# =========================
+# Configuration and Constants
+# =========================
+
+# Default ledger file, next to the orders workbook
+DEFAULT_LEDGER_FILE = "orders_ledger.sqlite"
+
+# Possible order statuses
+STATUS_DONE = "done"            # Documents generated
+STATUS_FAILED = "failed"        # Attempted, but rendering raised an error
+STATUS_IMPORTED = "imported"    # Already flagged "yes" in the workbook before the ledger existed
+
+
+#
+# ------------------------------------------------------------
+# Normalise order IDs (Excel gives 7, 7.0 or "7") into one key
+# ------------------------------------------------------------
+def order_key(order_id):
+    """
+    Converts an order ID into the key used by the ledger.
+
+    Args:
+        order_id: Order ID as read from the workbook
+    Returns:
+        str: Normalised order ID
+    """
+    try:
+        return str(int(float(order_id)))
+    except (TypeError, ValueError):
+        return str(order_id).strip()
+
+
+class OrderLedger:
+    """
+    Processing status of orders keyed by order ID, stored in SQLite.
+    """
+
+    def __init__(self, path=DEFAULT_LEDGER_FILE):
+        """
+        Args:
+            path (str): Path to the SQLite ledger file (created if missing)
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS processed_orders (
+                order_id     TEXT PRIMARY KEY,
+                status       TEXT NOT NULL,
+                processed_at TEXT NOT NULL,
+                files        INTEGER NOT NULL DEFAULT 0,
+                error        TEXT
+            )
+            """
+        )
+        self.connection.commit()
+
+    def processed_ids(self, include_failed=True):
+        """
+        Args:
+            include_failed (bool): Also return orders whose rendering failed
+        Returns:
+            set: Keys (see order_key) of the orders in the ledger
+        """
+        if include_failed:
+            rows = self.connection.execute("SELECT order_id FROM processed_orders")
+        else:
+            rows = self.connection.execute("SELECT order_id FROM processed_orders WHERE status != ?",
+                                           (STATUS_FAILED,))
+        return {row[0] for row in rows}
+
+    def mark_processed(self, order_id, status=STATUS_DONE, files=0, error=None):
+        """
+        Records the outcome of an order (replacing an earlier record of the same order).
+
+        Args:
+            order_id: Order ID
+            status (str): STATUS_DONE, STATUS_FAILED or STATUS_IMPORTED
+            files (int): Number of generated documents
+            error (str, optional): Error message of a failed order
+        """
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO processed_orders (order_id, status, processed_at, files, error) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (order_key(order_id), status, datetime.now().isoformat(timespec="seconds"), files, error),
+            )
+
+    def counts(self):
+        """
+        Returns:
+            dict: Number of orders per status
+        """
+        return dict(self.connection.execute("SELECT status, COUNT(*) FROM processed_orders GROUP BY status"))
+
+    def close(self):
+        self.connection.close()
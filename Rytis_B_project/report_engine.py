@@ -0,0 +1,260 @@
+"""
+Analytics Report Engine
+
+Renders the pages of the e-shop analytics report (e_shop_analytics.py):
+- Every page is an independent figure rendered with the Agg backend into its
+  own one-page PDF, in parallel worker processes
+- Pages are cached under a hash of the metric tables they show, so a page
+  whose tables did not change is reused instead of drawn again
+- The page PDFs are merged (pypdf) into the final report
+
+Without pypdf the pages are drawn one after another straight into the report.
+
+Author: Rytis Bimbiras
+"""
+
+import os                               # For file and directory operations
+import glob                             # For pruning outdated cached pages
+import time                             # For timing the report
+import hashlib                          # For the page cache keys
+import matplotlib                       # For selecting the non-interactive backend
+matplotlib.use("Agg")                   # Render to files only, no windows (also safe in worker processes)
+import matplotlib.pyplot as plt         # For creating charts
+from matplotlib.backends.backend_pdf import PdfPages # For the report without pypdf
+import seaborn as sns                   # For better visualizations
+import pandas as pd                     # For hashing the metric tables
+from concurrent.futures import ProcessPoolExecutor # For rendering pages in parallel
+
+try:
+    from pypdf import PdfWriter         # For merging the page PDFs
+except ImportError:
+    PdfWriter = None
+
+# =========================
+# Configuration and Constants
+# =========================
+
+REPORT_CACHE_DIR = ".report_cache"
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+# Bump when the look of a page changes, so cached pages are drawn again
+PAGE_VERSION = 1
+
+# Cities shown individually on the geography page, the rest are summed as "Other"
+TOP_CITIES = 15
+
+
+def apply_style():
+    # Consistent visual style, applied in every process that draws pages
+    sns.set(style="whitegrid")
+    plt.rcParams['font.size'] = 10
+
+
+def style_plot(ax, title, ylabel, xlabel=None):
+    """Standardize plot styling"""
+    ax.set_title(title, pad=20)
+    ax.set_ylabel(ylabel)
+    if xlabel:
+        ax.set_xlabel(xlabel)
+    ax.grid(True, alpha=0.3)
+
+# =========================
+# Report Pages
+# =========================
+# Each page function receives the metric tables it needs and returns a figure
+
+def page_weekly_revenue(tables):
+    # ------ Revenue Analysis ------
+    fig, ax = plt.subplots(figsize=(12, 6))
+    sns.lineplot(x=tables['weekly']['week'], y=tables['weekly']['revenue'], marker='o', ax=ax)
+    style_plot(ax, 'Weekly Revenue Trend', 'Revenue (€)', 'Week')
+    return fig
+
+
+def page_monthly_summary(tables):
+    # ------ Monthly Revenue and Average Order Value ------
+    monthly = tables['monthly']
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10))
+    sns.barplot(x=monthly['month'].astype(str), y=monthly['revenue'], color='steelblue', ax=ax1)
+    style_plot(ax1, 'Revenue per Month', 'Revenue (€)')
+    sns.lineplot(x=monthly['month'].astype(str), y=monthly['avg_order_value'], marker='o', ax=ax2)
+    style_plot(ax2, 'Average Order Value per Month', 'Average Order Value (€)', 'Month')
+    return fig
+
+
+def page_payment_fulfillment(tables):
+    # ------ Payment vs Fulfillment Comparison ------
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10))
+
+    # Payment Methods
+    tables['payment_month'].plot(kind='bar', stacked=True, ax=ax1, cmap='Pastel1')
+    style_plot(ax1, 'Payment Methods per Month', 'Number of Orders')
+
+    # Fulfillment Status
+    tables['fulfillment_month'].plot(kind='bar', stacked=True, ax=ax2, cmap='Set2')
+    style_plot(ax2, 'Order Fulfillment Status per Month', 'Number of Orders')
+    return fig
+
+
+def page_shop_performance(tables):
+    # ------ Shop Performance ------
+    shops = tables['shop_perf'].sort_values('revenue', ascending=False)
+    fig, axes = plt.subplots(1, 3, figsize=(15, 6))
+    for ax, column, title, ylabel in [
+        (axes[0], 'revenue', 'Revenue per Shop', 'Revenue (€)'),
+        (axes[1], 'sales', 'Units Sold per Shop', 'Units'),
+        (axes[2], 'orders', 'Orders per Shop', 'Number of Orders'),
+    ]:
+        sns.barplot(x=shops['shop'].astype(str), y=shops[column], color='seagreen', ax=ax)
+        style_plot(ax, title, ylabel, 'Shop')
+        ax.tick_params(axis='x', rotation=45)
+    return fig
+
+
+def page_customer_geography(tables):
+    # ------ Customer Geography ------
+    # Cities as rows, busiest first; the long tail is summed into "Other"
+    city_month = tables['city_month'].T
+    city_month = city_month.loc[city_month.sum(axis=1).sort_values(ascending=False).index]
+    if len(city_month) > TOP_CITIES:
+        other = city_month.iloc[TOP_CITIES:].sum().rename('Other')
+        city_month = pd.concat([city_month.iloc[:TOP_CITIES], other.to_frame().T])
+    city_month.index = city_month.index.astype(str)
+    city_month.columns = city_month.columns.astype(str)
+
+    fig, ax = plt.subplots(figsize=(12, max(4, 0.45 * len(city_month) + 2)))
+    sns.heatmap(city_month, annot=True, fmt='g', cmap='Blues', cbar_kws={'label': 'Order Lines'}, ax=ax)
+    style_plot(ax, 'Order Lines per City and Month', 'City', 'Month')
+    ax.tick_params(axis='y', rotation=0)
+    return fig
+
+
+# Report pages in order: (name, page function, metric tables shown)
+PAGES = [
+    ('weekly_revenue', page_weekly_revenue, ['weekly']),
+    ('monthly_summary', page_monthly_summary, ['monthly']),
+    ('payment_fulfillment', page_payment_fulfillment, ['payment_month', 'fulfillment_month']),
+    ('shop_performance', page_shop_performance, ['shop_perf']),
+    ('customer_geography', page_customer_geography, ['city_month']),
+]
+
+# =========================
+# Page Cache
+# =========================
+
+def table_hash(table):
+    """
+    Args:
+        table (pandas.DataFrame): Metric table
+    Returns:
+        str: SHA-256 over the labels and values of the table
+    """
+    digest = hashlib.sha256()
+    digest.update(repr((list(map(str, table.columns)), list(table.columns.names), list(table.index.names))).encode())
+    digest.update(pd.util.hash_pandas_object(table, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def page_key(name, tables):
+    """
+    Args:
+        name (str): Page name
+        tables (dict): Metric tables shown on the page
+    Returns:
+        str: Cache key of the page (changes when a table or the page version changes)
+    """
+    digest = hashlib.sha256(f"{name}:{PAGE_VERSION}:{matplotlib.__version__}".encode())
+    for table_name in sorted(tables):
+        digest.update(f"{table_name}:{table_hash(tables[table_name])}".encode())
+    return digest.hexdigest()
+
+# =========================
+# Rendering
+# =========================
+
+def draw_page(page_function, tables):
+    fig = page_function(tables)
+    fig.tight_layout()  # Once per page, after all axes are drawn
+    return fig
+
+
+def render_page(page_function, tables, path):
+    """
+    Draws one page into its own PDF file (runs in a worker process).
+
+    Args:
+        page_function (callable): One of the page functions
+        tables (dict): Metric tables of the page
+        path (str): Output PDF path
+    Returns:
+        str: The output path
+    """
+    apply_style()
+    fig = draw_page(page_function, tables)
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    fig.savefig(temporary_path, format='pdf')
+    plt.close(fig)
+    os.replace(temporary_path, path)
+    return path
+
+
+def build_report(metrics, output_file, workers=DEFAULT_WORKERS, cache_dir=REPORT_CACHE_DIR):
+    """
+    Renders all report pages (in parallel, reusing unchanged pages) and writes the report PDF.
+
+    Args:
+        metrics (dict): Metric tables from calculate_metrics
+        output_file (str): Path of the report PDF
+        workers (int): Number of worker processes drawing pages (1 = draw in this process)
+        cache_dir (str): Directory of the cached page PDFs
+    Returns:
+        dict: pages, rendered and cached page counts and the wall time in seconds
+    """
+    start = time.perf_counter()
+    pages = [(name, page_function, {table: metrics[table] for table in table_names})
+             for name, page_function, table_names in PAGES]
+
+    # Without pypdf the pages can't be merged – draw them straight into one PDF
+    if PdfWriter is None:
+        apply_style()
+        with PdfPages(output_file) as pdf:
+            for _, page_function, tables in pages:
+                fig = draw_page(page_function, tables)
+                pdf.savefig(fig)
+                plt.close(fig)
+        return {'pages': len(pages), 'rendered': len(pages), 'cached': 0,
+                'seconds': time.perf_counter() - start}
+
+    # ------ Find the pages that must be drawn ------
+    os.makedirs(cache_dir, exist_ok=True)
+    page_paths, missing = [], []
+    for name, page_function, tables in pages:
+        path = os.path.join(cache_dir, f"{name}_{page_key(name, tables)[:16]}.pdf")
+        page_paths.append(path)
+        if not os.path.exists(path):
+            missing.append((page_function, tables, path))
+
+        # Drop outdated versions of this page
+        for old_path in glob.glob(os.path.join(cache_dir, f"{name}_*.pdf")):
+            if old_path != path:
+                os.remove(old_path)
+
+    # ------ Draw them, in parallel when there is more than one ------
+    if workers > 1 and len(missing) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(missing))) as executor:
+            futures = [executor.submit(render_page, *page) for page in missing]
+            for future in futures:
+                future.result()  # Re-raise errors of the workers
+    else:
+        for page in missing:
+            render_page(*page)
+
+    # ------ Merge the pages into the report ------
+    writer = PdfWriter()
+    for path in page_paths:
+        writer.append(path)
+    with open(output_file, "wb") as report:
+        writer.write(report)
+
+    return {'pages': len(pages), 'rendered': len(missing), 'cached': len(pages) - len(missing),
+            'seconds': time.perf_counter() - start}
@@ -0,0 +1,159 @@
+"""
+Revenue Model Training
+
+Trains the daily revenue model of machine_learning.py and keeps the result:
+- Successive halving instead of an exhaustive grid search: every parameter
+  combination starts with few boosting rounds and only the best half moves on
+  to twice as many, so most candidates never reach the full model size
+- The best model and its cross-validation results are stored under a
+  fingerprint of the training data and reused while the data is unchanged
+- Long histories use HistGradientBoostingRegressor with early stopping,
+  which bins the features and is much faster than the exact gradient boosting
+
+Author: Rytis Bimbiras
+"""
+
+import os                               # For file and directory operations
+import time                             # For timing the fit
+import hashlib                          # For fingerprinting the training data
+import joblib                           # For storing the trained model
+import pandas as pd                     # For data handling
+import sklearn                          # For the library version in the fingerprint
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401 (enables HalvingGridSearchCV)
+from sklearn.model_selection import TimeSeriesSplit, HalvingGridSearchCV, cross_validate
+from sklearn.ensemble import GradientBoostingRegressor, HistGradientBoostingRegressor
+
+# =========================
+# Configuration and Constants
+# =========================
+
+MODEL_CACHE_DIR = ".model_cache"
+
+# Bump when the search below changes, so stored models are retrained
+MODEL_CACHE_VERSION = 1
+
+# Number of time-series cross-validation folds
+CV_SPLITS = 5
+
+# Gradient boosting parameters searched by successive halving. The number of
+# boosting rounds is the halving resource: 25 -> 50 -> 100 -> 200
+PARAM_GRID = {
+    'learning_rate': [0.01, 0.05],
+    'max_depth': [3, 5],
+    'subsample': [0.8, 1.0],
+    'min_samples_split': [2, 5]
+}
+MIN_ESTIMATORS = 25
+MAX_ESTIMATORS = 200
+
+# From this many training rows (days) on, the histogram-based model is used
+HIST_GRADIENT_BOOSTING_MIN_ROWS = 1000
+
+
+#
+# ------------------------------------------------------------
+# Fingerprint of the training data and the search settings
+# ------------------------------------------------------------
+def data_fingerprint(X, y):
+    """
+    Args:
+        X (pandas.DataFrame): Features
+        y (pandas.Series): Target
+    Returns:
+        str: SHA-256 over the feature names, values, target and search settings
+    """
+    digest = hashlib.sha256()
+    digest.update(repr((MODEL_CACHE_VERSION, sklearn.__version__, list(X.columns), PARAM_GRID,
+                        MIN_ESTIMATORS, MAX_ESTIMATORS, HIST_GRADIENT_BOOSTING_MIN_ROWS)).encode())
+    digest.update(pd.util.hash_pandas_object(X, index=False).to_numpy().tobytes())
+    digest.update(pd.util.hash_pandas_object(y, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+#
+# ------------------------------------------------------------
+# Model searches
+# ------------------------------------------------------------
+def search_gradient_boosting(X, y, cv):
+    """
+    Successive halving over PARAM_GRID with the boosting rounds as resource.
+
+    Returns:
+        tuple: (best model, best parameters, best CV R², CV results DataFrame,
+                parameter combinations, cross-validation fits)
+    """
+    search = HalvingGridSearchCV(
+        GradientBoostingRegressor(random_state=42), PARAM_GRID, cv=cv, scoring='r2',
+        resource='n_estimators', min_resources=MIN_ESTIMATORS, max_resources=MAX_ESTIMATORS,
+        factor=2, random_state=42, n_jobs=-1
+    )
+    search.fit(X, y)
+    # Every iteration keeps the best half of the candidates, each fitted once per fold
+    return (search.best_estimator_, search.best_params_, search.best_score_, pd.DataFrame(search.cv_results_),
+            int(search.n_candidates_[0]), int(sum(search.n_candidates_)) * cv.get_n_splits())
+
+
+def fit_hist_gradient_boosting(X, y, cv):
+    """
+    Single histogram-based model whose boosting rounds are set by early stopping.
+
+    Returns:
+        tuple: (model, parameters, CV R², CV results DataFrame,
+                parameter combinations, cross-validation fits)
+    """
+    model = HistGradientBoostingRegressor(max_iter=500, learning_rate=0.05, early_stopping=True,
+                                          validation_fraction=0.1, n_iter_no_change=10, random_state=42)
+    scores = cross_validate(model, X, y, cv=cv, scoring='r2', n_jobs=-1)
+    model.fit(X, y)
+    params = {**model.get_params(), 'n_iter_': model.n_iter_}
+    cv_results = pd.DataFrame({'split': range(len(scores['test_score'])), 'test_score': scores['test_score'],
+                               'fit_time': scores['fit_time']})
+    return model, params, scores['test_score'].mean(), cv_results, 1, cv.get_n_splits()
+
+
+#
+# ------------------------------------------------------------
+# Public entry point: stored model or a fresh search
+# ------------------------------------------------------------
+def train_revenue_model(X, y, cache_dir=MODEL_CACHE_DIR, refresh=False):
+    """
+    Returns the best revenue model for the data, from the model cache when the data is unchanged.
+
+    Args:
+        X (pandas.DataFrame): Features
+        y (pandas.Series): Daily revenue
+        cache_dir (str): Directory of the stored models
+        refresh (bool): Train again even if a stored model exists
+    Returns:
+        dict: model, method, best_params, cv_score, cv_results, candidates, candidate_fits,
+              fit_seconds, fingerprint and from_cache
+    """
+    fingerprint = data_fingerprint(X, y)
+    model_path = os.path.join(cache_dir, f"revenue_model_{fingerprint[:16]}.joblib")
+
+    if not refresh and os.path.exists(model_path):
+        try:
+            stored = joblib.load(model_path)
+            if stored.get('fingerprint') == fingerprint:
+                return {**stored, 'from_cache': True}
+        except Exception as exception:
+            print(f"⚠️ Stored model unreadable, training again: {exception}")
+
+    cv = TimeSeriesSplit(n_splits=CV_SPLITS)
+    start = time.perf_counter()
+    if len(X) >= HIST_GRADIENT_BOOSTING_MIN_ROWS:
+        method = 'HistGradientBoostingRegressor (early stopping)'
+        model, params, cv_score, cv_results, candidates, candidate_fits = fit_hist_gradient_boosting(X, y, cv)
+    else:
+        method = 'GradientBoostingRegressor (successive halving)'
+        model, params, cv_score, cv_results, candidates, candidate_fits = search_gradient_boosting(X, y, cv)
+    fit_seconds = time.perf_counter() - start
+
+    result = {'model': model, 'method': method, 'best_params': params, 'cv_score': cv_score,
+              'cv_results': cv_results, 'candidates': candidates, 'candidate_fits': candidate_fits,
+              'fit_seconds': fit_seconds, 'fingerprint': fingerprint}
+    os.makedirs(cache_dir, exist_ok=True)
+    temporary_path = f"{model_path}.{os.getpid()}.tmp"
+    joblib.dump(result, temporary_path)
+    os.replace(temporary_path, model_path)
+    return {**result, 'from_cache': False}
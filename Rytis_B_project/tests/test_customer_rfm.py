@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+from customer_rfm import RFM_COLUMNS, RFMBuilder, build_rfm
+
+
+def make_orders(seed=7, lines=600):
+    random = np.random.default_rng(seed)
+    order_ids = np.sort(random.integers(1, 200, size=lines))
+    # Every line of an order has the order's customer and date
+    clients = random.integers(1, 40, size=200)[order_ids]
+    dates = (pd.Timestamp("2024-01-01") + pd.to_timedelta(random.integers(0, 365, size=200), unit="D"))[order_ids]
+    return pd.DataFrame({
+        "client": clients,
+        "order_id": order_ids,
+        "date": dates.strftime("%Y-%m-%d"),
+        "item_price": random.integers(1, 100, size=lines) / 4,
+        "ordered_quantity": random.integers(1, 5, size=lines),
+    })
+
+
+def baseline_rfm(orders):
+    # The original per-customer lambda of machine_learning_2.py
+    orders = orders.assign(client=orders["client"].astype(str), date=pd.to_datetime(orders["date"]),
+                           total_price=orders["item_price"] * orders["ordered_quantity"])
+    rfm = orders.groupby("client").agg({
+        "date": lambda dates: (orders["date"].max() - dates.max()).days,
+        "order_id": "nunique",
+        "total_price": "sum",
+    }).reset_index()
+    rfm.columns = RFM_COLUMNS
+    return rfm
+
+
+def sorted_table(rfm):
+    return rfm.sort_values("Customer", ignore_index=True)
+
+
+def test_incremental_rfm_matches_a_full_build(tmp_path):
+    orders = make_orders()
+    full = sorted_table(build_rfm(orders))
+    pd.testing.assert_frame_equal(full, sorted_table(baseline_rfm(orders)), check_dtype=False)
+
+    # Three runs, the batches split orders between them; state saved and loaded in between
+    builder = RFMBuilder().update(orders.iloc[:250])
+    builder.save(str(tmp_path))
+    builder = RFMBuilder.load(str(tmp_path)).update(orders.iloc[250:251]).update(orders.iloc[:0])
+    builder.save(str(tmp_path))
+    builder = RFMBuilder.load(str(tmp_path)).update(orders.iloc[251:])
+
+    pd.testing.assert_frame_equal(sorted_table(builder.table()), full)
+
+
+def test_lines_seen_again_do_not_count_twice():
+    orders = make_orders(seed=3, lines=50)
+    # Frequency counts distinct orders, even when an order's lines come again in a later batch
+    builder = RFMBuilder().update(orders).update(orders.iloc[:0])
+    again = RFMBuilder().update(orders).update(orders.iloc[-1:].assign(item_price=0.0))
+    pd.testing.assert_frame_equal(sorted_table(again.table()), sorted_table(builder.table()))
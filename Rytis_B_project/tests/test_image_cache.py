@@ -0,0 +1,147 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from image_cache import ImageCache
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    # Serves server.images ({path: (etag, bytes)}), answering 304 to a matching If-None-Match
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get("If-None-Match")))
+        if self.path not in self.server.images:
+            self.send_error(404)
+            return
+        etag, content = self.server.images[self.path]
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ImageHandler)
+    server.images, server.requests = {}, []
+    server.base_url = f"http://127.0.0.1:{server.server_port}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_download_then_revalidate_then_changed_etag(server, tmp_path):
+    url = f"{server.base_url}/photo.jpg"
+    server.images["/photo.jpg"] = ('"v1"', b"first photo")
+
+    cache = ImageCache(str(tmp_path), max_age=3600)
+    assert cache.get(url) == b"first photo"
+    assert cache.get(url) == b"first photo"
+    assert server.requests == [("/photo.jpg", None)]
+    assert cache.stats["downloaded"] == 1 and cache.stats["memory_hits"] == 1
+    cache.close()
+
+    # A new run with an expired copy asks the server, which confirms it with 304
+    stale = ImageCache(str(tmp_path), max_age=0)
+    assert stale.get(url) == b"first photo"
+    assert server.requests[-1] == ("/photo.jpg", '"v1"')
+    assert stale.stats["revalidated"] == 1 and stale.stats["downloaded"] == 0
+
+    # The photo changed on the server: new content under a new ETag, the old blob deleted
+    server.images["/photo.jpg"] = ('"v2"', b"second photo")
+    assert stale.get(url) == b"second photo"
+    assert stale.stats["downloaded"] == 1
+    assert len(list((tmp_path / "blobs").iterdir())) == 1
+    assert ImageCache(str(tmp_path), max_age=3600).get(url) == b"second photo"
+    assert len(server.requests) == 3
+
+
+def test_least_recently_used_image_is_evicted(server, tmp_path):
+    for name in "abc":
+        server.images[f"/{name}.jpg"] = (f'"{name}"', name.encode() * 100)
+    cache = ImageCache(str(tmp_path), max_bytes=250, memory_items=0)
+
+    cache.get(f"{server.base_url}/a.jpg")
+    time.sleep(0.01)
+    cache.get(f"{server.base_url}/b.jpg")
+    time.sleep(0.01)
+    # A hit makes "a" more recently used than "b"
+    assert cache.get(f"{server.base_url}/a.jpg") == b"a" * 100
+    time.sleep(0.01)
+    cache.get(f"{server.base_url}/c.jpg")
+
+    assert cache.stats["evicted"] == 1 and cache.stats["disk_hits"] == 1
+    cache.close()
+    reopened = ImageCache(str(tmp_path), max_bytes=250)
+    assert reopened.get(f"{server.base_url}/a.jpg") == b"a" * 100
+    assert reopened.get(f"{server.base_url}/c.jpg") == b"c" * 100
+    assert reopened.stats["downloaded"] == 0
+    assert reopened.get(f"{server.base_url}/b.jpg") == b"b" * 100
+    assert reopened.stats["downloaded"] == 1
+
+
+def test_caches_sharing_a_directory_keep_each_others_entries(server, tmp_path):
+    server.images["/a.jpg"] = ('"a"', b"a")
+    server.images["/b.jpg"] = ('"b"', b"b")
+
+    # Like two worker processes: both opened the cache before either stored anything
+    first, second = ImageCache(str(tmp_path)), ImageCache(str(tmp_path))
+    first.get(f"{server.base_url}/a.jpg")
+    second.get(f"{server.base_url}/b.jpg")
+    first.get(f"{server.base_url}/a.jpg")
+    first.close()
+    second.close()
+
+    reopened = ImageCache(str(tmp_path))
+    assert reopened.get(f"{server.base_url}/a.jpg") == b"a"
+    assert reopened.get(f"{server.base_url}/b.jpg") == b"b"
+    assert reopened.stats["disk_hits"] == 2 and len(server.requests) == 2
+
+
+def test_variant_is_made_once_per_image_content(server, tmp_path):
+    url = f"{server.base_url}/photo.jpg"
+    server.images["/photo.jpg"] = ('"v1"', b"first photo")
+    made = []
+
+    def thumbnail(content):
+        made.append(content)
+        return content.upper()
+
+    cache = ImageCache(str(tmp_path), max_age=0)
+    assert cache.get_variant(url, "upper", thumbnail) == b"FIRST PHOTO"
+    assert cache.get_variant(url, "upper", thumbnail) == b"FIRST PHOTO"
+    cache.close()
+    # Another run revalidates the photo (304) and reads the variant from disk
+    assert ImageCache(str(tmp_path), max_age=0).get_variant(url, "upper", thumbnail) == b"FIRST PHOTO"
+    assert made == [b"first photo"]
+
+    # A changed photo makes the variant again and deletes the old one
+    server.images["/photo.jpg"] = ('"v2"', b"second photo")
+    cache = ImageCache(str(tmp_path), max_age=0)
+    assert cache.get_variant(url, "upper", thumbnail) == b"SECOND PHOTO"
+    assert made == [b"first photo", b"second photo"]
+    assert len(list((tmp_path / "blobs").iterdir())) == 2
+
+
+def test_evicted_image_takes_its_variants_along(server, tmp_path):
+    server.images["/a.jpg"] = ('"a"', b"a" * 100)
+    server.images["/b.jpg"] = ('"b"', b"b" * 100)
+    cache = ImageCache(str(tmp_path), max_bytes=240)
+
+    cache.get_variant(f"{server.base_url}/a.jpg", "half", lambda content: content[:50])
+    time.sleep(0.01)
+    cache.get(f"{server.base_url}/b.jpg")
+
+    assert cache.stats["evicted"] == 1
+    assert sorted(path.read_bytes() for path in (tmp_path / "blobs").iterdir()) == [b"b" * 100]
@@ -0,0 +1,55 @@
+import os
+
+import pandas as pd
+
+import order_data
+from order_data import cache_paths, load_orders
+
+
+def write_orders(filename, quantities):
+    pd.DataFrame({
+        "order_id": list(range(1, len(quantities) + 1)),
+        "date": ["2024-01-02", "2024-01-09", "2024-02-05"][:len(quantities)],
+        "shop": ["Sporto", "Sporto", "Batai"][:len(quantities)],
+        "address": ["Gedimino pr. 1, Vilnius, LT-01103", None, "Laisvės al. 5, Kaunas, LT-44237"][:len(quantities)],
+        "item_price": [10.0, 2.5, 4.0][:len(quantities)],
+        "ordered_quantity": quantities,
+    }).to_excel(filename, index=False)
+
+
+def test_cache_is_reused_after_a_touch_and_rebuilt_after_a_change(tmp_path, monkeypatch):
+    filename = str(tmp_path / "orders.xlsx")
+    cache_dir = str(tmp_path / "cache")
+    write_orders(filename, [1, 2, 3])
+
+    parsed = []
+    read_orders_excel = order_data.read_orders_excel
+    monkeypatch.setattr(order_data, "read_orders_excel",
+                        lambda name: parsed.append(name) or read_orders_excel(name))
+
+    first = load_orders(filename, cache_dir)
+    assert list(first["total_price"]) == [10.0, 5.0, 12.0]
+    assert list(first["city"]) == ["Vilnius", "Unknown", "Kaunas"]
+    assert list(first["month"]) == ["2024-01", "2024-01", "2024-02"]
+    assert os.path.exists(cache_paths(filename, cache_dir)[0])
+    assert len(parsed) == 1
+
+    # Same content under a new modification time: the cache is kept, only its metadata updated
+    stat = os.stat(filename)
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 5_000_000_000))
+    pd.testing.assert_frame_equal(load_orders(filename, cache_dir), first)
+    assert len(parsed) == 1
+    meta = order_data._read_meta(cache_paths(filename, cache_dir)[1])
+    assert meta["mtime_ns"] == os.stat(filename).st_mtime_ns
+
+    # Changed workbook: parsed again and cached again
+    write_orders(filename, [1, 2])
+    changed = load_orders(filename, cache_dir)
+    assert list(changed["total_price"]) == [10.0, 5.0]
+    assert len(parsed) == 2
+    pd.testing.assert_frame_equal(load_orders(filename, cache_dir), changed)
+    assert len(parsed) == 2
+
+    # refresh rebuilds even an up to date cache
+    load_orders(filename, cache_dir, refresh=True)
+    assert len(parsed) == 3
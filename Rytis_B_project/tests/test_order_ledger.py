@@ -0,0 +1,51 @@
+import pandas as pd
+
+from order_ledger import OrderLedger, STATUS_DONE, STATUS_FAILED, STATUS_IMPORTED, order_key
+
+
+def test_ledger_round_trip(tmp_path):
+    path = str(tmp_path / "ledger.sqlite")
+    ledger = OrderLedger(path)
+    ledger.mark_processed(7.0, STATUS_DONE, files=3)
+    ledger.mark_processed("8", STATUS_FAILED, error="no address")
+    ledger.mark_processed(9, STATUS_IMPORTED)
+    # A later outcome replaces the earlier one
+    ledger.mark_processed(" 9 ", STATUS_DONE, files=2)
+    ledger.close()
+
+    reopened = OrderLedger(path)
+    assert order_key(7) == order_key(7.0) == order_key("7") == "7"
+    assert reopened.processed_ids() == {"7", "8", "9"}
+    assert reopened.processed_ids(include_failed=False) == {"7", "9"}
+    assert reopened.counts() == {STATUS_DONE: 2, STATUS_FAILED: 1}
+    reopened.close()
+
+
+def test_pending_orders_skip_processed_and_import_flags(tmp_path, monkeypatch):
+    # e_shop_project opens its image cache in the working directory when imported
+    monkeypatch.chdir(tmp_path)
+    from e_shop_project import load_pending_orders
+
+    filename = str(tmp_path / "orders.xlsx")
+    pd.DataFrame({
+        "order_id": [1, 1, 2, 3, 4, 5],
+        "product": ["ball", "net", "shoes", "bag", "cap", "socks"],
+        "order_processed": ["no", "no", "yes", "no", "no", "yes"],
+    }).to_excel(filename, index=False)
+    ledger = OrderLedger(str(tmp_path / "ledger.sqlite"))
+    ledger.mark_processed(3, STATUS_DONE, files=2)
+    ledger.mark_processed(5, STATUS_FAILED, error="broken image")
+
+    pending, skipped = load_pending_orders(filename, ledger)
+    assert [order_id for order_id, _ in pending] == [1, 4]
+    assert list(pending[0][1]["product"]) == ["ball", "net"]
+    # 2 imported from its workbook flag, 3 done and 5 failed in the ledger
+    assert skipped == 3
+    assert ledger.counts() == {STATUS_DONE: 1, STATUS_FAILED: 1, STATUS_IMPORTED: 1}
+
+    # Retrying brings back the failed order, even though its workbook flag says "yes"
+    pending, skipped = load_pending_orders(filename, ledger, retry_failed=True)
+    assert [order_id for order_id, _ in pending] == [1, 4, 5]
+    assert skipped == 2
+    assert ledger.counts()[STATUS_FAILED] == 1
+    ledger.close()
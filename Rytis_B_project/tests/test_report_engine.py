@@ -0,0 +1,56 @@
+import os
+
+import pandas as pd
+from pypdf import PdfReader
+
+from e_shop_analytics import calculate_metrics, process_data
+from report_engine import PAGES, build_report
+
+
+def make_metrics():
+    orders = pd.DataFrame({
+        "order_id": [1, 1, 2, 3, 4, 5],
+        "date": ["2024-01-02", "2024-01-02", "2024-01-10", "2024-02-05", "2024-02-20", "2024-03-01"],
+        "shop": ["Sporto", "Sporto", "Batai", "Sporto", "Batai", "Batai"],
+        "payment_status": ["paid", "paid", "pending", "paid", "paid", "refunded"],
+        "order_processed": ["yes", "yes", "no", "yes", "yes", "no"],
+        "address": ["Gedimino pr. 1, Vilnius, LT-01103"] * 2 + ["Laisvės al. 5, Kaunas, LT-44237"] * 4,
+        "item_price": [10.0, 2.5, 4.0, 7.5, 3.0, 12.0],
+        "ordered_quantity": [1, 2, 3, 1, 2, 1],
+    })
+    return calculate_metrics(process_data(orders))
+
+
+def page_files(cache_dir):
+    return {name: os.stat(os.path.join(cache_dir, name)).st_mtime_ns for name in os.listdir(cache_dir)}
+
+
+def test_unchanged_pages_come_from_the_cache(tmp_path):
+    cache_dir = str(tmp_path / "pages")
+    output_file = str(tmp_path / "report.pdf")
+    metrics = make_metrics()
+
+    first = build_report(metrics, output_file, workers=1, cache_dir=cache_dir)
+    assert (first["pages"], first["rendered"], first["cached"]) == (len(PAGES), len(PAGES), 0)
+    assert len(PdfReader(output_file).pages) == len(PAGES)
+    drawn = page_files(cache_dir)
+    assert len(drawn) == len(PAGES)
+
+    # Nothing changed: every page is reused as it is
+    second = build_report(metrics, output_file, workers=1, cache_dir=cache_dir)
+    assert (second["rendered"], second["cached"]) == (0, len(PAGES))
+    assert page_files(cache_dir) == drawn
+
+    # A changed table redraws only the page showing it, and replaces its old version
+    metrics["shop_perf"].loc[0, "revenue"] += 100
+    third = build_report(metrics, output_file, workers=1, cache_dir=cache_dir)
+    assert (third["rendered"], third["cached"]) == (1, len(PAGES) - 1)
+    redrawn = page_files(cache_dir)
+    assert len(redrawn) == len(PAGES)
+    assert {name for name in redrawn if name not in drawn} == {
+        name for name in redrawn if name.startswith("shop_performance_")
+    }
+    assert {name: drawn[name] for name in drawn if name in redrawn} == {
+        name: redrawn[name] for name in drawn if name in redrawn
+    }
+    assert len(PdfReader(output_file).pages) == len(PAGES)
@@ -5,32 +5,39 @@ import plotly.graph_objects as go
 import numpy as np
 
 from sklearn.linear_model import LinearRegression
-from sklearn.preprocessing import PolynomialFeatures
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import r2_score
-from sklearn.ensemble import RandomForestRegressor
 
 from utils.spike_labels import spike_labels
-from utils.date_mappings import weekday_map, month_map
+from utils.date_mappings import weekday_map, month_map, season_months, time_of_day_ranges
+from utils.rollups import MEASURES
+from utils.model_zoo import ModelZoo, training_data
+from utils.storage import load_weather
+from utils.ingest import LiveDataset
 
 st.set_page_config(layout="wide")
 
-# Decorator with cache so we only upload data once
+# Decorator with cache so we only upload data once, shared by all sessions (see utils/ingest.py):
+# - hourly rows read from Parquet, only the columns the tabs use (see utils/storage.py)
+# - hourly/daily/monthly aggregates (see utils/rollups.py), filters below just slice them
+#   instead of resampling the hourly rows in every chart
+# - calendar of every row as small integer arrays, selected rows remembered per filter combination
+# Hours appended to the dataset (python -m utils.ingest) are added on the next run, no full reload
+@st.cache_resource
+def load_live_data():
+    return LiveDataset(columns=MEASURES)
+merged_df, rollups, time_filter = load_live_data().refresh()
+
+# Future weather for the forecast, read once (cache_data gives every run its own copy)
 @st.cache_data
-def load_data():
-    df = pd.read_csv('data/merged_data.csv', parse_dates=['datetime'], index_col='datetime')
-    return df
-merged_df = load_data()
-
-# We will need datafile in daily level + cleaning
-daily_data = merged_df.resample('D').agg({
-    'bicycles': 'sum',
-    'tavg': 'mean',
-    'prcp': 'mean',
-    'wspd': 'mean',
-    'pres': 'mean'
-})
-daily_data['prcp'] = daily_data['prcp'].fillna(0)
+def load_future_weather():
+    future_weather = load_weather()
+    future_weather['weekday'] = future_weather.index.weekday
+    return future_weather.fillna(0)
+
+# Prediction tab results per filter state, in memory and on disk (data/model_cache)
+@st.cache_resource
+def load_model_zoo():
+    return ModelZoo()
+model_zoo = load_model_zoo()
 
 # ~~~ Navigation
 menu = st.sidebar.radio("Menu", ["Trends", "Weather", "Prediction"])
@@ -45,6 +52,12 @@ if "filters_initialized" not in st.session_state:
     st.session_state["time_of_day"] = DEFAULT_TIME_OF_DAY
     st.session_state["filters_initialized"] = True
 
+# New days ingested: a date range that ended on the last day of data moves along with it
+last_day = st.session_state.get("last_day", DEFAULT_DATE_RANGE[1])
+if last_day != DEFAULT_DATE_RANGE[1] and len(st.session_state["date_range"]) == 2 and st.session_state["date_range"][1] == last_day:
+    st.session_state["date_range"] = [st.session_state["date_range"][0], DEFAULT_DATE_RANGE[1]]
+st.session_state["last_day"] = DEFAULT_DATE_RANGE[1]
+
 st.title("Bike Traffic Dashboard")
 st.subheader(f"Currently viewing: {menu}")
 
@@ -75,49 +88,31 @@ season = st.session_state["season"]
 time_of_day = st.session_state["time_of_day"]
 
 # Need to use (introduce) filtered datafile after filers been applied
-filtered_df = merged_df.loc[
-    (merged_df.index.date >= start_date) &
-    (merged_df.index.date <= end_date)
-]
-if season != "All":
-    season_months = {
-        'Spring': [3, 4, 5],
-        'Summer': [6, 7, 8],
-        'Autumn': [9, 10, 11],
-        'Winter': [12, 1, 2]
-    }
-    filtered_df = filtered_df[filtered_df.index.month.isin(season_months[season])]
-if time_of_day != "All":
-    time_of_day_ranges = {
-        "Night": (0, 6),
-        "Morning": (6, 12),
-        "Day": (12, 18),
-        "Evening": (18, 24)
-    }
-    start_hour, end_hour = time_of_day_ranges[time_of_day]
-    filtered_df = filtered_df[
-        (filtered_df.index.hour >= start_hour) &
-        (filtered_df.index.hour < end_hour)
-    ]
+filters = (start_date, end_date, season, time_of_day)
+filtered_df = time_filter.apply(merged_df, *filters)
+
+# Same filters on the rollups: totals and daily level (bikes summed, weather averaged)
+filtered_totals = rollups.totals(*filters)
+daily_df = rollups.daily_frame(*filters)
     
 # ||| TRENDS TAB |||
 if menu == "Trends":
 
-    if not filtered_df.empty:            # No data test
+    if filtered_totals['hours'] > 0:            # No data test
         st.subheader("Key Metrics")
         col1, col2, col3 = st.columns(3)
 
         with col1:
-            total_bikes = int(filtered_df['bicycles'].sum())
+            total_bikes = int(filtered_totals['bicycles'])
             st.metric(label="🚲 Total Number of Bikes", value=f"{total_bikes:,}")
 
         with col2:
-            number_of_days = (filtered_df.index.max() - filtered_df.index.min()).days + 1
+            number_of_days = (filtered_totals['last_hour'] - filtered_totals['first_hour']).days + 1
             daily_average_bikes = total_bikes / number_of_days if number_of_days > 0 else 0
             st.metric(label="📅 Daily Average", value=f"{int(daily_average_bikes):,}")
 
         with col3:
-            number_of_hours = len(filtered_df)
+            number_of_hours = filtered_totals['hours']
             hourly_average_bikes = total_bikes / number_of_hours
             st.metric(label="⏰ Hourly Average", value=f"{hourly_average_bikes:.1f}")
 
@@ -137,7 +132,7 @@ if menu == "Trends":
 
         with col5:
             st.markdown("### Top 10 Busiest Calendar Days")
-            daily_bikes = filtered_df['bicycles'].resample('D').sum()
+            daily_bikes = daily_df['bicycles']
             top10_days = daily_bikes.sort_values(ascending=False).head(10).astype(int)
             top10_days.index = top10_days.index.date
             st.dataframe(
@@ -165,7 +160,7 @@ if menu == "Trends":
 
         with col7:
             st.markdown("### Most Popular Hour of the Day")
-            hourly_avg = filtered_df.groupby(filtered_df.index.hour)['bicycles'].mean()
+            hourly_avg = rollups.hour_means(*filters, by_weekday=False)
             fig_hourly = px.bar(
                 x=hourly_avg.index,
                 y=hourly_avg.values,
@@ -189,8 +184,7 @@ if menu == "Trends":
 
         with col9:
             st.markdown("### Most Popular Month")
-            filtered_df['month'] = filtered_df.index.month
-            year_month_sum = filtered_df.groupby(['year', 'month'])['bicycles'].sum()
+            year_month_sum = rollups.monthly_bicycles(*filters)
             month_avg_across_years = year_month_sum.groupby('month').mean()
             month_avg_across_years.index = month_avg_across_years.index.map(month_map)
             fig_month = px.bar(
@@ -202,12 +196,7 @@ if menu == "Trends":
             st.plotly_chart(fig_month, use_container_width=True)
 
         st.subheader("Weekly Heatmap")
-        pivot_table = filtered_df.pivot_table(
-            index=filtered_df.index.weekday,
-            columns=filtered_df.index.hour,
-            values='bicycles',
-            aggfunc='mean'
-        )
+        pivot_table = rollups.hour_means(*filters)
         pivot_table.index = pivot_table.index.map(weekday_map) # Heatmap is a pivot table
         fig_heatmap = px.imshow(
             pivot_table,
@@ -268,14 +257,13 @@ if menu == "Weather":
     col1, col2, col3 = st.columns(3)
     with col1:
         st.markdown("#### Average Daily")
-        st.metric("Average Daily", f"{filtered_df['tavg'].mean():.1f}°C")
+        st.metric("Average Daily", f"{filtered_totals['tavg']:.1f}°C")
 
     with col2:
         st.markdown("#### Dynamics")
-        # Resample daily averages and sums
-        daily_temp = filtered_df['tavg'].resample('D').mean()
-        daily_temp = daily_temp.fillna(method='ffill')
-        daily_bikes = filtered_df['bicycles'].resample('D').sum()
+        # Daily averages and sums
+        daily_temp = daily_df['tavg'].ffill()
+        daily_bikes = daily_df['bicycles']
         temp_rolling = daily_temp.rolling(window=30).mean()
         bikes_rolling = daily_bikes.rolling(window=30).mean()
 
@@ -374,13 +362,13 @@ if menu == "Weather":
     col4, col5, col6 = st.columns(3)
 
     with col4:
-        filtered_daily = filtered_df.resample('D').agg({'prcp': 'mean'}).fillna(0)
+        filtered_daily = daily_df[['prcp']].fillna(0)
         avg_precip = filtered_daily['prcp'].mean()
         st.metric("Average Daily Precipitation (mm)", f"{avg_precip:.2f}")
 
     with col5:
         st.markdown("#### Dynamics")
-        filtered_daily = filtered_df.resample('D').agg({'prcp': 'mean', 'bicycles': 'sum'}).fillna(0)
+        filtered_daily = daily_df[['prcp', 'bicycles']].fillna(0)
         filtered_daily['prcp_30d'] = filtered_daily['prcp'].rolling(window=30).mean()
         filtered_daily['bicycles_30d'] = filtered_daily['bicycles'].rolling(window=30).mean()
         
@@ -400,7 +388,7 @@ if menu == "Weather":
 
     with col6:
         st.markdown("#### Correlation")
-        filtered_daily = filtered_df.resample('D').agg({'prcp': 'mean', 'bicycles': 'sum'}).fillna(0) 
+        filtered_daily = daily_df[['prcp', 'bicycles']].fillna(0)
         x = filtered_daily['prcp']
         y = filtered_daily['bicycles']
         correlation = x.corr(y)
@@ -427,13 +415,13 @@ if menu == "Weather":
     col7, col8, col9 = st.columns(3)
     with col7:
         st.markdown("#### Average Daily")
-        filtered_daily = filtered_df.resample('D').agg({'wspd': 'mean'}).fillna(0)
+        filtered_daily = daily_df[['wspd']].fillna(0)
         avg_wind = filtered_daily['wspd'].mean()
         st.metric("Average Daily Wind Speed (km/h)", f"{avg_wind:.2f}")
         
     with col8:
         st.markdown("#### Dynamics")
-        daily_data = filtered_df.resample('D').agg({'wspd': 'mean', 'bicycles': 'sum'})
+        daily_data = daily_df[['wspd', 'bicycles']].copy()
         daily_data['wspd_30d'] = daily_data['wspd'].rolling(window=30).mean()
         daily_data['bicycles_30d'] = daily_data['bicycles'].rolling(window=30).mean()
         
@@ -453,8 +441,8 @@ if menu == "Weather":
 
     with col9:
         # Prepare daily data
-        daily_wspd = filtered_df['wspd'].resample('D').mean()
-        daily_bikes = filtered_df['bicycles'].resample('D').sum()
+        daily_wspd = daily_df['wspd']
+        daily_bikes = daily_df['bicycles']
         valid_data = pd.concat([daily_wspd, daily_bikes], axis=1).dropna()
         wspd_values = valid_data['wspd'].values.reshape(-1, 1)
         bike_values = valid_data['bicycles'].values
@@ -498,12 +486,12 @@ if menu == "Weather":
     col10, col11, col12 = st.columns(3)
     with col10:
         st.markdown("#### Average Daily")
-        avg_pres = filtered_df['pres'].mean()
+        avg_pres = filtered_totals['pres']
         st.metric("Average Daily Air Pressure (hPa)", f"{avg_pres:.2f}")
         
     with col11:
         st.markdown("#### Dynamics")
-        daily_pressure = filtered_df['pres'].resample('D').mean().fillna(method='ffill')
+        daily_pressure = daily_df['pres'].ffill()
         pressure_ma = daily_pressure.rolling(window=30).mean()
         bikes_ma = daily_bikes.rolling(window=30).mean()
     
@@ -529,8 +517,8 @@ if menu == "Weather":
 
     with col12:
         st.markdown("#### Correlation")
-        daily_pres = filtered_df['pres'].resample('D').mean()
-        daily_bikes = filtered_df['bicycles'].resample('D').sum()
+        daily_pres = daily_df['pres']
+        daily_bikes = daily_df['bicycles']
         valid_data = pd.concat([daily_pres, daily_bikes], axis=1).dropna()
         pres_values = valid_data['pres'].values.reshape(-1, 1)
         bike_values = valid_data['bicycles'].values
@@ -570,77 +558,59 @@ if menu == "Weather":
 
 # ||| PREDICTION TAB |||
 elif menu == "Prediction":
+    # Here we add another set of future data for weather
+    future_weather = load_future_weather()
+
+    # All models of this tab, fitted once per filter state (see utils/model_zoo.py)
+    daily_training = training_data(daily_df)
+    results = model_zoo.get(filters, daily_training, future_weather)
+
+    # Meanwhile fit the likely next picks in the background: this date range with the season
+    # or the time of day set to "All" or to the next option
+    def next_picks(value, options):
+        following = options[(options.index(value) + 1) % len(options)]
+        return [option for option in dict.fromkeys(["All", following]) if option != value]
+
+    neighbours = ([(other_season, time_of_day) for other_season in next_picks(season, ["All", *season_months])]
+                  + [(season, other_time) for other_time in next_picks(time_of_day, ["All", *time_of_day_ranges])])
+    model_zoo.precompute(
+        [((start_date, end_date, other_season, other_time),
+          training_data(rollups.daily_frame(start_date, end_date, other_season, other_time)))
+         for other_season, other_time in neighbours],
+        future_weather
+    )
+
     st.markdown("### Model Training Approaches")
     col1, col2, col3 = st.columns(3)
     
     with col1:
         st.markdown("#### First training method")
         st.caption("Linear regression trained on daily average weather and weekday to predict bike counts. R² score is evaluated on a separate test set.")
-
-        df_train = filtered_df.copy()
-        df_train['weekday'] = df_train.index.weekday
-        daily = df_train.resample('D').agg({
-            'bicycles': 'sum',
-            'tavg': 'mean',
-            'prcp': 'sum',
-            'wspd': 'mean',
-            'pres': 'mean',
-            'weekday': 'first'
-        }).dropna()
-        X = daily[['tavg', 'prcp', 'wspd', 'pres', 'weekday']]
-        y = daily['bicycles']
-
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-        model = LinearRegression()
-        model.fit(X_train, y_train)
     
         st.write("**Coefficients:**")
-        coeffs = pd.DataFrame({'Feature': X.columns, 'Coefficient': model.coef_})
+        coeffs = results['linear']['coefficients']
         st.dataframe(coeffs, use_container_width=True)
-        y_pred = model.predict(X_test)
-        r2 = r2_score(y_test, y_pred)
+        r2 = results['linear']['r2']
         st.metric("R² Score (test set)", f"{r2:.2f}")
             
     with col2:
         st.markdown("#### Second method (with squares)")
         st.caption("Linear regression with squared features to account for non-linear effects. R² score is evaluated on a separate test set.")
     
-        X_squared = X.copy()
-        for col in ['tavg', 'prcp', 'wspd', 'pres']:
-            X_squared[f'{col}_squared'] = X[col] ** 2
-        y = daily['bicycles']
-        
-        X_train, X_test, y_train, y_test = train_test_split(X_squared, y, test_size=0.2, random_state=42)
-        model_sq = LinearRegression()
-        model_sq.fit(X_train, y_train)
-    
         st.write("**Coefficients:**")
-        coeffs_sq = pd.DataFrame({'Feature': X_squared.columns, 'Coefficient': model_sq.coef_})
+        coeffs_sq = results['squared']['coefficients']
         st.dataframe(coeffs_sq, use_container_width=True)
-        y_pred_sq = model_sq.predict(X_test)
-        r2_sq = r2_score(y_test, y_pred_sq)
+        r2_sq = results['squared']['r2']
         st.metric("R² Score (test set)", f"{r2_sq:.2f}")
 
     with col3:
         st.markdown("#### Polynomial regression")
         st.caption("Polynomial regression (degree 3) using weather and weekday. R² score is evaluated on a separate test set.")
     
-        poly = PolynomialFeatures(degree=3, include_bias=False)
-        X_poly = poly.fit_transform(X)
-        feature_names = poly.get_feature_names_out(X.columns)
-    
-        X_train, X_test, y_train, y_test = train_test_split(X_poly, y, test_size=0.2, random_state=42)
-        model_poly = LinearRegression()
-        model_poly.fit(X_train, y_train)
-    
         st.write("**Coefficients:**")
-        coeffs_poly = pd.DataFrame({
-            'Feature': feature_names,
-            'Coefficient': model_poly.coef_
-        })
+        coeffs_poly = results['poly']['coefficients']
         st.dataframe(coeffs_poly, use_container_width=True)
-        y_pred_poly = model_poly.predict(X_test)
-        r2_poly = r2_score(y_test, y_pred_poly)
+        r2_poly = results['poly']['r2']
         st.metric("R² Score (test set)", f"{r2_poly:.2f}")
 
     col4, col5, col6 = st.columns(3)
@@ -648,31 +618,15 @@ elif menu == "Prediction":
         st.markdown("#### Random Forest")
         st.caption("Random Forest regression using weather and weekday. R² score is evaluated on a separate test set.")
 
-        df_rf = filtered_df.copy()
-        df_rf['weekday'] = df_rf.index.weekday
-        daily_rf = df_rf.resample('D').agg({
-            'bicycles': 'sum',
-            'tavg': 'mean',
-            'prcp': 'sum',
-            'wspd': 'mean',
-            'pres': 'mean',
-            'weekday': 'first'
-        }).dropna()
-        X_rf = daily_rf[['tavg', 'prcp', 'wspd', 'pres', 'weekday']]
-        y_rf = daily_rf['bicycles']
-    
-        X_train_rf, X_test_rf, y_train_rf, y_test_rf = train_test_split(X_rf, y_rf, test_size=0.2, random_state=42)
-        rf_model = RandomForestRegressor(random_state=42)
-        rf_model.fit(X_train_rf, y_train_rf)
-        y_pred_rf = rf_model.predict(X_test_rf)
-        r2_rf = r2_score(y_test_rf, y_pred_rf)
+        y_test_rf = results['forest']['y_test']
+        y_pred_rf = results['forest']['y_pred']
+        r2_rf = results['forest']['r2']
         st.metric("R² Score (test set)", f"{r2_rf:.2f}")
 
     with col5:
         st.markdown("#### Feature Importances")
     
-        importances = rf_model.feature_importances_
-        importance_df = pd.DataFrame({'Feature': X.columns, 'Importance': importances})
+        importance_df = results['forest']['importances']
         importance_df = importance_df.sort_values(by="Importance", ascending=False)
     
         fig_importance = px.bar(importance_df, x='Importance', y='Feature', orientation='h', title="Feature Importances", height=600)
@@ -708,38 +662,8 @@ elif menu == "Prediction":
     # Doing future predcitions chart here
     st.markdown("### 4.4 Forecast: Future Predictions")
     
-    # Use filtered_df (already based on filters)
-    df_train = filtered_df.copy()
-    df_train['weekday'] = df_train.index.weekday
-    daily = df_train.resample('D').agg({
-        'bicycles': 'sum',
-        'tavg': 'mean',
-        'prcp': 'sum',
-        'wspd': 'mean',
-        'pres': 'mean',
-        'weekday': 'first'
-    }).dropna()
-    daily['tavg_sq'] = daily['tavg'] ** 2
-    daily['prcp_sq'] = daily['prcp'] ** 2
-    daily['wspd_sq'] = daily['wspd'] ** 2
-    daily['pres_sq'] = daily['pres'] ** 2
-
-    X_train = daily[['tavg', 'prcp', 'wspd', 'pres', 'weekday', 'tavg_sq', 'prcp_sq', 'wspd_sq', 'pres_sq']]
-    y_train = daily['bicycles']
-    model = RandomForestRegressor(n_estimators=100, random_state=42)
-    model.fit(X_train, y_train)
-    
-    # Here we add another set of future data for weather
-    future_weather = pd.read_csv("data/weather_data2.csv", parse_dates=['date'])
-    future_weather = future_weather.set_index('date')
-    future_weather['weekday'] = future_weather.index.weekday
-    future_weather = future_weather.fillna(0)
-    future_weather['tavg_sq'] = future_weather['tavg'] ** 2
-    future_weather['prcp_sq'] = future_weather['prcp'] ** 2
-    future_weather['wspd_sq'] = future_weather['wspd'] ** 2
-    future_weather['pres_sq'] = future_weather['pres'] ** 2
-    
-    future_weather['predicted_bikes'] = model.predict(future_weather[X_train.columns])
+    # Random forest on all filtered days with squared weather (fitted with the other models)
+    future_weather['predicted_bikes'] = results['forecast']
     future_weather['rolling_30d'] = future_weather['predicted_bikes'].rolling(30).mean()
     
     top10 = future_weather['predicted_bikes'].nlargest(10)
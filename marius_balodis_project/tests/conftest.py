@@ -0,0 +1,32 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# The tests import utils.* from the project folder, like app.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def hourly():
+    """Hourly rows like data/merged_data.csv: some hours missing, weather missing on some days"""
+    random = np.random.default_rng(42)
+    index = pd.date_range('2021-11-15', '2023-03-10 23:00', freq='h', name='datetime')
+    index = index[random.random(len(index)) > 0.03]
+    days = index.normalize()
+    day_codes, unique_days = pd.factorize(days)
+    daily_weather = {
+        'tavg': random.normal(8, 8, len(unique_days)).round(1),
+        'prcp': random.exponential(2, len(unique_days)).round(1),
+        'wspd': random.uniform(5, 30, len(unique_days)).round(1),
+        'pres': random.normal(1015, 8, len(unique_days)).round(1),
+    }
+    df = pd.DataFrame({'bicycles': random.poisson(40, len(index)).astype(float)}, index=index)
+    for column, values in daily_weather.items():
+        values[random.random(len(values)) < 0.05] = np.nan
+        df[column] = values[day_codes]
+    df['year'] = index.year
+    df['month'] = index.month
+    return df
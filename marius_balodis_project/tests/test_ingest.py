@@ -0,0 +1,98 @@
+import os
+import filecmp
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import ingest, storage
+from utils.rollups import Rollups
+from utils.time_filter import TimeIndexFilter
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+MERGED_CSV = os.path.join(DATA, 'merged_data.csv')
+COLUMNS = ['bicycles', 'tavg', 'prcp', 'wspd', 'pres', 'month']
+STORED_HOURS = 30000
+
+
+@pytest.fixture
+def stored_csv(tmp_path):
+    """merged_data.csv up to its first STORED_HOURS hours, like before the later readings came in"""
+    csv_path = str(tmp_path / 'merged_data.csv')
+    with open(MERGED_CSV) as source, open(csv_path, 'w') as target:
+        for _, line in zip(range(STORED_HOURS + 1), source):
+            target.write(line)
+    return csv_path
+
+
+def assert_same_snapshot(snapshot, expected):
+    hourly, rollups, time_filter = snapshot
+    pd.testing.assert_frame_equal(hourly, expected)
+    full = Rollups(expected)
+    assert rollups.days.equals(full.days)
+    for band in full.daily:
+        for measure in full.daily[band]:
+            assert np.array_equal(rollups.daily[band][measure], full.daily[band][measure]), (band, measure)
+            assert np.array_equal(rollups.monthly[band][measure], full.monthly[band][measure]), (band, measure)
+    rebuilt = TimeIndexFilter(expected.index)
+    for name in ['day', 'month', 'hour', 'weekday']:
+        assert np.array_equal(getattr(time_filter, name), getattr(rebuilt, name)), name
+
+
+def test_ingest_then_refresh_matches_a_full_build(stored_csv, tmp_path):
+    live = ingest.LiveDataset(columns=COLUMNS, csv_path=stored_csv)
+    first = live.refresh()
+    assert live.refresh() is first  # Nothing written: the same snapshot
+
+    source = pd.read_csv(os.path.join(DATA, 'source_data.csv'))
+    weather = pd.read_csv(os.path.join(DATA, 'weather_data.csv'), parse_dates=['date'], index_col='date')
+    for end in [STORED_HOURS + 500, STORED_HOURS + 501, len(source)]:
+        # A feed sending everything again each time: only hours after the stored ones are appended
+        last_hour = live.refresh()[0].index.max()
+        new_rows = ingest.ingest(source.iloc[:end], weather, stored_csv)
+        assert len(new_rows) and new_rows.index.min() > last_hour
+        assert_same_snapshot(live.refresh(), storage.load(stored_csv, columns=COLUMNS))
+    assert len(ingest.ingest(source, weather, stored_csv)) == 0
+
+    # The same CSV and data as the whole merged_data.csv, the appended rows in Parquet parts
+    assert filecmp.cmp(stored_csv, MERGED_CSV, shallow=False)
+    assert len(storage.parquet_paths(stored_csv)) == 4
+    full_path = storage.convert(MERGED_CSV, path=str(tmp_path / 'full.parquet'))
+    expected = storage.read(full_path)
+    pd.testing.assert_frame_equal(storage.load(stored_csv), expected)
+    assert storage.last_index(stored_csv) == expected.index.max()
+    assert_same_snapshot(live.refresh(), storage.read(full_path, COLUMNS))
+
+    # Sessions still holding the first snapshot keep seeing the stored hours only
+    assert len(first[0]) == STORED_HOURS and first[2].size == STORED_HOURS
+    assert first[1].days[-1] < live.refresh()[1].days[-1]
+
+
+def test_parts_are_folded_into_the_converted_file(stored_csv, monkeypatch):
+    monkeypatch.setattr(storage, 'MAX_PARTS', 3)
+    live = ingest.LiveDataset(columns=COLUMNS, csv_path=stored_csv)
+    merged = storage.read_csv(MERGED_CSV, 'datetime').drop(columns=storage.DERIVED_COLUMNS)
+
+    files = []
+    for position in range(STORED_HOURS, STORED_HOURS + 7):
+        storage.append(stored_csv, merged.iloc[position:position + 1])
+        files.append(len(storage.parquet_paths(stored_csv)))
+        assert storage.last_index(stored_csv) == merged.index[position]
+        assert len(live.refresh()[0]) == position + 1
+    assert files == [2, 3, 1, 2, 3, 1, 2]
+    assert len(storage.all_parts(stored_csv)) == 1
+
+    expected = storage.read_csv(stored_csv, 'datetime')
+    pd.testing.assert_frame_equal(storage.load(stored_csv, columns=list(expected.columns)), expected)
+    pd.testing.assert_frame_equal(live.refresh()[0], expected[COLUMNS])
+    after = merged.index[STORED_HOURS + 4]
+    assert list(storage.load(stored_csv, after=after).index) == list(merged.index[STORED_HOURS + 5:STORED_HOURS + 7])
+
+
+def test_appended_midnight_hour_keeps_its_time(stored_csv):
+    merged = storage.read_csv(MERGED_CSV, 'datetime').drop(columns=storage.DERIVED_COLUMNS)
+    midnight = merged.iloc[STORED_HOURS:STORED_HOURS + 1]
+    assert midnight.index[0].hour == 0
+    storage.append(stored_csv, midnight)
+    with open(stored_csv) as csv_file:
+        assert csv_file.readlines()[-1].startswith(f"{midnight.index[0]:%Y-%m-%d %H:%M:%S},")
@@ -0,0 +1,127 @@
+import datetime as dt
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.date_mappings import season_months, time_of_day_ranges
+from utils.rollups import Rollups
+
+SEASONS = ['All', *season_months]
+TIMES_OF_DAY = ['All', *time_of_day_ranges]
+DATE_RANGES = [
+    (dt.date(2021, 11, 15), dt.date(2023, 3, 10)),   # everything
+    (dt.date(2022, 2, 10), dt.date(2022, 11, 3)),    # partial months at both ends
+    (dt.date(2022, 3, 1), dt.date(2022, 8, 31)),     # whole months
+    (dt.date(2022, 7, 1), dt.date(2022, 7, 1)),      # a single day
+    (dt.date(2020, 1, 1), dt.date(2021, 12, 1)),     # starts before the data
+]
+
+
+def pandas_filter(df, start_date, end_date, season, time_of_day):
+    # The app's filter before the rollups
+    filtered = df.loc[(df.index.date >= start_date) & (df.index.date <= end_date)]
+    if season != 'All':
+        filtered = filtered[filtered.index.month.isin(season_months[season])]
+    if time_of_day != 'All':
+        start_hour, end_hour = time_of_day_ranges[time_of_day]
+        filtered = filtered[(filtered.index.hour >= start_hour) & (filtered.index.hour < end_hour)]
+    return filtered
+
+
+def assert_close(actual, expected):
+    actual, expected = np.asarray(actual, dtype=float), np.asarray(expected, dtype=float)
+    assert actual.shape == expected.shape
+    assert np.allclose(actual, expected, equal_nan=True)
+
+
+@pytest.fixture(scope='module')
+def rollups(hourly):
+    return Rollups(hourly)
+
+
+@pytest.mark.parametrize('season,time_of_day', list(itertools.product(SEASONS, TIMES_OF_DAY)))
+def test_rollups_match_pandas(hourly, rollups, season, time_of_day):
+    for start_date, end_date in DATE_RANGES:
+        filtered = pandas_filter(hourly, start_date, end_date, season, time_of_day)
+        totals = rollups.totals(start_date, end_date, season, time_of_day)
+        daily = rollups.daily_frame(start_date, end_date, season, time_of_day)
+        if filtered.empty:
+            assert totals['hours'] == 0 and daily.empty
+            continue
+
+        resampled = filtered.resample('D').agg(
+            {'bicycles': 'sum', 'tavg': 'mean', 'prcp': 'mean', 'wspd': 'mean', 'pres': 'mean'})
+        assert daily.index.equals(resampled.index)
+        assert_close(daily[list(resampled.columns)], resampled)
+        assert_close(daily['prcp_sum'], filtered['prcp'].resample('D').sum())
+
+        assert totals['hours'] == len(filtered)
+        assert np.isclose(totals['bicycles'], filtered['bicycles'].sum())
+        for column in ['tavg', 'prcp', 'wspd', 'pres']:
+            assert np.isclose(totals[column], filtered[column].mean())
+        assert (totals['first_hour'], totals['last_hour']) == (filtered.index.min(), filtered.index.max())
+
+        pivot = filtered.pivot_table(index=filtered.index.weekday, columns=filtered.index.hour,
+                                     values='bicycles', aggfunc='mean')
+        means = rollups.hour_means(start_date, end_date, season, time_of_day)
+        assert list(means.index) == list(pivot.index) and list(means.columns) == list(pivot.columns)
+        assert_close(means, pivot)
+
+        profile = filtered.groupby(filtered.index.hour)['bicycles'].mean()
+        by_hour = rollups.hour_means(start_date, end_date, season, time_of_day, by_weekday=False)
+        assert list(by_hour.index) == list(profile.index)
+        assert_close(by_hour, profile)
+
+        monthly = filtered.groupby(['year', 'month'])['bicycles'].sum()
+        assert list(rollups.monthly_bicycles(start_date, end_date, season, time_of_day).index) == list(monthly.index)
+        assert_close(rollups.monthly_bicycles(start_date, end_date, season, time_of_day), monthly)
+
+
+def assert_same_rollups(actual, expected):
+    assert actual.counters == expected.counters and actual.days.equals(expected.days)
+    assert actual.months.equals(expected.months)
+    for name in ['day_month', 'day_weekday', 'month_codes', 'month_starts']:
+        assert np.array_equal(getattr(actual, name), getattr(expected, name)), name
+    for measure, values in expected.hourly.items():
+        assert actual.hourly[measure].dtype == values.dtype
+        assert np.array_equal(actual.hourly[measure], values), measure
+    for band in expected.daily:
+        for measure in expected.daily[band]:
+            assert np.array_equal(actual.daily[band][measure], expected.daily[band][measure]), (band, measure)
+            assert np.array_equal(actual.monthly[band][measure], expected.monthly[band][measure]), (band, measure)
+
+
+def test_appended_rows_give_the_full_build(hourly):
+    full = Rollups(hourly)
+
+    # Chunks ending mid-day and single hours
+    appended = Rollups(hourly.iloc[:4000])
+    for start, end in [(4000, 4005), (4005, 4006), (4006, 7777), (7777, len(hourly))]:
+        appended.append(hourly.iloc[start:end])
+    assert_same_rollups(appended, full)
+
+    # Earlier rows than the stored ones extend the day axis at the front
+    appended = Rollups(hourly.iloc[5000:])
+    appended.append(hourly.iloc[:5000])
+    assert_same_rollups(appended, full)
+
+
+def test_counter_arriving_later(hourly):
+    a, b = hourly.assign(counter='A'), hourly.iloc[2000:6000].assign(counter='B')
+    full = Rollups(pd.concat([a, b]).sort_index(kind='stable'))
+    appended = Rollups(a.iloc[:3000])
+    appended.append(pd.concat([a.iloc[3000:], b]).sort_index(kind='stable'))
+    assert appended.counters == full.counters == ['A', 'B']
+    assert_same_rollups(appended, full)
+    assert appended.totals('2022-01-01', '2022-12-31', counter='B') == full.totals('2022-01-01', '2022-12-31', counter='B')
+
+
+def test_copy_leaves_the_original_as_it_was(hourly):
+    original = Rollups(hourly.iloc[:6000])
+    before = Rollups(hourly.iloc[:6000])
+    extended = original.copy()
+    extended.append(hourly.iloc[6000:].assign(counter='B'))
+    assert_same_rollups(original, before)
+    assert extended.counters == [original.counters[0], 'B']
@@ -0,0 +1,89 @@
+import datetime as dt
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.date_mappings import season_months, time_of_day_ranges
+from utils.time_filter import TimeIndexFilter
+
+SEASONS = ['All', *season_months]
+TIMES_OF_DAY = ['All', *time_of_day_ranges]
+DATE_RANGES = [
+    (dt.date(2021, 11, 15), dt.date(2023, 3, 10)),
+    (dt.date(2022, 2, 10), dt.date(2022, 11, 3)),
+    (dt.date(2022, 7, 1), dt.date(2022, 7, 1)),
+    (dt.date(2020, 1, 1), dt.date(2021, 12, 1)),
+    (dt.date(2024, 1, 1), dt.date(2024, 2, 1)),
+]
+
+
+def pandas_filter(df, start_date, end_date, season, time_of_day):
+    # The app's filter before TimeIndexFilter
+    filtered = df.loc[(df.index.date >= start_date) & (df.index.date <= end_date)]
+    if season != 'All':
+        filtered = filtered[filtered.index.month.isin(season_months[season])]
+    if time_of_day != 'All':
+        start_hour, end_hour = time_of_day_ranges[time_of_day]
+        filtered = filtered[(filtered.index.hour >= start_hour) & (filtered.index.hour < end_hour)]
+    return filtered
+
+
+@pytest.fixture(scope='module')
+def multi_counter(hourly):
+    """Rows of two counters one after another: the index repeats timestamps and isn't sorted"""
+    return pd.concat([hourly.assign(counter='A'), hourly.iloc[::3].assign(counter='B')])
+
+
+@pytest.mark.parametrize('season,time_of_day', list(itertools.product(SEASONS, TIMES_OF_DAY)))
+def test_filter_matches_pandas(hourly, multi_counter, season, time_of_day):
+    for df in [hourly, multi_counter]:
+        time_filter = TimeIndexFilter(df.index)
+        for start_date, end_date in DATE_RANGES:
+            expected = pandas_filter(df, start_date, end_date, season, time_of_day)
+            pd.testing.assert_frame_equal(time_filter.apply(df, start_date, end_date, season, time_of_day), expected)
+
+
+def test_rows_are_remembered_per_filter(hourly):
+    time_filter = TimeIndexFilter(hourly.index, max_cached=2)
+    first = time_filter.rows(dt.date(2022, 1, 1), dt.date(2022, 6, 30), 'Winter', 'Night')
+    assert time_filter.rows(dt.date(2022, 1, 1), dt.date(2022, 6, 30), 'Winter', 'Night') is first
+    time_filter.rows(dt.date(2022, 1, 1), dt.date(2022, 6, 30))
+    time_filter.rows(dt.date(2022, 2, 1), dt.date(2022, 6, 30))
+    assert len(time_filter.cache) == 2
+    assert np.array_equal(time_filter.rows(dt.date(2022, 1, 1), dt.date(2022, 6, 30), 'Winter', 'Night'), first)
+
+
+def assert_same_filter(actual, expected):
+    assert actual.size == expected.size
+    for name in ['day', 'month', 'hour', 'weekday']:
+        assert np.array_equal(getattr(actual, name), getattr(expected, name)), name
+    assert (actual.order is None) == (expected.order is None)
+    if expected.order is not None:
+        assert np.array_equal(actual.order, expected.order)
+
+
+@pytest.mark.parametrize('cuts', [[3000, 3001, 5000], [0, 9000]])
+def test_extended_filter_is_the_rebuilt_filter(hourly, multi_counter, cuts):
+    for df in [hourly, multi_counter]:
+        index = df.index
+        original = TimeIndexFilter(index[:cuts[0]])
+        original.rows(dt.date(2022, 1, 1), dt.date(2022, 1, 31), 'Winter', 'Night')
+        extended = original
+        for start, end in zip(cuts, cuts[1:] + [len(index)]):
+            extended = extended.extended(index[start:end])
+        assert_same_filter(extended, TimeIndexFilter(index))
+        assert not extended.cache
+
+        # The filter it was extended from still selects its own rows
+        assert_same_filter(original, TimeIndexFilter(index[:cuts[0]]))
+        for start_date, end_date in DATE_RANGES[:3]:
+            pd.testing.assert_frame_equal(extended.apply(df, start_date, end_date, 'Summer', 'Evening'),
+                                          pandas_filter(df, start_date, end_date, 'Summer', 'Evening'))
+
+
+def test_earlier_rows_reorder_the_extended_filter(hourly):
+    later, earlier = hourly.index[6000:], hourly.index[:6000]
+    index = later.append(earlier)
+    assert_same_filter(TimeIndexFilter(later).extended(earlier), TimeIndexFilter(index))
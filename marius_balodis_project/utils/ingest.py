@@ -0,0 +1,101 @@
+import sys
+import threading
+
+import pandas as pd
+
+from utils import storage
+from utils.rollups import Rollups
+from utils.time_filter import TimeIndexFilter
+
+
+def clean_source(source_df):
+    """
+    Hourly bike rows from counter readings like data/source_data.csv, with the QC of
+    01_data_cleaning.ipynb: bicycles = QC'd count (raw where it's missing),
+    qa_difference = raw - QC'd (0 where missing), missing QC'd counts = 0.
+    """
+    df = source_df.copy()
+    df['bicycles'] = df['bicycles_qcd'].fillna(df['bicycles_raw'])
+    df['datetime'] = pd.to_datetime(df['date_'] + ' ' + df['hour'].str[:2] + ':00:00')
+    df = df.set_index('datetime').drop(['date_', 'hour'], axis=1)
+    df['qa_difference'] = (df['bicycles_raw'] - df['bicycles_qcd']).fillna(0)
+    df['bicycles_qcd'] = df['bicycles_qcd'].fillna(0)
+
+    # A feed may send an hour again (corrected): the last reading wins
+    return df[~df.index.duplicated(keep='last')].sort_index()
+
+
+def merge_weather(bikes, weather):
+    """Hourly bike rows with the daily weather of their date (hours of days without weather are left out)"""
+    dates = bikes.index.normalize()
+    has_weather = dates.isin(weather.index)
+    bikes = bikes[has_weather]
+    return pd.concat([bikes, weather.reindex(dates[has_weather]).set_axis(bikes.index)], axis=1)
+
+
+def ingest(source_df, weather, csv_path=storage.MERGED_CSV):
+    """
+    Appends the hours of source_df that come after the stored dataset (merged_data) to it,
+    cleaned and with their weather. Hours whose day has no weather yet are picked up by a
+    later run, once the weather is there.
+    source_df: counter readings like data/source_data.csv
+    weather: daily weather with a date index (like storage.load_weather)
+    Returns the appended rows.
+    """
+    bikes = clean_source(source_df)
+    last = storage.last_index(csv_path)
+    if last is not None:
+        bikes = bikes[bikes.index > last]
+    new_rows = merge_weather(bikes, weather)
+    if len(new_rows):
+        storage.append(csv_path, new_rows)
+    return new_rows
+
+
+def ingest_files(source_csv, weather_csv, csv_path=storage.MERGED_CSV):
+    source_df = pd.read_csv(source_csv)
+    weather = pd.read_csv(weather_csv, parse_dates=['date'], index_col='date')
+    return ingest(source_df, weather, csv_path)
+
+
+class LiveDataset:
+    """
+    The dashboard's hourly rows, rollups and time filter, following the stored dataset.
+
+    refresh() checks whether the dataset was written since the last time, reads only the
+    rows after the last hour it has and adds them to the rollups (Rollups.append) and the
+    time filter (TimeIndexFilter.extended) instead of loading everything again.
+    """
+
+    def __init__(self, columns=None, csv_path=storage.MERGED_CSV):
+        self.columns = columns
+        self.csv_path = csv_path
+        self.lock = threading.Lock()
+        self.version = storage.version(csv_path)
+        hourly = storage.load_merged(columns, csv_path)
+        self.snapshot = (hourly, Rollups(hourly), TimeIndexFilter(hourly.index))
+
+    def refresh(self):
+        """(hourly rows, rollups, time filter) with the rows appended so far"""
+        with self.lock:
+            version = storage.version(self.csv_path)
+            if version != self.version:
+                hourly, rollups, time_filter = self.snapshot
+                after = hourly.index.max() if len(hourly) else None
+                new_rows = storage.load_merged(self.columns, self.csv_path, after=after)
+                if len(new_rows):
+                    # A new snapshot: sessions running right now keep using the previous one
+                    rollups = rollups.copy()
+                    rollups.append(new_rows)
+                    self.snapshot = (pd.concat([hourly, new_rows]), rollups, time_filter.extended(new_rows.index))
+                self.version = version
+            return self.snapshot
+
+
+if __name__ == '__main__':
+    # python -m utils.ingest <source csv> <weather csv> (from the project folder)
+    new_rows = ingest_files(*sys.argv[1:3])
+    if len(new_rows):
+        print(f"Appended {len(new_rows)} hours ({new_rows.index.min()} - {new_rows.index.max()})")
+    else:
+        print("No new hours")
@@ -0,0 +1,210 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import joblib
+import pandas as pd
+
+from sklearn.linear_model import LinearRegression
+from sklearn.preprocessing import PolynomialFeatures
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import r2_score
+from sklearn.ensemble import RandomForestRegressor
+
+# Bump when a model or its features change, so stored fits are not reused
+MODEL_ZOO_VERSION = 1
+
+FEATURES = ['tavg', 'prcp', 'wspd', 'pres', 'weekday']
+WEATHER_FEATURES = ['tavg', 'prcp', 'wspd', 'pres']
+FORECAST_FEATURES = FEATURES + [f'{column}_sq' for column in WEATHER_FEATURES]
+
+
+def training_data(daily_df):
+    """Daily training data: weather averages (precipitation summed over the hours) and weekday"""
+    daily = daily_df[['bicycles', 'tavg', 'prcp_sum', 'wspd', 'pres']].rename(columns={'prcp_sum': 'prcp'})
+    daily['weekday'] = daily.index.weekday
+    return daily.dropna()
+
+
+def add_squares(df):
+    df = df.copy()
+    for column in WEATHER_FEATURES:
+        df[f'{column}_sq'] = df[column] ** 2
+    return df
+
+
+def fingerprint(*frames):
+    """SHA-256 over the model version and the labels and values of the frames"""
+    digest = hashlib.sha256(str(MODEL_ZOO_VERSION).encode())
+    for frame in frames:
+        digest.update(repr(list(frame.columns)).encode())
+        digest.update(pd.util.hash_pandas_object(frame, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def fit_models(daily, future_weather, n_jobs=-1):
+    """
+    Fits every model of the Prediction tab on the daily training data.
+    R² scores are evaluated on the same 20% test split as before (random_state=42).
+    Returns a dict with everything the tab shows (the fitted models aren't kept).
+    """
+    X = daily[FEATURES]
+    y = daily['bicycles']
+    results = {}
+
+    # ~~~ Linear regression, linear regression with squares, polynomial regression (degree 3)
+    poly = PolynomialFeatures(degree=3, include_bias=False)
+    X_squared = X.copy()
+    for col in WEATHER_FEATURES:
+        X_squared[f'{col}_squared'] = X[col] ** 2
+    for name, features, feature_names in [
+        ('linear', X, X.columns),
+        ('squared', X_squared, X_squared.columns),
+        ('poly', poly.fit_transform(X), poly.get_feature_names_out(X.columns)),
+    ]:
+        X_train, X_test, y_train, y_test = train_test_split(features, y, test_size=0.2, random_state=42)
+        model = LinearRegression()
+        model.fit(X_train, y_train)
+        results[name] = {
+            'coefficients': pd.DataFrame({'Feature': feature_names, 'Coefficient': model.coef_}),
+            'r2': r2_score(y_test, model.predict(X_test))
+        }
+
+    # ~~~ Random forest (trees are trained in parallel, the result doesn't depend on n_jobs)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    rf_model = RandomForestRegressor(random_state=42, n_jobs=n_jobs)
+    rf_model.fit(X_train, y_train)
+    y_pred = rf_model.predict(X_test)
+    results['forest'] = {
+        'r2': r2_score(y_test, y_pred),
+        'importances': pd.DataFrame({'Feature': X.columns, 'Importance': rf_model.feature_importances_}),
+        'y_test': y_test,
+        'y_pred': y_pred
+    }
+
+    # ~~~ Forecast: random forest on all days with squared weather, predicting the future weather
+    forecast_model = RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=n_jobs)
+    forecast_model.fit(add_squares(daily)[FORECAST_FEATURES], y)
+    results['forecast'] = pd.Series(forecast_model.predict(add_squares(future_weather)[FORECAST_FEATURES]),
+                                    index=future_weather.index, name='predicted_bikes')
+    return results
+
+
+class ModelZoo:
+    """
+    Prediction tab results per filter state, kept in memory (LRU) and on disk (joblib).
+
+    Entries are keyed by the filter state and a fingerprint of the training data and
+    future weather, so changed data never reuses old fits. Only the results the tab
+    shows are stored (<key>.joblib, small), not the fitted models. Fits for a few other
+    filter states can be computed in a background thread.
+    """
+
+    def __init__(self, cache_dir='data/model_cache', max_items=256, max_disk_bytes=200 * 1024 * 1024, n_jobs=-1,
+                 precompute_n_jobs=1):
+        self.cache_dir = cache_dir
+        self.max_items = max_items
+        self.max_disk_bytes = max_disk_bytes
+        self.n_jobs = n_jobs
+        # Background fits use one core, so the sessions' own fits aren't slowed down
+        self.precompute_n_jobs = precompute_n_jobs
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.key_locks = {}
+        self.background = ThreadPoolExecutor(max_workers=1, thread_name_prefix='model-zoo')
+        # Keys waiting for (or in) the background thread
+        self.queued = set()
+
+    def key(self, filters, daily, future_weather):
+        filter_state = hashlib.sha256(repr(filters).encode()).hexdigest()[:16]
+        return f"{filter_state}_{fingerprint(daily, future_weather)[:32]}"
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.joblib")
+
+    def get(self, filters, daily, future_weather):
+        """Results of fit_models for this filter state"""
+        return self.fetch(self.key(filters, daily, future_weather), daily, future_weather, self.n_jobs)
+
+    def fetch(self, key, daily, future_weather, n_jobs):
+        """Results of fit_models for a key, fitted with n_jobs if neither in memory nor on disk"""
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                return self.memory[key]
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+
+        # One fit per key, even when a session and the background thread ask at once
+        with key_lock:
+            with self.lock:
+                if key in self.memory:
+                    return self.memory[key]
+            results = self.load(key)
+            if results is None:
+                results = fit_models(daily, future_weather, n_jobs)
+                self.save(key, results)
+            with self.lock:
+                self.memory[key] = results
+                while len(self.memory) > self.max_items:
+                    self.memory.popitem(last=False)
+                self.key_locks.pop(key, None)
+        return results
+
+    def load(self, key):
+        try:
+            results = joblib.load(self.path(key))
+            os.utime(self.path(key))  # Recently used, pruned last
+            return results
+        except Exception:
+            return None  # Not stored or unreadable (e.g. other library versions): fit again
+
+    def save(self, key, results):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temporary_path = f"{self.path(key)}.{threading.get_ident()}.tmp"
+            joblib.dump(results, temporary_path, compress=3)
+            os.replace(temporary_path, self.path(key))
+            self.prune()
+        except OSError:
+            pass  # Read-only disk: the in-memory cache still works
+
+    def prune(self):
+        # Remove the least recently used entries above max_disk_bytes
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.joblib'):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            os.remove(os.path.join(self.cache_dir, name))
+            total -= size
+
+    def precompute(self, jobs, future_weather):
+        """
+        Fits other filter states in the background thread, one after another.
+        States already in memory or queued are skipped.
+        jobs: (filters, daily training data) pairs
+        """
+        for filters, daily in jobs:
+            if len(daily) < 5:  # train_test_split needs a few days
+                continue
+            key = self.key(filters, daily, future_weather)
+            with self.lock:
+                if key in self.memory or key in self.queued:
+                    continue
+                self.queued.add(key)
+            self.background.submit(self._precompute_one, key, daily, future_weather)
+
+    def _precompute_one(self, key, daily, future_weather):
+        try:
+            self.fetch(key, daily, future_weather, self.precompute_n_jobs)
+        except Exception:
+            pass  # A failing combination is fitted (and reported) when it's actually opened
+        finally:
+            with self.lock:
+                self.queued.discard(key)
@@ -0,0 +1,221 @@
+import copy
+
+import numpy as np
+import pandas as pd
+
+from utils.date_mappings import season_months, time_of_day_ranges
+
+# Counter of the current dataset (it has no counter column)
+DEFAULT_COUNTER = 'Žvejų g.'
+
+WEATHER_COLUMNS = ['tavg', 'prcp', 'wspd', 'pres']
+MEASURES = ['bicycles'] + WEATHER_COLUMNS
+
+# Time of day filter as hour ranges [start, end), "All" included
+TIME_OF_DAY_BANDS = {'All': (0, 24), **time_of_day_ranges}
+
+
+def extended(values, shape, day_offset, dtype):
+    """Zeros of the new (counter, day, ...) shape with the old values copied in (None -> just zeros)"""
+    result = np.zeros(shape, dtype=dtype)
+    if values is not None:
+        result[:values.shape[0], day_offset:day_offset + values.shape[1]] = values
+    return result
+
+
+class Rollups:
+    """
+    Hourly, daily and monthly aggregates of bikes and weather per counter, built once.
+
+    Everything is stored as sums and counts on a continuous day axis:
+    - hourly[measure]           -> array (counter, day, hour)
+    - daily[band][measure]      -> array (counter, day), one per time of day band
+    - monthly[band][measure]    -> array (counter, month)
+    Measures are 'rows' (hourly rows), every column of MEASURES (sum of the values)
+    and '<column>_count' (number of values, so means skip missing values like pandas).
+
+    A filter (date range, season, time of day) is answered by slicing these arrays,
+    not by resampling the hourly rows again. New hourly rows are added with append().
+    """
+
+    def __init__(self, hourly_df, counter_column='counter'):
+        self.counter_column = counter_column
+        self.counters = []
+        self.days = pd.DatetimeIndex([], name=hourly_df.index.name)
+        self.hourly, self.daily, self.monthly = {}, {}, {}
+        self.append(hourly_df)
+
+    def copy(self):
+        """
+        A copy to append to while this one is still read. append() puts new arrays in the
+        dicts instead of writing into the old ones, so only the containers are copied.
+        """
+        result = copy.copy(self)
+        result.counters = list(self.counters)
+        result.hourly = dict(self.hourly)
+        result.daily = {band: dict(measures) for band, measures in self.daily.items()}
+        result.monthly = dict(self.monthly)
+        return result
+
+    def append(self, hourly_df):
+        """
+        Adds hourly rows of hours that aren't in the aggregates yet (e.g. from utils/ingest.py).
+        The axes are extended, the new rows added to their cells and only the daily level of
+        their days aggregated again, instead of building everything from all rows.
+        """
+        if len(hourly_df) == 0:
+            return
+        index = hourly_df.index
+        if self.counter_column in hourly_df.columns:
+            new_counters = set(hourly_df[self.counter_column]) - set(self.counters)
+            self.counters += sorted(new_counters)
+            counter_codes = pd.Index(self.counters).get_indexer(hourly_df[self.counter_column])
+        else:
+            self.counters = self.counters or [DEFAULT_COUNTER]
+            counter_codes = np.zeros(len(hourly_df), dtype=np.int64)
+
+        # Continuous day axis from the first to the last day of data (days without data stay 0)
+        day_index = index.normalize()
+        first_day, last_day = day_index.min(), day_index.max()
+        if len(self.days):
+            first_day, last_day = min(first_day, self.days[0]), max(last_day, self.days[-1])
+            offset = (self.days[0] - first_day).days
+        else:
+            offset = 0
+        self.days = pd.date_range(first_day, last_day, freq='D', name=index.name)
+        day_codes = (day_index - self.days[0]).days.to_numpy()
+
+        # ~~~ Hourly level: one cell per counter, day and hour
+        shape = (len(self.counters), len(self.days), 24)
+        for measure in ['rows', *MEASURES, *[f'{column}_count' for column in MEASURES]]:
+            dtype = float if measure in MEASURES else np.int64
+            self.hourly[measure] = extended(self.hourly.get(measure), shape, offset, dtype)
+        cells = np.ravel_multi_index((counter_codes, day_codes, index.hour.to_numpy()), shape)
+        size = int(np.prod(shape))
+        self.hourly['rows'].reshape(-1)[:] += np.bincount(cells, minlength=size)
+        for column in MEASURES:
+            values = hourly_df[column].to_numpy(dtype=float)
+            valid = ~np.isnan(values)
+            self.hourly[column].reshape(-1)[:] += np.bincount(cells[valid], weights=values[valid], minlength=size)
+            self.hourly[f'{column}_count'].reshape(-1)[:] += np.bincount(cells[valid], minlength=size)
+
+        # Calendar of the day axis
+        self.day_month = self.days.month.to_numpy()
+        self.day_weekday = self.days.weekday.to_numpy()
+        self.month_codes, self.months = pd.factorize(self.days.to_period('M'))
+        self.month_starts = np.flatnonzero(np.r_[True, np.diff(self.month_codes) != 0])
+
+        # ~~~ Daily and monthly levels for every time of day
+        # Daily from the first day of the new rows on, monthly again (a few dozen months)
+        first_changed = day_codes.min()
+        for band, (start_hour, end_hour) in TIME_OF_DAY_BANDS.items():
+            daily = self.daily.setdefault(band, {})
+            for measure, values in self.hourly.items():
+                daily[measure] = extended(daily.get(measure), shape[:2], offset, values.dtype)
+                daily[measure][:, first_changed:] = values[:, first_changed:, start_hour:end_hour].sum(axis=2)
+            self.monthly[band] = {measure: np.add.reduceat(values, self.month_starts, axis=1)
+                                  for measure, values in daily.items()}
+
+    def select(self, start_date, end_date, season="All", counter=DEFAULT_COUNTER):
+        """Counter position, day range [first, last) and the days of that range in the season"""
+        counter_position = self.counters.index(counter)
+        first = self.days.searchsorted(pd.Timestamp(start_date))
+        last = self.days.searchsorted(pd.Timestamp(end_date), side='right')
+        if season == "All":
+            in_season = np.ones(last - first, dtype=bool)
+        else:
+            in_season = np.isin(self.day_month[first:last], season_months[season])
+        return counter_position, first, last, in_season
+
+    def daily_frame(self, start_date, end_date, season="All", time_of_day="All", counter=DEFAULT_COUNTER):
+        """
+        Daily bikes and weather of the filtered hours, like resampling them with resample('D'):
+        from the first to the last filtered day, days outside the season have 0 bikes and no weather.
+        Columns: bicycles (sum), tavg/prcp/wspd/pres (mean), <weather>_sum and hours (filtered rows).
+        """
+        counter_position, first, last, in_season = self.select(start_date, end_date, season, counter)
+        level = self.daily[time_of_day]
+        rows = np.where(in_season, level['rows'][counter_position, first:last], 0)
+        present = np.flatnonzero(rows)
+        if len(present) == 0:
+            return pd.DataFrame(columns=['bicycles', *WEATHER_COLUMNS, 'hours'], index=self.days[:0])
+
+        keep = in_season[present[0]:present[-1] + 1]
+        days = slice(first + present[0], first + present[-1] + 1)
+        columns = {'bicycles': np.where(keep, level['bicycles'][counter_position, days], 0.0)}
+        for column in WEATHER_COLUMNS:
+            total = np.where(keep, level[column][counter_position, days], 0.0)
+            count = np.where(keep, level[f'{column}_count'][counter_position, days], 0)
+            columns[column] = np.divide(total, count, out=np.full(len(total), np.nan), where=count > 0)
+            columns[f'{column}_sum'] = total
+        columns['hours'] = rows[present[0]:present[-1] + 1]
+        return pd.DataFrame(columns, index=self.days[days])
+
+    def totals(self, start_date, end_date, season="All", time_of_day="All", counter=DEFAULT_COUNTER):
+        """Bike total, number of hourly rows, hourly weather means and first/last hour of the filtered rows"""
+        counter_position, first, last, in_season = self.select(start_date, end_date, season, counter)
+        level = self.daily[time_of_day]
+        totals = {'hours': int(level['rows'][counter_position, first:last][in_season].sum()),
+                  'bicycles': level['bicycles'][counter_position, first:last][in_season].sum()}
+        for column in WEATHER_COLUMNS:
+            count = level[f'{column}_count'][counter_position, first:last][in_season].sum()
+            total = level[column][counter_position, first:last][in_season].sum()
+            totals[column] = total / count if count else np.nan
+
+        totals['first_hour'] = totals['last_hour'] = None
+        if totals['hours']:
+            start_hour, end_hour = TIME_OF_DAY_BANDS[time_of_day]
+            rows = self.hourly['rows'][counter_position, first:last, start_hour:end_hour] * in_season[:, None]
+            filled = np.flatnonzero(rows.ravel())
+            for key, cell in [('first_hour', filled[0]), ('last_hour', filled[-1])]:
+                day, hour = divmod(int(cell), end_hour - start_hour)
+                totals[key] = self.days[first + day] + pd.Timedelta(hours=start_hour + hour)
+        return totals
+
+    def hour_means(self, start_date, end_date, season="All", time_of_day="All", counter=DEFAULT_COUNTER,
+                   by_weekday=True):
+        """Average bikes per weekday and hour of the filtered rows (DataFrame weekday x hour),
+        or per hour only (Series) with by_weekday=False"""
+        counter_position, first, last, in_season = self.select(start_date, end_date, season, counter)
+        start_hour, end_hour = TIME_OF_DAY_BANDS[time_of_day]
+        weekdays = self.day_weekday[first:last][in_season]
+
+        # Adding up the days of every weekday as one matrix product (7 x days) @ (days x hours)
+        weekday_days = (weekdays == np.arange(7)[:, None]).astype(float)
+        sums, counts, rows = (weekday_days @ self.hourly[measure][counter_position, first:last, start_hour:end_hour][in_season]
+                              for measure in ['bicycles', 'bicycles_count', 'rows'])
+
+        if not by_weekday:
+            hours = rows.sum(axis=0) > 0
+            means = sums.sum(axis=0)[hours] / counts.sum(axis=0)[hours]
+            return pd.Series(means, index=np.arange(start_hour, end_hour)[hours], name='bicycles')
+
+        means = pd.DataFrame(np.divide(sums, counts, out=np.full(sums.shape, np.nan), where=counts > 0),
+                             index=range(7), columns=range(start_hour, end_hour))
+        # Only weekdays and hours that have rows, like groupby/pivot_table
+        return means.loc[rows.sum(axis=1) > 0, rows.sum(axis=0) > 0]
+
+    def monthly_bicycles(self, start_date, end_date, season="All", time_of_day="All", counter=DEFAULT_COUNTER):
+        """Bike totals per (year, month) of the filtered rows"""
+        counter_position, first, last, in_season = self.select(start_date, end_date, season, counter)
+        level = self.daily[time_of_day]
+
+        if first < last and first in self.month_starts and (last == len(self.days) or last in self.month_starts):
+            # Whole months only: read the monthly level
+            months = slice(self.month_codes[first], self.month_codes[last - 1] + 1)
+            periods = self.months[months]
+            bicycles = self.monthly[time_of_day]['bicycles'][counter_position, months]
+            rows = self.monthly[time_of_day]['rows'][counter_position, months]
+            if season != "All":
+                rows = np.where(np.isin(periods.month, season_months[season]), rows, 0)
+        else:
+            # Partial months at the edges: add up the days
+            codes = self.month_codes[first:last][in_season]
+            base = codes.min() if len(codes) else 0
+            bicycles = np.bincount(codes - base, weights=level['bicycles'][counter_position, first:last][in_season])
+            rows = np.bincount(codes - base, weights=level['rows'][counter_position, first:last][in_season])
+            periods = self.months[base:base + len(rows)]
+
+        present = rows > 0
+        index = pd.MultiIndex.from_arrays([periods.year[present], periods.month[present]], names=['year', 'month'])
+        return pd.Series(bicycles[present], index=index, name='bicycles')
@@ -0,0 +1,277 @@
+import os
+import glob
+import json
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None  # Without pyarrow the CSV files are read as before
+
+MERGED_CSV = 'data/merged_data.csv'
+WEATHER_CSV = 'data/weather_data2.csv'
+
+# Columns of merged_data.csv that are just the datetime index again, not stored in Parquet
+DERIVED_COLUMNS = ['date_only', 'year', 'month', 'hour', 'weekday']
+
+# Schema metadata key with the original dtypes and decimals (to restore the exact values)
+METADATA_KEY = b'bike_dashboard'
+
+# Appended rows go to part files next to the converted file, folded into it once there are more
+MAX_PARTS = 48
+
+
+def parquet_path(csv_path):
+    return os.path.splitext(csv_path)[0] + '.parquet'
+
+
+def part_path(csv_path, number):
+    return f"{os.path.splitext(csv_path)[0]}.part{number:05d}.parquet"
+
+
+def all_parts(csv_path):
+    return sorted(glob.glob(glob.escape(os.path.splitext(csv_path)[0]) + '.part*.parquet'))
+
+
+def parquet_paths(csv_path):
+    """
+    Parquet files of a data CSV in row order: the converted file, then the parts appended
+    to it ([] if not converted). Parts older than the converted file are already in it.
+    """
+    path = parquet_path(csv_path)
+    if not os.path.exists(path):
+        return []
+    converted = os.stat(path).st_mtime_ns
+    return [path, *[part for part in all_parts(csv_path) if os.stat(part).st_mtime_ns >= converted]]
+
+
+def remove_parts(csv_path):
+    for part in all_parts(csv_path):
+        os.remove(part)
+
+
+def add_derived(df, columns=DERIVED_COLUMNS):
+    """Adds derived calendar columns from the datetime index (like in merged_data.csv)"""
+    calendar = {
+        'date_only': lambda index: index.strftime('%Y-%m-%d'),
+        'year': lambda index: index.year.astype(np.int64),
+        'month': lambda index: index.month.astype(np.int64),
+        'hour': lambda index: index.hour.astype(np.int64),
+        'weekday': lambda index: index.weekday.astype(np.int64),
+    }
+    for column in columns:
+        df[column] = calendar[column](df.index)
+    return df
+
+
+def decimals(values, max_decimals=3):
+    """Smallest number of decimals the values are written with (None if more than max_decimals)"""
+    finite = values[np.isfinite(values)]
+    for digits in range(max_decimals + 1):
+        if np.array_equal(np.round(finite, digits), finite):
+            return digits
+    return None
+
+
+def downcast(df):
+    """
+    Smallest dtypes that keep every value:
+    - integers (and floats that are whole numbers without NaN) -> smallest integer type
+    - floats with a few decimals -> float32, restored exactly by rounding to those decimals
+    Returns the downcast frame and the metadata (original dtypes, decimals of float32 columns)
+    """
+    columns = {}
+    metadata = {'dtypes': {}, 'decimals': {}}
+    for name, values in df.items():
+        metadata['dtypes'][name] = str(values.dtype)
+        if pd.api.types.is_integer_dtype(values):
+            values = pd.to_numeric(values, downcast='integer')
+        elif pd.api.types.is_float_dtype(values):
+            array = values.to_numpy(dtype=float)
+            digits = decimals(array)
+            if digits == 0 and not np.isnan(array).any():
+                values = pd.to_numeric(values.astype(np.int64), downcast='integer')
+            elif digits is not None and np.array_equal(np.round(array.astype(np.float32).astype(float), digits),
+                                                       array, equal_nan=True):
+                values = values.astype(np.float32)
+                metadata['decimals'][name] = digits
+        columns[name] = values
+    return pd.DataFrame(columns, index=df.index), metadata
+
+
+def restore(df, metadata):
+    """Original dtypes and values of a downcast frame"""
+    for name in df.columns.intersection(list(metadata['dtypes'])):
+        values = df[name].astype(metadata['dtypes'][name])
+        if name in metadata['decimals']:
+            values = values.round(metadata['decimals'][name])
+        df[name] = values
+    return df
+
+
+def read_csv(csv_path, index_column):
+    return pd.read_csv(csv_path, parse_dates=[index_column], index_col=index_column)
+
+
+def convert(csv_path, index_column='datetime', path=None):
+    """
+    Converts a data CSV to compressed Parquet next to it (or to path):
+    derived calendar columns dropped, dtypes downcast without changing any value.
+    Returns the Parquet path.
+    """
+    path = path or parquet_path(csv_path)
+    df = read_csv(csv_path, index_column)
+    df = df.drop(columns=[column for column in DERIVED_COLUMNS if column in df.columns])
+    write(df, path)
+    if path == parquet_path(csv_path):
+        remove_parts(csv_path)
+    return path
+
+
+def write(df, path):
+    """Writes a frame (datetime index) to compressed Parquet, downcast, atomically"""
+    downcast_df, metadata = downcast(df)
+    table = pa.Table.from_pandas(downcast_df, preserve_index=True)
+    table = table.replace_schema_metadata({**table.schema.metadata, METADATA_KEY: json.dumps(metadata).encode()})
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(table, temporary_path, compression='zstd')
+    os.replace(temporary_path, path)
+    return path
+
+
+def read(path, columns=None, after=None):
+    """
+    Reads a converted Parquet file memory-mapped, only the given columns (all if None),
+    with the original dtypes and values. Derived calendar columns are added if asked for.
+    after: only rows with a later index (row groups before it aren't read)
+    """
+    schema = pq.read_schema(path)
+    metadata = json.loads(schema.metadata[METADATA_KEY])
+    derived = [column for column in columns or [] if column in DERIVED_COLUMNS and column not in schema.names]
+    stored = None if columns is None else [column for column in columns if column not in derived]
+    filters = None if after is None else [(schema.pandas_metadata['index_columns'][0], '>', pd.Timestamp(after))]
+    table = pq.read_table(path, columns=stored, filters=filters, memory_map=True, use_pandas_metadata=True)
+    df = restore(table.to_pandas(), metadata)
+    return add_derived(df, derived)[columns] if columns is not None else df
+
+
+def read_parts(paths, columns=None, after=None):
+    """Rows of several Parquet files (the converted file and its parts) as one frame, like read()"""
+    frames = [read(path, columns, after) for path in paths]
+    return frames[0] if len(frames) == 1 else pd.concat(frames)
+
+
+def fresh_parquet(csv_path, index_column):
+    """Parquet files of a data CSV, converted first if missing or older than the CSV"""
+    paths = parquet_paths(csv_path)
+    if not paths or max(os.path.getmtime(path) for path in paths) < os.path.getmtime(csv_path):
+        paths = [convert(csv_path, index_column)]
+    return paths
+
+
+def load(csv_path, index_column='datetime', columns=None, after=None):
+    """
+    Loads a data file by its CSV path: from the Parquet files next to it, converted first
+    if they are missing or older than the CSV. Falls back to the CSV without pyarrow.
+    after: only rows with a later index (e.g. the rows appended since the last load)
+    """
+    if pq is not None:
+        try:
+            return read_parts(fresh_parquet(csv_path, index_column), columns, after)
+        except OSError:
+            pass  # Read-only data directory: read the CSV
+
+    df = read_csv(csv_path, index_column)
+    if after is not None:
+        df = df[df.index > after]
+    return df if columns is None else df[columns]
+
+
+def last_index(csv_path, index_column='datetime'):
+    """Latest index value of a data file (None without rows), from the Parquet statistics if possible"""
+    if pq is not None:
+        try:
+            paths = fresh_parquet(csv_path, index_column)
+        except OSError:
+            paths = None  # Read-only data directory: read the CSV
+        if paths is not None:
+            # Parts hold later rows than the files before them: the last file with rows has the latest
+            for path in reversed(paths):
+                metadata = pq.ParquetFile(path).metadata
+                if metadata.num_rows == 0:
+                    continue
+                position = metadata.schema.to_arrow_schema().get_field_index(index_column)
+                statistics = [metadata.row_group(group).column(position).statistics
+                              for group in range(metadata.num_row_groups)]
+                if all(group is not None and group.has_min_max for group in statistics):
+                    return pd.Timestamp(max(group.max for group in statistics))
+                return read(path, []).index.max()
+            return None
+
+    index = read_csv(csv_path, index_column).index
+    return index.max() if len(index) else None
+
+
+def version(csv_path):
+    """Changes whenever the data file is written (e.g. rows appended)"""
+    stat = os.stat(csv_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def stored_dtypes(csv_path, index_column='datetime'):
+    """Dtypes of the stored (not derived) columns of a data file, without reading its rows if possible"""
+    if pq is not None:
+        try:
+            schema = pq.read_schema(fresh_parquet(csv_path, index_column)[0])
+            return json.loads(schema.metadata[METADATA_KEY])['dtypes']
+        except OSError:
+            pass
+    df = read_csv(csv_path, index_column)
+    return df.drop(columns=[column for column in DERIVED_COLUMNS if column in df.columns]).dtypes.to_dict()
+
+
+def append(csv_path, rows, index_column='datetime'):
+    """
+    Appends new rows (later than the stored ones) to a data CSV without rewriting it,
+    and to its Parquet files as a new part. Rows get the derived columns, order and dtypes
+    of the stored data. Every MAX_PARTS parts are folded into the converted file.
+    """
+    dtypes = stored_dtypes(csv_path, index_column)
+    first = pd.read_csv(csv_path, nrows=1, index_col=index_column, dtype={index_column: str})
+    csv_columns = list(first.columns)
+    rows = add_derived(rows.copy(), [column for column in csv_columns if column in DERIVED_COLUMNS])
+    rows = rows[csv_columns].astype({column: dtypes[column] for column in csv_columns if column in dtypes})
+    rows.index.name = index_column
+    # The time written like in the stored rows (pandas leaves it out when all rows are at midnight)
+    with_time = len(first) == 0 or len(first.index[0]) > len('YYYY-MM-DD')
+    rows.to_csv(csv_path, mode='a', header=False, date_format='%Y-%m-%d %H:%M:%S' if with_time else '%Y-%m-%d')
+
+    # Parquet after the CSV, so it's not older and isn't converted again
+    if pq is not None:
+        paths = parquet_paths(csv_path)
+        parts = all_parts(csv_path)
+        number = int(parts[-1][-13:-8]) + 1 if parts else 1
+        write(rows[list(dtypes)], part_path(csv_path, number))
+        if len(paths) >= MAX_PARTS:
+            write(read_parts(parquet_paths(csv_path)), paths[0])
+            remove_parts(csv_path)
+
+
+def load_merged(columns=None, csv_path=MERGED_CSV, after=None):
+    """Hourly bikes and weather (merged_data), datetime index"""
+    return load(csv_path, 'datetime', columns, after)
+
+
+def load_weather(columns=None, csv_path=WEATHER_CSV):
+    """Daily weather (weather_data2 by default), date index"""
+    return load(csv_path, 'date', columns)
+
+
+if __name__ == '__main__':
+    # python -m utils.storage (from the project folder) converts the data files up front
+    for csv_path, index_column in [(MERGED_CSV, 'datetime'), (WEATHER_CSV, 'date')]:
+        path = convert(csv_path, index_column)
+        print(f"{csv_path} ({os.path.getsize(csv_path):,} bytes) -> {path} ({os.path.getsize(path):,} bytes)")
@@ -0,0 +1,111 @@
+import copy
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from utils.date_mappings import season_months, time_of_day_ranges
+
+
+def day_ordinal(date):
+    """Days since 1970-01-01 of a date/datetime"""
+    return int(np.datetime64(pd.Timestamp(date).date(), 'D').astype(np.int64))
+
+
+class TimeIndexFilter:
+    """
+    Row selection of the dashboard filters (date range, season, time of day) on a datetime index.
+
+    The calendar of every row is computed once and kept as small integer arrays
+    (day ordinal, month, hour, weekday), extended for appended rows (extended()). A date range is found with searchsorted on
+    the sorted day ordinals, season and time of day are lookups in those arrays,
+    and the selected rows are remembered per filter combination.
+    """
+
+    def __init__(self, index, max_cached=64):
+        self.size = 0
+        self.order = None
+        self.day = np.empty(0, dtype=np.int32)
+        self.month, self.hour, self.weekday = (np.empty(0, dtype=np.int8) for _ in range(3))
+
+        # Lookup tables: is month m in the season, is hour h in the time of day
+        self.season_lookup = {season: np.isin(np.arange(13), months) for season, months in season_months.items()}
+        self.time_of_day_lookup = {name: (np.arange(24) >= start) & (np.arange(24) < end)
+                                   for name, (start, end) in time_of_day_ranges.items()}
+
+        # Shared by all sessions (Streamlit runs them in threads)
+        self.max_cached = max_cached
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.add(index)
+
+    def extended(self, index):
+        """
+        A new filter of these rows followed by the rows of index (e.g. hours appended to the
+        frame): only the calendar of the new rows is computed, the arrays are extended with it.
+        This filter stays as it is for whoever is still using it.
+        """
+        result = copy.copy(self)
+        result.cache = OrderedDict()
+        result.lock = threading.Lock()
+        result.add(index)
+        return result
+
+    def add(self, index):
+        values = pd.DatetimeIndex(index).values
+        day = values.astype('datetime64[D]').astype(np.int32)
+        calendar = pd.DatetimeIndex(values)
+        new = [day, *(field.to_numpy(dtype=np.int8) for field in [calendar.month, calendar.hour, calendar.weekday])]
+        old = [self.day, self.month, self.hour, self.weekday]
+
+        in_order = pd.Index(day).is_monotonic_increasing and (not self.size or not len(day) or day[0] >= self.day[-1])
+        if self.order is None and in_order:
+            self.day, self.month, self.hour, self.weekday = (np.concatenate(arrays) for arrays in zip(old, new))
+        else:
+            # Rows in time order (the index of multi-counter data repeats timestamps per counter):
+            # the new rows sorted, then merged after the old rows of the same day
+            new_order = np.argsort(day, kind='stable')
+            merged = np.argsort(np.concatenate([self.day, day[new_order]]), kind='stable')
+            old_order = np.arange(self.size) if self.order is None else self.order
+            self.order = np.concatenate([old_order, self.size + new_order])[merged]
+            self.day, self.month, self.hour, self.weekday = (np.concatenate([before, after[new_order]])[merged]
+                                                             for before, after in zip(old, new))
+        self.size += len(day)
+
+    def date_range(self, start_date, end_date):
+        """Positions [first, last) of the rows from start_date to end_date (both days included)"""
+        first = int(np.searchsorted(self.day, day_ordinal(start_date), side='left'))
+        last = int(np.searchsorted(self.day, day_ordinal(end_date), side='right'))
+        return first, last
+
+    def rows(self, start_date, end_date, season="All", time_of_day="All"):
+        """Selected rows as a slice or an array of positions, for DataFrame.iloc"""
+        key = (start_date, end_date, season, time_of_day)
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+
+        first, last = self.date_range(start_date, end_date)
+        if season == "All" and time_of_day == "All" and self.order is None:
+            rows = slice(first, last)
+        else:
+            keep = np.ones(last - first, dtype=bool)
+            if season != "All":
+                keep &= self.season_lookup[season][self.month[first:last]]
+            if time_of_day != "All":
+                keep &= self.time_of_day_lookup[time_of_day][self.hour[first:last]]
+            rows = first + np.flatnonzero(keep)
+            if self.order is not None:
+                rows = np.sort(self.order[rows])
+
+        with self.lock:
+            self.cache[key] = rows
+            if len(self.cache) > self.max_cached:
+                self.cache.popitem(last=False)
+        return rows
+
+    def apply(self, df, start_date, end_date, season="All", time_of_day="All"):
+        """Rows of df (the frame whose index this filter was built from) matching the filters"""
+        return df.iloc[self.rows(start_date, end_date, season, time_of_day)]
@@ -1,13 +1,20 @@
 # Based on https://github.com/Chainlit/cookbook/blob/main/anthropic-chat/app.py
 
+import asyncio
+import threading
 from typing import Dict, List
 
 import chainlit as cl
 from chromadb.api.models import Collection
 
+from chatbot.answer_cache import AnswerCache
+from chatbot.config import WARM_UP_MODELS_ON_START
 from chatbot.session import (
-    perform_rag,
+    answer_turn,
+    cancel_answer,
     prepare_user_session,
+    release_user_session,
+    warm_up_models,
 )
 from chatbot.llm import LLM
 from chatbot.reranking import Reranker
@@ -15,6 +22,14 @@ from chatbot.utils.logging_config import configure_logging
 
 Logger = configure_logging()
 
+#* Chainlit imports this module once per server process
+#* Models are loaded in a background thread, so the server can start accepting connections right away
+#* Sessions opened before the warm-up is done simply wait for the same loads to finish
+if WARM_UP_MODELS_ON_START:
+    threading.Thread(
+        target=asyncio.run, args=(warm_up_models(),), name="model-warm-up", daemon=True
+    ).start()
+
 
 @cl.on_chat_start
 async def on_chat_start() -> None:
@@ -32,12 +47,13 @@ async def on_chat_start() -> None:
     #* Sleep 1 s, to output the greeting message before loading is done.
     await cl.sleep(1)
 
-    collection, llm, reranker = await prepare_user_session()
+    collection, llm, reranker, answer_cache = await prepare_user_session()
 
     cl.user_session.set("collection", collection)
     cl.user_session.set("conversation_history", [])
     cl.user_session.set("llm", llm)
     cl.user_session.set("reranker", reranker)
+    cl.user_session.set("answer_cache", answer_cache)
 
     Logger.info("Preparation to chat work completed.")
     await cl.Message(
@@ -45,6 +61,36 @@ async def on_chat_start() -> None:
     ).send()
 
 
+@cl.on_chat_end
+async def on_chat_end() -> None:
+    """Releases the shared resources held by the chat session."""
+
+    if cl.user_session.get("llm") is not None:
+        await release_user_session()
+    Logger.info("Chat ended.")
+
+
+async def cancel_running_answer() -> None:
+    """Cancels the answer still being generated for this chat session, if there is one,
+    and waits until its partial answer is in the conversation history."""
+
+    answer_task: asyncio.Task | None = cl.user_session.get("answer_task")
+    if (
+        answer_task is not None
+        and answer_task is not asyncio.current_task()
+        and not answer_task.done()
+    ):
+        Logger.info("Cancelling the previous answer.")
+        await cancel_answer(answer_task)
+
+
+@cl.on_stop
+async def on_stop() -> None:
+    """Stops the answer generation when the user presses the stop button."""
+
+    await cancel_running_answer()
+
+
 @cl.on_message
 async def on_message(message: cl.Message) -> None:
     """Handles incoming messages from the user.
@@ -53,26 +99,42 @@ async def on_message(message: cl.Message) -> None:
         message (cl.Message): The message received from the user.
     """
 
+    #* A new message replaces the answer that is still being streamed
+    await cancel_running_answer()
+    cl.user_session.set("answer_task", asyncio.current_task())
+
     collection: Collection = cl.user_session.get("collection")
     conversation_history: List[Dict[str, str]] = cl.user_session.get(
         "conversation_history"
     )
     llm: LLM = cl.user_session.get("llm")
     reranker: Reranker = cl.user_session.get("reranker")
+    answer_cache: AnswerCache | None = cl.user_session.get("answer_cache")
 
     query = message.content.strip()
     Logger.info(f"Message received: {query}")
-    user_message = {"role": "user", "content": query}
-    conversation_history.append(user_message)
 
-    # Set extracted details
-    cl.user_session.set("conversation_history", conversation_history)
-
-    #* Perform RAG to generate an answer to the user's query
-    answer, titles = await perform_rag(query, collection, conversation_history, llm, reranker)
-    answer = f"{answer}\n\n\nRetrieved from PDFs:\n{'\n'.join(titles)}"
-    
-    cl.user_session.set("conversation_history", conversation_history)
-    Logger.info(f"User message processing complete:\n{answer}")
-
-    await cl.Message(content=answer).send()
+    #* Perform RAG and stream the answer to the user's query as it is generated
+    #* The question and the answer are added to the conversation history as the turn goes
+    timings: Dict[str, float] = {}
+    answer_message = cl.Message(content="")
+    try:
+        stream, titles = await answer_turn(
+            query,
+            collection,
+            conversation_history,
+            llm,
+            reranker,
+            answer_message.stream_token,
+            timings,
+            answer_cache,
+        )
+    finally:
+        cl.user_session.set("conversation_history", conversation_history)
+
+    await answer_message.stream_token(f"\n\n\nRetrieved from PDFs:\n{'\n'.join(titles)}")
+    await answer_message.send()
+    Logger.info(f"User message processing complete:\n{answer_message.content}")
+    Logger.info(f"Retrieval stage latency: {timings}")
+    Logger.info(f"Answer stream metrics: {stream.metrics.model_dump()}")
+    Logger.info(f"Reranker metrics: {reranker.metrics().model_dump()}")
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Generation throughput of the continuous batching engine against one model.generate() per call.
+
+Usage:
+    python -m benchmarks.generation --model Qwen/Qwen2.5-0.5B-Instruct --concurrency 1 2 4 8
+"""
+import argparse
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from chatbot.llm import LLM
+from chatbot.utils.logging_config import configure_logging
+
+Logger = configure_logging()
+
+PROMPTS = [
+    "How do I connect to a VPN server?",
+    "What is a proxy and when should I use one?",
+    "Why is my internet slower when the VPN is on?",
+    "How can I change my VPN protocol?",
+    "What does a kill switch do?",
+    "How do I set up split tunneling?",
+    "Can I use one account on several devices?",
+    "How do I report a connection problem?",
+]
+
+
+async def run_level(
+    llm: LLM, concurrency: int, max_new_tokens: int
+) -> Dict[str, Any]:
+    """Sends `concurrency` chat requests at once and measures the generated tokens per second.
+
+    Args:
+        llm (LLM): The language model instance.
+        concurrency (int): The number of simultaneous requests.
+        max_new_tokens (int): The max number of tokens per answer.
+
+    Returns:
+        Dict[str, Any]: The benchmark results of this concurrency level.
+    """
+
+    prompts = [PROMPTS[i % len(PROMPTS)] for i in range(concurrency)]
+    start = time.perf_counter()
+    answers = await asyncio.gather(
+        *(llm.chat(prompt, max_new_tokens=max_new_tokens) for prompt in prompts)
+    )
+    elapsed = time.perf_counter() - start
+    tokens = sum(len(llm.tokenizer(answer).input_ids) for answer in answers)
+    return {
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "generated_tokens": tokens,
+        "tokens_per_second": round(tokens / elapsed, 2),
+    }
+
+
+async def main(model: str, concurrency_levels: List[int], max_new_tokens: int, output: Path) -> None:
+    """Runs every concurrency level with and without continuous batching and writes the results to JSON."""
+
+    llm = LLM(model, continuous_batching=True)
+    engine = llm.engine
+    #* Warm-up, so the first measured request does not pay for lazy initialization
+    await llm.chat(PROMPTS[0], max_new_tokens=8)
+
+    results: Dict[str, List[Dict[str, Any]]] = {"sequential": [], "continuous_batching": []}
+    for mode in results:
+        llm.engine = engine if mode == "continuous_batching" else None
+        for concurrency in concurrency_levels:
+            result = await run_level(llm, concurrency, max_new_tokens)
+            Logger.info(f"{mode}: {result}")
+            results[mode].append(result)
+
+    report = {
+        "model": model,
+        "max_new_tokens": max_new_tokens,
+        "results": results,
+        "engine": engine.metrics().model_dump(),
+    }
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    Logger.info(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="Qwen/Qwen2.5-0.5B-Instruct")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    parser.add_argument("--output", type=Path, default=Path("results/benchmark_generation.json"))
+    args = parser.parse_args()
+    asyncio.run(main(args.model, args.concurrency, args.max_new_tokens, args.output))
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""Per-stage latency, throughput and memory of perform_rag() on a fixed corpus and query set.
+
+By default the LLM, cross encoder and embedding model are tiny local stand-ins (see benchmarks.stand_in),
+so the benchmark runs anywhere in a few seconds and the numbers reflect the pipeline rather than the models.
+Pass model names or paths to benchmark real models instead.
+
+Usage:
+    python -m benchmarks.rag --sessions 1 2 4 8 --output results/benchmark_rag.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import chromadb
+import numpy as np
+import torch
+from chromadb.api.models import Collection
+from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+
+from benchmarks.stand_in import (
+    CORPUS,
+    QUERIES,
+    SEED,
+    build_tiny_cross_encoder,
+    build_tiny_llm,
+    build_tiny_sentence_transformer,
+)
+from chatbot.database import chunk_ids, upsert_chunks
+from chatbot.llm import LLM
+from chatbot.registry import ModelRegistry, construct_model
+from chatbot.reranking import Reranker
+from chatbot.session import perform_rag
+from chatbot.utils.logging_config import configure_logging
+
+Logger = configure_logging()
+
+#* Stages reported by perform_rag(), retrieval and expanded_retrieval are the Chroma queries
+STAGES = [
+    "expansion",
+    "retrieval",
+    "expanded_retrieval",
+    "deduplication",
+    "reranking",
+    "retrieve_context",
+    "generation",
+]
+PERCENTILES = [50, 90, 99]
+
+
+def peak_rss_mb() -> float:
+    """Returns the peak resident set size of the process in MB."""
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #* ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """Summarizes latencies in seconds as milliseconds percentiles."""
+
+    if not values:
+        return {}
+    summary = {
+        f"p{percentile}_ms": round(float(np.percentile(values, percentile)) * 1000, 3)
+        for percentile in PERCENTILES
+    }
+    summary["mean_ms"] = round(float(np.mean(values)) * 1000, 3)
+    summary["count"] = len(values)
+    return summary
+
+
+def git_commit() -> str | None:
+    """Returns the current commit hash, so results can be compared between commits."""
+
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def create_registry(llm_path: str, cross_encoder_path: str, embedding_model_path: str, max_new_tokens: int) -> ModelRegistry:
+    """Registers the benchmark's models and an in-memory collection of the fixed corpus."""
+
+    registry = ModelRegistry()
+
+    async def load_embedding_function() -> SentenceTransformerEmbeddingFunction:
+        return await construct_model(
+            SentenceTransformerEmbeddingFunction, model_name=embedding_model_path
+        )
+
+    async def load_collection(embedding_function: SentenceTransformerEmbeddingFunction) -> Collection:
+        client = chromadb.EphemeralClient()
+        collection = client.get_or_create_collection(
+            name=f"benchmark_{time.monotonic_ns()}", embedding_function=embedding_function
+        )
+        for title, chunks in CORPUS.items():
+            await upsert_chunks(
+                collection, chunk_ids(title, chunks), chunks, [{"title": title}] * len(chunks)
+            )
+        return collection
+
+    async def load_llm() -> LLM:
+        return await construct_model(LLM, llm_path, max_new_tokens=max_new_tokens)
+
+    async def load_reranker() -> Reranker:
+        return await construct_model(Reranker, cross_encoder_path)
+
+    registry.register("embedding_function", load_embedding_function)
+    registry.register("collection", load_collection, dependencies=("embedding_function",))
+    registry.register("llm", load_llm)
+    registry.register("reranker", load_reranker)
+    return registry
+
+
+async def run_session(
+    session: int,
+    queries_per_session: int,
+    collection: Collection,
+    llm: LLM,
+    reranker: Reranker,
+    timings: List[Dict[str, float]],
+) -> None:
+    """Asks a session's share of the query set one after another, like a user would."""
+
+    conversation_history: List[Dict[str, str]] = []
+    for index in range(queries_per_session):
+        query = QUERIES[(session + index) % len(QUERIES)]
+        conversation_history.append({"role": "user", "content": query})
+        query_timings: Dict[str, float] = {}
+        start = time.perf_counter()
+        await perform_rag(query, collection, conversation_history, llm, reranker, query_timings)
+        query_timings["total"] = time.perf_counter() - start
+        timings.append(query_timings)
+
+
+async def run_level(
+    sessions: int,
+    queries_per_session: int,
+    collection: Collection,
+    llm: LLM,
+    reranker: Reranker,
+) -> Dict[str, Any]:
+    """Runs concurrent sessions and summarizes their per-stage latencies and throughput.
+
+    Args:
+        sessions (int): The number of concurrent sessions.
+        queries_per_session (int): The number of queries every session asks.
+        collection (Collection): The ChromaDB collection.
+        llm (LLM): The language model instance.
+        reranker (Reranker): The reranker instance.
+
+    Returns:
+        Dict[str, Any]: The benchmark results of this concurrency level.
+    """
+
+    #* Every level starts cold, so levels are comparable whatever ran before them
+    reranker.clear()
+    if llm.engine is not None and llm.engine.prefix_cache is not None:
+        llm.engine.prefix_cache.clear()
+
+    timings: List[Dict[str, float]] = []
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            run_session(session, queries_per_session, collection, llm, reranker, timings)
+            for session in range(sessions)
+        )
+    )
+    elapsed = time.perf_counter() - start
+    return {
+        "sessions": sessions,
+        "queries": len(timings),
+        "seconds": round(elapsed, 3),
+        "queries_per_second": round(len(timings) / elapsed, 3),
+        "latency": {
+            stage: percentiles([query[stage] for query in timings if stage in query])
+            for stage in STAGES + ["total"]
+        },
+    }
+
+
+async def main(args: argparse.Namespace) -> Dict[str, Any]:
+    """Loads the models, runs every concurrency level and writes the report to JSON."""
+
+    torch.manual_seed(SEED)
+    with tempfile.TemporaryDirectory() as directory:
+        stand_ins = Path(directory)
+        llm_path = args.llm or build_tiny_llm(stand_ins / "llm")
+        cross_encoder_path = args.cross_encoder or build_tiny_cross_encoder(stand_ins / "cross_encoder")
+        embedding_model_path = args.embedding_model or build_tiny_sentence_transformer(
+            stand_ins / "embedding_model"
+        )
+
+        registry = create_registry(llm_path, cross_encoder_path, embedding_model_path, args.max_new_tokens)
+        start = time.perf_counter()
+        collection, llm, reranker = await asyncio.gather(
+            registry.acquire("collection"), registry.acquire("llm"), registry.acquire("reranker")
+        )
+        load_seconds = time.perf_counter() - start
+
+    #* Warm-up, so the first measured query does not pay for lazy initialization
+    await perform_rag(QUERIES[0], collection, [], llm, reranker)
+
+    levels = []
+    for sessions in args.sessions:
+        result = await run_level(sessions, args.queries_per_session, collection, llm, reranker)
+        Logger.info(
+            f"{sessions} sessions: {result['queries_per_second']} queries/s,"
+            f" total p50 {result['latency']['total'].get('p50_ms')} ms"
+        )
+        levels.append(result)
+
+    report = {
+        "commit": git_commit(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "device": str(llm.device),
+        "models": {
+            "llm": args.llm or "stand-in",
+            "cross_encoder": args.cross_encoder or "stand-in",
+            "embedding_model": args.embedding_model or "stand-in",
+        },
+        "max_new_tokens": args.max_new_tokens,
+        "queries_per_session": args.queries_per_session,
+        "model_load_seconds": {
+            "total": round(load_seconds, 3),
+            **{name: round(stats.load_seconds, 3) for name, stats in registry.metrics().items()},
+        },
+        "levels": levels,
+        "reranker": reranker.metrics().model_dump(),
+        "llm": llm.metrics(),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(report, indent=2))
+    Logger.info(f"Results written to {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--queries-per-session", type=int, default=len(QUERIES))
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    parser.add_argument("--llm", help="LLM name or path, a tiny stand-in by default")
+    parser.add_argument("--cross-encoder", help="Cross encoder name or path, a tiny stand-in by default")
+    parser.add_argument("--embedding-model", help="Embedding model name or path, a tiny stand-in by default")
+    parser.add_argument("--output", type=Path, default=Path("results/benchmark_rag.json"))
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,175 @@
+"""Tiny, randomly initialized stand-ins for the LLM, cross encoder and embedding model, plus a fixed corpus and query set.
+
+They are built locally in seconds, so benchmarks and tests run without downloads and measure the pipeline
+around the models rather than the models themselves.
+"""
+from pathlib import Path
+from typing import Dict, List
+
+import torch
+from sentence_transformers import SentenceTransformer, models
+from tokenizers import Tokenizer, decoders, pre_tokenizers, processors
+from tokenizers.models import BPE
+from transformers import (
+    BertConfig,
+    BertForSequenceClassification,
+    BertModel,
+    PreTrainedTokenizerFast,
+    Qwen2Config,
+    Qwen2ForCausalLM,
+)
+
+SEED = 0
+
+CHAT_TEMPLATE = (
+    "{% for message in messages %}"
+    "<|im_start|>{{ message['role'] }}\n{{ message['content'] }}<|im_end|>\n"
+    "{% endfor %}"
+    "{% if add_generation_prompt %}<|im_start|>assistant\n{% endif %}"
+)
+
+#* Neighbouring chunks of every article share their boundary sentence, like chunks split with CHUNK_OVERLAP
+CORPUS: Dict[str, List[str]] = {
+    "Admission to the Vatican Apostolic Archive": [
+        "Researchers apply for an admission card with a letter of presentation from their institution.",
+        "Admission cards are valid for one year. Applications are reviewed within ten working days.",
+        "Applications are reviewed within ten working days. Graduate students need a supervisor's letter.",
+    ],
+    "Reading room rules": [
+        "The reading room opens at eight thirty and closes at one in the afternoon.",
+        "Only pencils are allowed. Bags and coats are left in the lockers at the entrance.",
+        "Bags and coats are left in the lockers at the entrance. Researchers may order five items a day.",
+    ],
+    "Papal registers": [
+        "The registers record outgoing papal letters from the thirteenth century onward.",
+        "Registers of the Avignon period are kept in a separate series with their own indexes.",
+        "Digitized registers can be consulted on the reading room terminals.",
+    ],
+    "Reproductions and permissions": [
+        "Digital reproductions are ordered at the reproduction office with the document signature.",
+        "Publishing a reproduction requires written permission from the prefecture.",
+        "Fees depend on the number of images and the intended use of the publication.",
+    ],
+    "Secret Archive history": [
+        "The archive was separated from the Vatican Library in the early seventeenth century.",
+        "It was renamed the Vatican Apostolic Archive in 2019.",
+        "Pontificates are opened to research in full, the most recent being the pontificate of Pius XII.",
+    ],
+}
+
+QUERIES: List[str] = [
+    "How do I get an admission card for the archive?",
+    "When does the reading room open?",
+    "Can I bring a pen into the reading room?",
+    "Where are the registers of the Avignon popes?",
+    "How do I order a digital reproduction?",
+    "Do I need permission to publish an image?",
+    "Why was the Secret Archive renamed?",
+    "Which pontificates are open to researchers?",
+]
+
+
+def build_byte_tokenizer(
+    special_tokens: List[str], pair_template: bool = False, **kwargs
+) -> PreTrainedTokenizerFast:
+    """Builds a byte-level tokenizer without merges: every byte is a token, so any text can be encoded."""
+
+    alphabet = sorted(pre_tokenizers.ByteLevel.alphabet())
+    vocab = {token: index for index, token in enumerate(special_tokens + alphabet)}
+    tokenizer = Tokenizer(BPE(vocab=vocab, merges=[]))
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    tokenizer.add_special_tokens(special_tokens)
+    if pair_template:
+        tokenizer.post_processor = processors.TemplateProcessing(
+            single="[CLS] $A [SEP]",
+            pair="[CLS] $A [SEP] $B:1 [SEP]:1",
+            special_tokens=[("[CLS]", vocab["[CLS]"]), ("[SEP]", vocab["[SEP]"])],
+        )
+    return PreTrainedTokenizerFast(tokenizer_object=tokenizer, **kwargs)
+
+
+def build_tiny_llm(directory: Path) -> str:
+    """Saves a tiny Qwen2 causal LM with a chat template, loadable with LLM(directory)."""
+
+    tokenizer = build_byte_tokenizer(
+        ["<|endoftext|>", "<|im_start|>", "<|im_end|>"],
+        eos_token="<|im_end|>",
+        pad_token="<|endoftext|>",
+        chat_template=CHAT_TEMPLATE,
+        model_input_names=["input_ids", "attention_mask"],
+    )
+    tokenizer.save_pretrained(directory)
+
+    torch.manual_seed(SEED)
+    config = Qwen2Config(
+        vocab_size=len(tokenizer),
+        hidden_size=64,
+        intermediate_size=128,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        num_key_value_heads=2,
+        max_position_embeddings=32768,
+        eos_token_id=tokenizer.eos_token_id,
+        pad_token_id=tokenizer.pad_token_id,
+        tie_word_embeddings=True,
+        #* Wide enough initial weights that the model does not just repeat one token, so expansions yield several lines
+        initializer_range=0.2,
+    )
+    model = Qwen2ForCausalLM(config).eval()
+    model.generation_config.do_sample = False
+    model.generation_config.eos_token_id = tokenizer.eos_token_id
+    model.generation_config.pad_token_id = tokenizer.pad_token_id
+    model.save_pretrained(directory)
+    return str(directory)
+
+
+def _bert_tokenizer() -> PreTrainedTokenizerFast:
+    return build_byte_tokenizer(
+        ["[PAD]", "[UNK]", "[CLS]", "[SEP]"],
+        pair_template=True,
+        pad_token="[PAD]",
+        unk_token="[UNK]",
+        cls_token="[CLS]",
+        sep_token="[SEP]",
+        model_max_length=512,
+    )
+
+
+def _bert_config(vocab_size: int, **kwargs) -> BertConfig:
+    return BertConfig(
+        vocab_size=vocab_size,
+        hidden_size=32,
+        intermediate_size=64,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        max_position_embeddings=512,
+        **kwargs,
+    )
+
+
+def build_tiny_cross_encoder(directory: Path) -> str:
+    """Saves a tiny BERT cross encoder, loadable with Reranker(directory)."""
+
+    tokenizer = _bert_tokenizer()
+    tokenizer.save_pretrained(directory)
+    torch.manual_seed(SEED)
+    BertForSequenceClassification(
+        _bert_config(len(tokenizer), num_labels=1)
+    ).eval().save_pretrained(directory)
+    return str(directory)
+
+
+def build_tiny_sentence_transformer(directory: Path) -> str:
+    """Saves a tiny mean-pooling BERT sentence transformer, loadable with SentenceTransformer(directory)."""
+
+    transformer_directory = directory / "transformer"
+    tokenizer = _bert_tokenizer()
+    tokenizer.save_pretrained(transformer_directory)
+    torch.manual_seed(SEED)
+    BertModel(_bert_config(len(tokenizer))).eval().save_pretrained(transformer_directory)
+
+    transformer = models.Transformer(str(transformer_directory), max_seq_length=256)
+    pooling = models.Pooling(transformer.get_word_embedding_dimension(), pooling_mode="mean")
+    SentenceTransformer(modules=[transformer, pooling], device="cpu").save(str(directory))
+    return str(directory)
@@ -0,0 +1,222 @@
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from chatbot.config import (
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_PATH,
+    ANSWER_CACHE_SIMILARITY_THRESHOLD,
+    ANSWER_CACHE_TTL_SECONDS,
+    COLLECTION_VERSION_PATH,
+)
+from chatbot.utils.collection_version import read_collection_version
+from chatbot.utils.data_models import AnswerCacheStats, CachedAnswer
+from chatbot.utils.logging_config import configure_logging
+
+Logger = configure_logging()
+
+EmbeddingFunction = Callable[[List[str]], Sequence[Sequence[float]]]
+
+
+class AnswerCache:
+    """Semantic cache of RAG answers, keyed by the embedding of the query.
+
+    A query whose embedding is close enough to the one of a cached query gets the cached
+    answer and titles, without retrieval, reranking or generation.
+    """
+
+    def __init__(
+        self,
+        embedding_function: EmbeddingFunction,
+        path: str | Path | None = ANSWER_CACHE_PATH,
+        version_path: str | Path = COLLECTION_VERSION_PATH,
+        similarity_threshold: float = ANSWER_CACHE_SIMILARITY_THRESHOLD,
+        ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+    ):
+        """Initializes an AnswerCache instance, loading the entries persisted by a previous run.
+
+        Args:
+            embedding_function (EmbeddingFunction): Embeds a list of texts, e.g. the Chroma collection's embedding function.
+            path (str | Path | None, optional): The JSON file the cache is persisted to. None keeps it in memory only.
+            version_path (str | Path, optional): The collection version file. The cache is cleared when it changes.
+            similarity_threshold (float, optional): Min cosine similarity between queries for a hit.
+            ttl_seconds (float, optional): Age after which an entry is not served anymore.
+            max_entries (int, optional): Max number of entries, the least recently used are evicted above it.
+        """
+
+        self.embedding_function = embedding_function
+        self.path = Path(path) if path else None
+        self.version_path = version_path
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.stats = AnswerCacheStats()
+
+        self._entries: OrderedDict[str, CachedAnswer] = OrderedDict()
+        self._matrix: np.ndarray | None = None
+        self._keys: List[str] = []
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._version = read_collection_version(self.version_path)
+        self._load()
+
+    def _load(self) -> None:
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text())
+        except (OSError, ValueError) as e:
+            Logger.warning(f"Ignoring unreadable answer cache {self.path}: {e}")
+            return
+        if data.get("collection_version") != self._version:
+            Logger.info("Answer cache was built for another collection version, starting empty.")
+            return
+        for entry in data.get("entries", []):
+            cached = CachedAnswer(**entry)
+            self._entries[cached.query] = cached
+        self.stats.entries = len(self._entries)
+        Logger.info(f"Loaded {len(self._entries)} cached answers from {self.path}.")
+
+    async def embed(self, query: str) -> np.ndarray:
+        """Embeds the query in a worker thread and normalizes the embedding.
+
+        Args:
+            query (str): The user's query.
+
+        Returns:
+            np.ndarray: The unit-length query embedding.
+        """
+
+        embedding = await asyncio.to_thread(self.embedding_function, [query])
+        return _normalize(np.asarray(embedding[0], dtype=np.float32))
+
+    def _check_version(self) -> None:
+        version = read_collection_version(self.version_path)
+        if version != self._version:
+            Logger.info("Collection was repopulated, clearing the answer cache.")
+            self._entries.clear()
+            self._matrix = None
+            self._version = version
+            self.stats.invalidations += 1
+            self.stats.entries = 0
+
+    def _similarities(self, embedding: np.ndarray) -> np.ndarray:
+        if self._matrix is None:
+            self._keys = list(self._entries)
+            self._matrix = np.stack(
+                [
+                    np.asarray(self._entries[key].embedding, dtype=np.float32)
+                    for key in self._keys
+                ]
+            )
+        return self._matrix @ embedding
+
+    def lookup(self, embedding: np.ndarray) -> Tuple[str, List[str]] | None:
+        """Returns the answer of the most similar cached query, if it is similar enough and not expired.
+
+        Args:
+            embedding (np.ndarray): The unit-length query embedding, see embed().
+
+        Returns:
+            Tuple[str, List[str]] | None: The cached answer and titles, or None on a miss.
+        """
+
+        with self._lock:
+            self._check_version()
+            if not self._entries:
+                self.stats.misses += 1
+                return None
+
+            similarities = self._similarities(embedding)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                self.stats.misses += 1
+                return None
+
+            key = self._keys[best]
+            entry = self._entries[key]
+            now = time.time()
+            if now - entry.created_at > self.ttl_seconds:
+                self._remove(key)
+                self.stats.expired += 1
+                self.stats.misses += 1
+                return None
+
+            entry.last_used = now
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            Logger.info(
+                f"Answer cache hit (similarity {similarities[best]:.3f}) for cached query: {entry.query}"
+            )
+            return entry.answer, list(entry.titles)
+
+    async def store(
+        self, query: str, embedding: np.ndarray, answer: str, titles: List[str]
+    ) -> None:
+        """Caches an answer and persists the cache to disk in a worker thread.
+
+        Args:
+            query (str): The user's query.
+            embedding (np.ndarray): The unit-length query embedding, see embed().
+            answer (str): The generated answer.
+            titles (List[str]): The titles of the retrieved articles.
+        """
+
+        now = time.time()
+        with self._lock:
+            self._check_version()
+            if query in self._entries:
+                self._remove(query)
+            self._entries[query] = CachedAnswer(
+                query=query,
+                embedding=embedding.tolist(),
+                answer=answer,
+                titles=titles,
+                created_at=now,
+                last_used=now,
+            )
+            self._matrix = None
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+            self.stats.entries = len(self._entries)
+        await asyncio.to_thread(self.save)
+
+    def _remove(self, key: str) -> None:
+        del self._entries[key]
+        self._matrix = None
+        self.stats.entries = len(self._entries)
+
+    def save(self) -> None:
+        """Writes the cache to disk atomically."""
+
+        if self.path is None:
+            return
+        with self._lock:
+            data: Dict[str, object] = {
+                "collection_version": self._version,
+                "entries": [entry.model_dump() for entry in self._entries.values()],
+            }
+        with self._save_lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temporary_path = self.path.with_suffix(".tmp")
+            temporary_path.write_text(json.dumps(data))
+            temporary_path.replace(self.path)
+
+    def metrics(self) -> AnswerCacheStats:
+        """Returns a snapshot of the cache metrics."""
+
+        with self._lock:
+            return self.stats.model_copy()
+
+
+def _normalize(vector: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
@@ -0,0 +1,543 @@
+import asyncio
+import queue
+import threading
+import time
+from typing import Any, AsyncIterator, Iterable, List, Sequence, Tuple
+
+import torch
+from transformers import (
+    DynamicCache,
+    PreTrainedModel,
+    TemperatureLogitsWarper,
+    TopKLogitsWarper,
+    TopPLogitsWarper,
+)
+
+from chatbot.config import (
+    GENERATION_MAX_BATCH_SIZE,
+    GENERATION_MAX_QUEUE_SIZE,
+    GENERATION_MAX_WAIT_MS,
+    GENERATION_QUEUE_TIMEOUT,
+)
+from chatbot.prefix_cache import (
+    PrefixCache,
+    prefix_boundaries,
+    slice_sequence_cache,
+)
+from chatbot.utils.data_models import GenerationStats
+from chatbot.utils.logging_config import configure_logging
+
+Logger = configure_logging()
+
+LegacyCache = Tuple[Tuple[torch.Tensor, torch.Tensor], ...]
+
+#* Waiting for a free queue slot polls with a growing interval between these bounds
+SLOT_POLL_MIN_SECONDS = 0.001
+SLOT_POLL_MAX_SECONDS = 0.05
+
+
+class EngineOverloadedError(RuntimeError):
+    """Raised when a generation request waits too long for a free slot in the engine queue."""
+
+
+class GenerationRequest:
+    """A single sequence handled by the batching engine."""
+
+    def __init__(
+        self,
+        input_ids: List[int],
+        max_new_tokens: int,
+        loop: asyncio.AbstractEventLoop,
+        cache_boundaries: Sequence[int] = (),
+    ):
+        self.input_ids = input_ids
+        self.max_new_tokens = max_new_tokens
+        self.cache_boundaries = list(cache_boundaries)
+        self.generated_ids: List[int] = []
+        self.loop = loop
+        #* Generated token ids, then None when finished (or the exception when failed)
+        self.tokens: asyncio.Queue[int | BaseException | None] = asyncio.Queue()
+        self.cancelled = False
+        self.submitted_at = time.perf_counter()
+
+    def emit(self, token_id: int) -> None:
+        """Hands a generated token over to the event loop of the caller."""
+
+        self.loop.call_soon_threadsafe(self.tokens.put_nowait, token_id)
+
+    def resolve(self, error: BaseException | None = None) -> None:
+        """Signals the end of the generation (or the error) to the event loop of the caller."""
+
+        self.loop.call_soon_threadsafe(self.tokens.put_nowait, error)
+
+
+class BatchingEngine:
+    """Continuous batching scheduler around a causal language model.
+
+    Requests are collected from any number of coroutines and decoded together in one padded batch.
+    New sequences are prefilled and merged into the running batch, and finished ones are removed
+    from it, between two decode steps, so a long answer never blocks a short one.
+    The model runs in a dedicated worker thread, off the event loop.
+    """
+
+    def __init__(
+        self,
+        model: PreTrainedModel,
+        pad_token_id: int,
+        eos_token_ids: Iterable[int],
+        max_batch_size: int | None = None,
+        max_wait_ms: float | None = None,
+        max_queue_size: int | None = None,
+        queue_timeout: float | None = GENERATION_QUEUE_TIMEOUT,
+        prefix_cache: PrefixCache | None = None,
+    ):
+        """Initializes a BatchingEngine instance.
+
+        Args:
+            model (PreTrainedModel): The causal language model.
+            pad_token_id (int): The token id used to left-pad prompts.
+            eos_token_ids (Iterable[int]): Token ids that finish a sequence.
+            max_batch_size (int | None, optional): Max sequences decoded together. Defaults to GENERATION_MAX_BATCH_SIZE.
+            max_wait_ms (float | None, optional): Max time to wait for more requests before starting an idle batch.
+                Defaults to GENERATION_MAX_WAIT_MS.
+            max_queue_size (int | None, optional): Max requests accepted at once. Defaults to GENERATION_MAX_QUEUE_SIZE.
+            queue_timeout (float | None, optional): Seconds to wait for a free slot before raising
+                EngineOverloadedError. Defaults to GENERATION_QUEUE_TIMEOUT.
+            prefix_cache (PrefixCache | None, optional): Cache of prompt prefix key-values, so only the tokens
+                after the longest cached prefix are prefilled. Defaults to None (no reuse).
+        """
+
+        self.model = model
+        self.pad_token_id = pad_token_id
+        self.eos_token_ids = set(eos_token_ids)
+        self.max_batch_size = max_batch_size or GENERATION_MAX_BATCH_SIZE
+        self.max_wait = (
+            max_wait_ms if max_wait_ms is not None else GENERATION_MAX_WAIT_MS
+        ) / 1000
+        self.queue_timeout = queue_timeout
+        self.prefix_cache = prefix_cache
+        self.stats = GenerationStats()
+
+        self._slots = threading.Semaphore(max_queue_size or GENERATION_MAX_QUEUE_SIZE)
+        self._pending: queue.Queue[GenerationRequest] = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._thread_lock = threading.Lock()
+        self._configure_sampling()
+
+    def _configure_sampling(self) -> None:
+        config = self.model.generation_config
+        self.do_sample = bool(config.do_sample)
+        self.repetition_penalty = config.repetition_penalty or 1.0
+        self.warpers = []
+        if self.do_sample:
+            if config.temperature and config.temperature != 1.0:
+                self.warpers.append(TemperatureLogitsWarper(config.temperature))
+            if config.top_k:
+                self.warpers.append(TopKLogitsWarper(config.top_k))
+            if config.top_p is not None and config.top_p < 1.0:
+                self.warpers.append(TopPLogitsWarper(config.top_p))
+
+    async def generate(
+        self,
+        input_ids: List[int],
+        max_new_tokens: int,
+        cache_boundaries: Sequence[int] = (),
+    ) -> List[int]:
+        """Generates a completion for a single prompt, sharing decode steps with concurrent callers.
+
+        Args:
+            input_ids (List[int]): The token ids of the prompt.
+            max_new_tokens (int): The max number of tokens to generate.
+            cache_boundaries (Sequence[int], optional): Prompt prefix lengths whose key-values are worth
+                keeping in the prefix cache (e.g. the end of the system prompt). Defaults to ().
+
+        Returns:
+            List[int]: The generated token ids, without the prompt.
+
+        Raises:
+            EngineOverloadedError: If no slot is freed within the queue timeout.
+        """
+
+        return [
+            token_id
+            async for token_id in self.stream(input_ids, max_new_tokens, cache_boundaries)
+        ]
+
+    async def stream(
+        self,
+        input_ids: List[int],
+        max_new_tokens: int,
+        cache_boundaries: Sequence[int] = (),
+    ) -> AsyncIterator[int]:
+        """Yields the generated token ids of a single prompt as soon as they are decoded.
+
+        Closing the iterator (or cancelling the consuming task) removes the sequence from the batch.
+
+        Args:
+            input_ids (List[int]): The token ids of the prompt.
+            max_new_tokens (int): The max number of tokens to generate.
+            cache_boundaries (Sequence[int], optional): Prompt prefix lengths worth keeping in the prefix cache.
+                Defaults to ().
+
+        Yields:
+            int: The generated token ids, without the prompt and the end of sequence token.
+
+        Raises:
+            EngineOverloadedError: If no slot is freed within the queue timeout.
+        """
+
+        if not await self._acquire_slot():
+            self.stats.rejected += 1
+            raise EngineOverloadedError(
+                f"No free generation slot after {self.queue_timeout} s."
+            )
+
+        request: GenerationRequest | None = None
+        try:
+            request = GenerationRequest(
+                input_ids, max_new_tokens, asyncio.get_running_loop(), cache_boundaries
+            )
+            self.stats.requests += 1
+            self._ensure_started()
+            self._pending.put(request)
+            while True:
+                token_id = await request.tokens.get()
+                if token_id is None:
+                    return
+                if isinstance(token_id, BaseException):
+                    raise token_id
+                yield token_id
+        finally:
+            if request is not None:
+                request.cancelled = True
+            self.stats.active_requests -= 1
+            self._slots.release()
+
+    async def _acquire_slot(self) -> bool:
+        """Waits for a free slot in the engine queue, polling on the event loop.
+
+        A caller cancelled while waiting never holds a slot, and no thread is blocked on the semaphore.
+
+        Returns:
+            bool: True if a slot was taken, False if none was freed within the queue timeout.
+        """
+
+        deadline = (
+            time.monotonic() + self.queue_timeout
+            if self.queue_timeout is not None
+            else None
+        )
+        delay = SLOT_POLL_MIN_SECONDS
+        while not self._slots.acquire(blocking=False):
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                delay = min(delay, remaining)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, SLOT_POLL_MAX_SECONDS)
+        self.stats.active_requests += 1
+        return True
+
+    def _ensure_started(self) -> None:
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="generation-engine", daemon=True
+                )
+                self._thread.start()
+
+    def _collect_new_requests(self, num_active: int) -> List[GenerationRequest]:
+        free = self.max_batch_size - num_active
+        new: List[GenerationRequest] = []
+        if num_active == 0:
+            #* Idle engine, block for the first request and then wait briefly for company
+            new.append(self._pending.get())
+            deadline = time.monotonic() + self.max_wait
+            while len(new) < free:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    new.append(self._pending.get(timeout=timeout))
+                except queue.Empty:
+                    break
+        else:
+            while len(new) < free:
+                try:
+                    new.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+
+        now = time.perf_counter()
+        for request in new:
+            self.stats.queue_wait_seconds += now - request.submitted_at
+        return [request for request in new if not request.cancelled]
+
+    def _run(self) -> None:
+        active: List[GenerationRequest] = []
+        attention_mask: torch.Tensor | None = None
+        cache: LegacyCache | None = None
+
+        while True:
+            new = self._collect_new_requests(len(active))
+            start = time.perf_counter()
+            try:
+                with torch.inference_mode():
+                    if active:
+                        attention_mask, cache = self._decode_step(
+                            active, attention_mask, cache
+                        )
+                    if new:
+                        new, new_mask, new_cache = self._prefill(new)
+                        if active:
+                            attention_mask, cache = _merge(
+                                attention_mask, cache, new_mask, new_cache
+                            )
+                        else:
+                            attention_mask, cache = new_mask, new_cache
+                        active = active + new
+                    active, attention_mask, cache = self._drop_finished(
+                        active, attention_mask, cache
+                    )
+            except Exception as e:
+                Logger.error(f"Error during batched text generation: {e}")
+                failed = {id(request): request for request in active + new}
+                for request in failed.values():
+                    self.stats.failed += 1
+                    request.resolve(e)
+                active, attention_mask, cache = [], None, None
+            self.stats.busy_seconds += time.perf_counter() - start
+
+    def _prefill(
+        self, requests: List[GenerationRequest]
+    ) -> Tuple[List[GenerationRequest], torch.Tensor, LegacyCache]:
+        """Prefills new sequences, reusing cached prompt prefixes, and returns them as one padded batch."""
+
+        misses: List[GenerationRequest] = []
+        parts: List[Tuple[List[GenerationRequest], torch.Tensor, LegacyCache]] = []
+        for request in requests:
+            cached_length, prefix = (
+                self.prefix_cache.lookup(request.input_ids)
+                if self.prefix_cache is not None
+                else (0, None)
+            )
+            if prefix is None:
+                misses.append(request)
+            else:
+                #* Cached prefixes differ per sequence, so hits are prefilled one by one
+                parts.append(self._prefill_batch([request], cached_length, prefix))
+        if misses:
+            parts.append(self._prefill_batch(misses))
+
+        prefilled, attention_mask, cache = parts[0]
+        for part_requests, part_mask, part_cache in parts[1:]:
+            attention_mask, cache = _merge(attention_mask, cache, part_mask, part_cache)
+            prefilled = prefilled + part_requests
+        return prefilled, attention_mask, cache
+
+    def _prefill_batch(
+        self,
+        requests: List[GenerationRequest],
+        cached_length: int = 0,
+        prefix: LegacyCache | None = None,
+    ) -> Tuple[List[GenerationRequest], torch.Tensor, LegacyCache]:
+        start = time.perf_counter()
+        suffixes = [request.input_ids[cached_length:] for request in requests]
+        length = max(len(suffix) for suffix in suffixes)
+        input_ids = torch.full(
+            (len(requests), length), self.pad_token_id, dtype=torch.long
+        )
+        attention_mask = torch.zeros((len(requests), length), dtype=torch.long)
+        for row, suffix in enumerate(suffixes):
+            input_ids[row, length - len(suffix) :] = torch.tensor(suffix)
+            attention_mask[row, length - len(suffix) :] = 1
+        if prefix is not None:
+            attention_mask = torch.cat(
+                [torch.ones((len(requests), cached_length), dtype=torch.long), attention_mask],
+                dim=1,
+            )
+        input_ids = input_ids.to(self.model.device)
+        attention_mask = attention_mask.to(self.model.device)
+
+        outputs = self.model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            position_ids=_position_ids(attention_mask)[:, -length:],
+            past_key_values=(
+                DynamicCache.from_legacy_cache(prefix)
+                if prefix is not None
+                else DynamicCache()
+            ),
+            use_cache=True,
+        )
+        self._sample(requests, outputs.logits[:, -1, :])
+        cache = _to_legacy(outputs.past_key_values)
+
+        if self.prefix_cache is not None:
+            self.prefix_cache.record_prefill(
+                sum(len(suffix) for suffix in suffixes), time.perf_counter() - start
+            )
+            total_length = attention_mask.shape[1]
+            for row, request in enumerate(requests):
+                offset = total_length - len(request.input_ids)
+                for boundary in prefix_boundaries(
+                    request.cache_boundaries, cached_length, len(request.input_ids)
+                ):
+                    prefix_ids = request.input_ids[:boundary]
+                    if not self.prefix_cache.contains(prefix_ids):
+                        self.prefix_cache.insert(
+                            prefix_ids,
+                            slice_sequence_cache(cache, row, offset, offset + boundary),
+                        )
+        return requests, attention_mask, cache
+
+    def _decode_step(
+        self,
+        requests: List[GenerationRequest],
+        attention_mask: torch.Tensor,
+        cache: LegacyCache,
+    ) -> Tuple[torch.Tensor, LegacyCache]:
+        input_ids = torch.tensor(
+            [[request.generated_ids[-1]] for request in requests],
+            dtype=torch.long,
+            device=self.model.device,
+        )
+        attention_mask = torch.cat(
+            [attention_mask, attention_mask.new_ones((len(requests), 1))], dim=1
+        )
+        outputs = self.model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            position_ids=_position_ids(attention_mask)[:, -1:],
+            past_key_values=DynamicCache.from_legacy_cache(cache),
+            use_cache=True,
+        )
+        self.stats.decode_steps += 1
+        self.stats.batched_sequences += len(requests)
+        self._sample(requests, outputs.logits[:, -1, :])
+        return attention_mask, _to_legacy(outputs.past_key_values)
+
+    def _sample(
+        self, requests: List[GenerationRequest], logits: torch.Tensor
+    ) -> None:
+        scores = logits.float()
+        if self.repetition_penalty != 1.0:
+            for row, request in enumerate(requests):
+                seen = torch.tensor(
+                    request.input_ids + request.generated_ids, device=scores.device
+                ).unique()
+                score = scores[row].gather(0, seen)
+                score = torch.where(
+                    score < 0,
+                    score * self.repetition_penalty,
+                    score / self.repetition_penalty,
+                )
+                scores[row].scatter_(0, seen, score)
+
+        if self.do_sample:
+            for warper in self.warpers:
+                scores = warper(None, scores)
+            next_tokens = torch.multinomial(scores.softmax(dim=-1), num_samples=1)
+        else:
+            next_tokens = scores.argmax(dim=-1, keepdim=True)
+
+        for request, token in zip(requests, next_tokens[:, 0].tolist()):
+            request.generated_ids.append(token)
+        self.stats.generated_tokens += len(requests)
+
+    def _drop_finished(
+        self,
+        requests: List[GenerationRequest],
+        attention_mask: torch.Tensor,
+        cache: LegacyCache,
+    ) -> Tuple[List[GenerationRequest], torch.Tensor | None, LegacyCache | None]:
+        keep: List[int] = []
+        for row, request in enumerate(requests):
+            token_id = request.generated_ids[-1]
+            reached_eos = token_id in self.eos_token_ids
+            if reached_eos:
+                request.generated_ids.pop()
+            elif not request.cancelled:
+                request.emit(token_id)
+            finished = (
+                request.cancelled
+                or reached_eos
+                or len(request.generated_ids) >= request.max_new_tokens
+            )
+            if not finished:
+                keep.append(row)
+                continue
+            if not request.cancelled:
+                self.stats.completed += 1
+            request.resolve()
+
+        if not keep:
+            return [], None, None
+        if len(keep) == len(requests):
+            return requests, attention_mask, cache
+
+        index = torch.tensor(keep, device=attention_mask.device)
+        attention_mask = attention_mask.index_select(0, index)
+        cache = tuple(
+            (key.index_select(0, index), value.index_select(0, index))
+            for key, value in cache
+        )
+        #* Drop the left padding columns no remaining sequence needs anymore
+        first_used = int(attention_mask.any(dim=0).nonzero()[0])
+        if first_used:
+            attention_mask = attention_mask[:, first_used:]
+            cache = tuple(
+                (key[:, :, first_used:], value[:, :, first_used:])
+                for key, value in cache
+            )
+        return [requests[row] for row in keep], attention_mask, cache
+
+    def metrics(self) -> GenerationStats:
+        """Returns a snapshot of the engine throughput metrics."""
+
+        return self.stats.model_copy()
+
+
+def _position_ids(attention_mask: torch.Tensor) -> torch.Tensor:
+    return (attention_mask.cumsum(dim=-1) - 1).clamp(min=0)
+
+
+def _to_legacy(cache: Any) -> LegacyCache:
+    return cache.to_legacy_cache() if hasattr(cache, "to_legacy_cache") else cache
+
+
+def _left_pad(tensor: torch.Tensor, length: int, dim: int) -> torch.Tensor:
+    missing = length - tensor.shape[dim]
+    if missing == 0:
+        return tensor
+    shape = list(tensor.shape)
+    shape[dim] = missing
+    return torch.cat([tensor.new_zeros(shape), tensor], dim=dim)
+
+
+def _merge(
+    attention_mask: torch.Tensor,
+    cache: LegacyCache,
+    new_attention_mask: torch.Tensor,
+    new_cache: LegacyCache,
+) -> Tuple[torch.Tensor, LegacyCache]:
+    """Merges the prefilled new sequences into the running batch, left-padding the shorter side."""
+
+    length = max(attention_mask.shape[1], new_attention_mask.shape[1])
+    attention_mask = torch.cat(
+        [
+            _left_pad(attention_mask, length, dim=1),
+            _left_pad(new_attention_mask, length, dim=1),
+        ]
+    )
+    cache = tuple(
+        (
+            torch.cat([_left_pad(key, length, dim=2), _left_pad(new_key, length, dim=2)]),
+            torch.cat(
+                [_left_pad(value, length, dim=2), _left_pad(new_value, length, dim=2)]
+            ),
+        )
+        for (key, value), (new_key, new_value) in zip(cache, new_cache)
+    )
+    return attention_mask, cache
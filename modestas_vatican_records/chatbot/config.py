@@ -41,10 +41,38 @@ HF_LLM_MODEL_ID = "Qwen/Qwen2.5-3B-Instruct"
 #* which would be required with token-based transformers
 CHROMA_DB_PERSIST_DIR = "./chroma_db"
 COLLECTION_NAME = "help_center_articles"
+#* Written next to the database whenever the collection is (re)populated, so caches of its answers can notice
+COLLECTION_VERSION_PATH = f"{CHROMA_DB_PERSIST_DIR}/{COLLECTION_NAME}.version"
+
+#* Help center questions repeat a lot, answers to questions that embed close enough to an earlier one are reused
+#* Similarity is the cosine similarity of the query embeddings, entries expire after the TTL
+#* The cache is stored next to the Chroma database and dropped whenever the collection is repopulated
+ANSWER_CACHE_ENABLED = True
+ANSWER_CACHE_PATH = f"{CHROMA_DB_PERSIST_DIR}/answer_cache.json"
+ANSWER_CACHE_SIMILARITY_THRESHOLD = 0.95
+ANSWER_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+ANSWER_CACHE_MAX_ENTRIES = 1000
 
 #* I think, 5 retrieved documents for this RAG task should be sufficient enough
 NUM_RETRIEVE_DOCUMENTS = 5
 
+#* The cross encoder scores (query, chunk) pairs in batches of RERANK_BATCH_SIZE
+#* Scores are cached by query and chunk content hash, so repeated questions and chunks found again are not rescored
+#* Backends: "torch" on RERANK_DEVICE (None picks mps, cuda or cpu), "quantized" (int8 dynamic quantization, CPU)
+#* and "onnx" (ONNX Runtime on CPU, needs optimum[onnxruntime]), the latter two are meant for GPU-less nodes
+#* Chunks scoring below RERANK_SCORE_THRESHOLD (sigmoid of the ms-marco logit, 0 to 1) are dropped from the prompt,
+#* but at least one chunk is always kept. None keeps all of the top NUM_RETRIEVE_DOCUMENTS
+RERANK_BACKEND = "torch"
+RERANK_DEVICE: str | None = None
+RERANK_BATCH_SIZE = 32
+RERANK_CACHE_MAX_ENTRIES = 10000
+RERANK_SCORE_THRESHOLD: float | None = None
+
+#* Retrieval for the original query starts right away, while the LLM generates the expanded questions
+#* If the closest first-pass chunk is already this close to the query (Chroma L2 distance, lower is closer)
+#* the expansion is cancelled and its LLM call is saved. None always waits for the expansion
+EXPANSION_SKIP_MAX_DISTANCE: float | None = None
+
 #* I use newline character's and end of sentence character as separators for text chunks
 #* To try to maintain the semantic consistency of the retrieved documents
 #* The newline character is still used as a primary option to split chunk paragraph-wise
@@ -63,6 +91,22 @@ CHUNK_OVERLAP = 100
 #* 1024 tokens to generate should be sufficient for Qwen and this task
 MAX_NEW_TOKENS = 1024
 
+#* Concurrent chat(), rag() and expand_querry_question() calls share the model through a continuous batching engine
+#* New sequences join the running batch and finished ones leave it at every decode step
+#* A batch is started after waiting at most GENERATION_MAX_WAIT_MS for more requests to arrive
+#* At most GENERATION_MAX_QUEUE_SIZE requests are accepted at once, further callers wait for a free slot
+#* and fail after GENERATION_QUEUE_TIMEOUT seconds (None = wait forever)
+LLM_CONTINUOUS_BATCHING = True
+GENERATION_MAX_BATCH_SIZE = 8
+GENERATION_MAX_WAIT_MS = 10
+GENERATION_MAX_QUEUE_SIZE = 64
+GENERATION_QUEUE_TIMEOUT: float | None = 120.0
+
+#* Past key-values of the system prompts and of every session's already processed conversation history
+#* are kept in an LRU cache, keyed by the hash of their token prefix, so only new tokens are prefilled
+PREFIX_CACHE_ENABLED = True
+PREFIX_CACHE_MAX_MB = 1024
+
 #* To not exceed the already high Qwen context window (128K tokens)
 #* I have added a limit to conversation history (1000 messages)
 #* If a message on average could have 50-100 tokens
@@ -72,6 +116,16 @@ MAX_NEW_TOKENS = 1024
 #* As the latency of the system becomes pretty annoying after 5 messages...
 CONVERSATION_HISTORY_LIMIT = 1000
 
+#* The history limit above bounds the number of messages, the RAG prompt is also bounded in tokens
+#* Retrieved documents get up to CONTEXT_DOCUMENTS_TOKEN_BUDGET tokens, best reranked first, text overlapping
+#* a better ranked chunk (neighbouring chunks share CHUNK_OVERLAP) of at least CONTEXT_MIN_OVERLAP_CHARS is stripped
+#* The history gets the rest of CONTEXT_TOKEN_BUDGET, oldest messages are dropped once it is exceeded
+#* It is trimmed to CONTEXT_HISTORY_TRIM_RATIO of its budget, so the kept history stays cached for the next turns
+CONTEXT_TOKEN_BUDGET = 6144
+CONTEXT_DOCUMENTS_TOKEN_BUDGET = 2048
+CONTEXT_HISTORY_TRIM_RATIO = 0.75
+CONTEXT_MIN_OVERLAP_CHARS = 20
+
 #* Some system prompts for Qwen to operate on. RAG task has a dedicated separate, task-based system prompt
 GENERAL_SYSTEM_PROMPT = "You are a helpful assistant."
 RAG_SYSTEM_PROMPT = """You are a helpful expert help center assistant.
@@ -88,6 +142,23 @@ Provide an example answer to the given question, that might be found in a networ
 
 #* The path to the JSON file containing the help center articles
 DATA_ARTICLES_PATH = "chatbot/data/"
+
+#* The collection is kept in sync with DATA_ARTICLES_PATH incrementally
+#* The manifest maps every ingested PDF to its content hash and chunk IDs, so only new or changed PDFs
+#* are parsed and embedded and chunks of removed PDFs are deleted
+#* PDFs are parsed in a process pool (None = one worker per CPU core, at most INGESTION_MAX_DEFAULT_WORKERS),
+#* chunked in the main process and chunks are embedded and upserted in batches of INGESTION_BATCH_SIZE
+INGESTION_MANIFEST_PATH = f"{CHROMA_DB_PERSIST_DIR}/ingestion_manifest.json"
+INGESTION_WORKERS: int | None = None
+INGESTION_MAX_DEFAULT_WORKERS = 4
+INGESTION_BATCH_SIZE = 128
 ASSESSMENT_RESULTS_PATH = "results/assessment_result.txt"
 
-HF_CACHE_DIR = ".hf_cache"
\ No newline at end of file
+HF_CACHE_DIR = ".hf_cache"
+
+#* Models and clients are loaded once per process and shared between all chat sessions
+#* The memory budget is checked after every load, resources that no session uses are evicted first
+#* None disables the budget (everything stays loaded once warmed up)
+MODEL_REGISTRY_MEMORY_BUDGET_MB: int | None = None
+#* Load all models at server start, so the first user does not pay for it
+WARM_UP_MODELS_ON_START = True
\ No newline at end of file
@@ -0,0 +1,220 @@
+from typing import Dict, List, Tuple
+
+from transformers import PreTrainedTokenizerBase
+
+from chatbot.config import (
+    CONTEXT_DOCUMENTS_TOKEN_BUDGET,
+    CONTEXT_HISTORY_TRIM_RATIO,
+    CONTEXT_MIN_OVERLAP_CHARS,
+    CONTEXT_TOKEN_BUDGET,
+)
+from chatbot.utils.data_models import ContextPackStats
+from chatbot.utils.logging_config import configure_logging
+
+Logger = configure_logging()
+
+#* Tokens the chat template adds around every message (role header and end-of-turn markers)
+MESSAGE_OVERHEAD_TOKENS = 4
+DOCUMENT_SEPARATOR = "\n\n"
+
+
+def overlap_length(first: str, second: str, min_overlap: int) -> int:
+    """Returns the length of the longest suffix of the first text that is a prefix of the second one.
+
+    Args:
+        first (str): The text whose end is compared.
+        second (str): The text whose start is compared.
+        min_overlap (int): Shorter overlaps are ignored (0 is returned), as they are likely coincidental.
+
+    Returns:
+        int: The overlap length in characters.
+    """
+
+    for length in range(min(len(first), len(second)), min_overlap - 1, -1):
+        if first.endswith(second[:length]):
+            return length
+    return 0
+
+
+def remove_overlaps(documents: List[str], min_overlap: int) -> Tuple[List[str], int]:
+    """Strips text a document shares with a document ranked before it.
+
+    Neighbouring chunks of an article overlap by CHUNK_OVERLAP, so when both are retrieved
+    the shared text is kept only once. Documents fully contained in a better ranked one are dropped.
+
+    Args:
+        documents (List[str]): The documents, best ranked first.
+        min_overlap (int): The minimal overlap in characters to strip.
+
+    Returns:
+        Tuple[List[str], int]: The remaining documents, in the same order, and the number of characters removed.
+    """
+
+    kept: List[str] = []
+    removed = 0
+    for document in documents:
+        text = document.strip()
+        if any(text in other for other in kept):
+            removed += len(text)
+            continue
+        for other in kept:
+            #* The document may continue the other chunk or lead into it
+            length = overlap_length(other, text, min_overlap)
+            if length:
+                text = text[length:].lstrip()
+            length = overlap_length(text, other, min_overlap)
+            if length:
+                text = text[:-length].rstrip()
+        removed += len(document.strip()) - len(text)
+        if text:
+            kept.append(text)
+    return kept, removed
+
+
+class ContextPacker:
+    """Fits the retrieved documents and the conversation history of a RAG prompt into a token budget."""
+
+    def __init__(
+        self,
+        tokenizer: PreTrainedTokenizerBase,
+        token_budget: int | None = None,
+        documents_token_budget: int | None = None,
+        history_trim_ratio: float | None = None,
+        min_overlap_chars: int | None = None,
+    ):
+        """Initializes a ContextPacker instance.
+
+        Args:
+            tokenizer (PreTrainedTokenizerBase): The tokenizer of the LLM the prompt is for.
+            token_budget (int | None, optional): Tokens for the documents and the history together. Defaults to CONTEXT_TOKEN_BUDGET.
+            documents_token_budget (int | None, optional): Tokens for the documents. Defaults to CONTEXT_DOCUMENTS_TOKEN_BUDGET.
+            history_trim_ratio (float | None, optional): When the history exceeds its budget it is trimmed
+                to this share of it. Defaults to CONTEXT_HISTORY_TRIM_RATIO.
+            min_overlap_chars (int | None, optional): The minimal overlap of documents to strip. Defaults to CONTEXT_MIN_OVERLAP_CHARS.
+        """
+
+        self.tokenizer = tokenizer
+        self.token_budget = token_budget or CONTEXT_TOKEN_BUDGET
+        self.documents_token_budget = min(
+            documents_token_budget or CONTEXT_DOCUMENTS_TOKEN_BUDGET, self.token_budget
+        )
+        self.history_trim_ratio = history_trim_ratio or CONTEXT_HISTORY_TRIM_RATIO
+        self.min_overlap_chars = min_overlap_chars or CONTEXT_MIN_OVERLAP_CHARS
+
+    def count_tokens(self, text: str) -> int:
+        """Returns the number of tokens of a text, without special tokens."""
+
+        return len(self.tokenizer(text, add_special_tokens=False)["input_ids"])
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        input_ids = self.tokenizer(text, add_special_tokens=False)["input_ids"][:max_tokens]
+        return self.tokenizer.decode(input_ids)
+
+    def pack_documents(
+        self, documents: List[str], stats: ContextPackStats | None = None
+    ) -> List[str]:
+        """Removes overlapping text and keeps the best ranked documents that fit the documents budget.
+
+        Args:
+            documents (List[str]): The reranked documents, best first.
+            stats (ContextPackStats | None, optional): Filled with the token counts. Defaults to None.
+
+        Returns:
+            List[str]: The documents to put into the prompt, best first.
+        """
+
+        if stats is None:
+            stats = ContextPackStats()
+        separator_tokens = self.count_tokens(DOCUMENT_SEPARATOR)
+        stats.document_tokens_before = sum(
+            self.count_tokens(document) for document in documents
+        ) + separator_tokens * max(len(documents) - 1, 0)
+
+        deduplicated, stats.overlap_chars_removed = remove_overlaps(
+            documents, self.min_overlap_chars
+        )
+        packed: List[str] = []
+        used = 0
+        for document in deduplicated:
+            tokens = self.count_tokens(document) + (separator_tokens if packed else 0)
+            if used + tokens > self.documents_token_budget:
+                if not packed:
+                    #* The best document alone exceeds the budget, better a truncated one than none
+                    packed.append(self._truncate(document, self.documents_token_budget))
+                    used = self.documents_token_budget
+                break
+            packed.append(document)
+            used += tokens
+
+        stats.document_tokens_after = used
+        stats.documents_dropped = len(documents) - len(packed)
+        return packed
+
+    def trim_history(
+        self,
+        conversation_history: List[Dict[str, str]],
+        token_budget: int,
+        stats: ContextPackStats | None = None,
+    ) -> None:
+        """Removes the oldest messages of the history in place, once it exceeds its token budget.
+
+        The history is trimmed to a share of the budget rather than just below it, so that it keeps
+        the same start for the next turns and its cached key-values stay reusable.
+
+        Args:
+            conversation_history (List[Dict[str, str]]): The conversation history, oldest first.
+            token_budget (int): The tokens available for the history.
+            stats (ContextPackStats | None, optional): Filled with the token counts. Defaults to None.
+        """
+
+        if stats is None:
+            stats = ContextPackStats()
+        message_tokens = [
+            self.count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+            for message in conversation_history
+        ]
+        total = sum(message_tokens)
+        stats.history_tokens_before = total
+
+        if total > token_budget:
+            target = int(token_budget * self.history_trim_ratio)
+            trimmed = 0
+            #* The latest message is always kept
+            while trimmed < len(message_tokens) - 1 and total > target:
+                total -= message_tokens[trimmed]
+                trimmed += 1
+            del conversation_history[:trimmed]
+            stats.messages_trimmed = trimmed
+
+        stats.history_tokens_after = total
+
+    def pack(
+        self,
+        documents: List[str],
+        conversation_history: List[Dict[str, str]] | None = None,
+    ) -> Tuple[List[str], ContextPackStats]:
+        """Packs the documents first and gives the history whatever is left of the token budget.
+
+        Args:
+            documents (List[str]): The reranked documents, best first.
+            conversation_history (List[Dict[str, str]] | None, optional): The conversation history,
+                trimmed in place. Defaults to None.
+
+        Returns:
+            Tuple[List[str], ContextPackStats]: The documents to put into the prompt and the token counts.
+        """
+
+        stats = ContextPackStats()
+        packed = self.pack_documents(documents, stats)
+        if conversation_history:
+            self.trim_history(
+                conversation_history,
+                self.token_budget - stats.document_tokens_after,
+                stats,
+            )
+        Logger.info(
+            f"Context packed: {stats.tokens_before} -> {stats.tokens_after} tokens"
+            f" ({stats.tokens_saved} saved, {stats.documents_dropped} documents dropped,"
+            f" {stats.messages_trimmed} history messages trimmed)."
+        )
+        return packed, stats
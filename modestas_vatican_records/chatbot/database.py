@@ -1,9 +1,15 @@
-import pypdf
-import uuid
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
 
 import chromadb
+import pypdf
 from chromadb.api.models import Collection
 from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
 from langchain.text_splitter import (
@@ -14,19 +20,126 @@ from langchain.text_splitter import (
 from chatbot.config import (
     CHARACTER_SPLIT_CHUNK_SIZE,
     CHUNK_OVERLAP,
+    COLLECTION_VERSION_PATH,
     EMBEDDING_MODEL,
+    INGESTION_BATCH_SIZE,
+    INGESTION_MANIFEST_PATH,
+    INGESTION_MAX_DEFAULT_WORKERS,
+    INGESTION_WORKERS,
     SEPARATORS,
     TOKENS_PER_CHUNK,
 )
-from chatbot.utils.data_models import Article
+from chatbot.registry import construct_model
+from chatbot.utils.collection_version import write_collection_version
+from chatbot.utils.data_models import Article, IngestionStats
 from chatbot.utils.text_utils import preprocess_text
 from chatbot.utils.logging_config import configure_logging
 
 Logger = configure_logging()
 
+#* Text splitters, created on first use (the token splitter loads a tokenizer) and only in the main process:
+#* the worker processes just extract text
+_SPLITTERS: Tuple[RecursiveCharacterTextSplitter, SentenceTransformersTokenTextSplitter] | None = None
+
+
+def extract_pdf_text(filepath: Path) -> Tuple[str, int]:
+    """Extracts and preprocesses the text of all pages of a PDF file.
+
+    Args:
+        filepath (Path): The path to the PDF file.
+
+    Returns:
+        Tuple[str, int]: The text of the PDF and its number of pages.
+    """
+
+    with open(filepath, "rb") as f:
+        reader = pypdf.PdfReader(f)
+        pages_text = [preprocess_text(page.extract_text()) for page in reader.pages]
+    return ".\n".join(pages_text), len(pages_text)
+
+
+def _get_splitters() -> Tuple[RecursiveCharacterTextSplitter, SentenceTransformersTokenTextSplitter]:
+    global _SPLITTERS
+    if _SPLITTERS is None:
+        _SPLITTERS = (
+            RecursiveCharacterTextSplitter(
+                separators=SEPARATORS,
+                chunk_size=CHARACTER_SPLIT_CHUNK_SIZE,
+                chunk_overlap=CHUNK_OVERLAP,
+            ),
+            SentenceTransformersTokenTextSplitter(
+                chunk_overlap=CHUNK_OVERLAP, tokens_per_chunk=TOKENS_PER_CHUNK
+            ),
+        )
+    return _SPLITTERS
+
+
+def split_article(body: str) -> List[str]:
+    """Splits an article body into chunks, first by characters and then by tokens.
+
+    Args:
+        body (str): The article text.
+
+    Returns:
+        List[str]: The chunks, each fitting the embedding model's context window.
+    """
+
+    character_splitter, token_splitter = _get_splitters()
+    chunks: List[str] = []
+    for text in character_splitter.split_text(body):
+        chunks += token_splitter.split_text(text)
+    return chunks
+
+
+def chunk_ids(title: str, chunks: List[str]) -> List[str]:
+    """Derives deterministic chunk IDs from the article title, the chunk position and the chunk content.
+
+    Args:
+        title (str): The article title.
+        chunks (List[str]): The article chunks, in order.
+
+    Returns:
+        List[str]: One ID per chunk, stable across runs for unchanged content.
+    """
+
+    return [
+        hashlib.sha256(f"{title}\0{index}\0{chunk}".encode()).hexdigest()
+        for index, chunk in enumerate(chunks)
+    ]
+
+
+def hash_file(filepath: Path) -> str:
+    """Returns the SHA-256 hex digest of a file's content."""
+
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _process_pdf(filepath: Path) -> Dict[str, Any]:
+    """Extracts the text of one PDF. Runs in a worker process."""
+
+    start = time.perf_counter()
+    body, pages = extract_pdf_text(filepath)
+    return {"body": body, "pages": pages, "extract_seconds": time.perf_counter() - start}
+
+
+def _process_pool(max_workers: int | None, tasks: int) -> ProcessPoolExecutor:
+    """Creates the PDF parsing pool: spawned workers (forking a process holding models and threads is unsafe),
+    at most one per task and, by default, at most INGESTION_MAX_DEFAULT_WORKERS."""
+
+    if not max_workers:
+        max_workers = INGESTION_WORKERS or min(os.cpu_count() or 1, INGESTION_MAX_DEFAULT_WORKERS)
+    return ProcessPoolExecutor(
+        max_workers=max(1, min(max_workers, tasks)),
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
 
 async def load_articles(directory_path: Path) -> List[Dict[str, str]]:
-    """Loads articles from PDF files in a directory.
+    """Loads articles from PDF files in a directory, parsing the PDFs in a process pool.
 
     Args:
         directory_path (Path): The path to the directory containing PDF files.
@@ -42,23 +155,21 @@ async def load_articles(directory_path: Path) -> List[Dict[str, str]]:
     try:
         if not directory_path.is_dir():
             raise FileNotFoundError(f"Directory not found: {directory_path}")
+        filepaths = sorted(directory_path.glob("*.pdf"))
+        loop = asyncio.get_running_loop()
+        with _process_pool(INGESTION_WORKERS, len(filepaths)) as pool:
+            results = await asyncio.gather(
+                *(loop.run_in_executor(pool, extract_pdf_text, path) for path in filepaths),
+                return_exceptions=True,
+            )
+
         articles: List[Dict[str, str]] = []
-        for filepath in directory_path.iterdir():
-            if filepath.name.endswith(".pdf"):
-                try:
-                    with open(filepath, "rb") as f:
-                        reader = pypdf.PdfReader(f)
-                        pages_text = []
-                        for page in reader.pages:
-                            pages_text.append(preprocess_text(page.extract_text()))
-                        text = ".\n".join(pages_text)
-                        articles.append(
-                            {"title": filepath.stem, "body": text}
-                        )
-                except Exception as e:
-                    Logger.error(f"Failed to process PDF {filepath.name}: {e}")
-                    # Continue processing other PDFs even if one fails
-                    continue
+        for filepath, result in zip(filepaths, results):
+            if isinstance(result, Exception):
+                Logger.error(f"Failed to process PDF {filepath.name}: {result}")
+                # Continue processing other PDFs even if one fails
+                continue
+            articles.append({"title": filepath.stem, "body": result[0]})
 
         Logger.info(f"Loaded {len(articles)} articles from {directory_path}")
         return articles
@@ -89,8 +200,8 @@ async def create_embedding_function(
         if not embedding_model_name:
             embedding_model_name = EMBEDDING_MODEL
 
-        embedding_function = SentenceTransformerEmbeddingFunction(
-            model_name=embedding_model_name
+        embedding_function = await construct_model(
+            SentenceTransformerEmbeddingFunction, model_name=embedding_model_name
         )
         Logger.info("Embedding function initialized.")
         return embedding_function
@@ -138,7 +249,9 @@ async def get_or_create_collection(
     """
 
     try:
-        collection = client.get_collection(name=collection_name)
+        collection = client.get_collection(
+            name=collection_name, embedding_function=embedding_function
+        )
         Logger.info(f"Found existing collection '{collection_name}'.")
     except chromadb.errors.InvalidCollectionException:
         Logger.info(f"Collection '{collection_name}' not found. Creating a new one.")
@@ -148,6 +261,39 @@ async def get_or_create_collection(
     return collection
 
 
+async def upsert_chunks(
+    collection: Collection,
+    ids: List[str],
+    documents: List[str],
+    metadatas: List[Dict[str, Any]],
+    batch_size: int | None = None,
+) -> None:
+    """Embeds and upserts chunks in bounded batches, in a worker thread.
+
+    Args:
+        collection (Collection): The ChromaDB collection.
+        ids (List[str]): The chunk IDs.
+        documents (List[str]): The chunk texts.
+        metadatas (List[Dict[str, Any]]): The chunk metadatas.
+        batch_size (int | None, optional): Chunks embedded per call. Defaults to INGESTION_BATCH_SIZE.
+
+    Raises:
+        chromadb.APIError: If there is an error upserting the chunks.
+    """
+
+    if not batch_size:
+        batch_size = INGESTION_BATCH_SIZE
+
+    for start in range(0, len(ids), batch_size):
+        end = start + batch_size
+        await asyncio.to_thread(
+            collection.upsert,
+            ids=ids[start:end],
+            documents=documents[start:end],
+            metadatas=metadatas[start:end],
+        )
+
+
 async def populate_collection(
     collection: Collection, articles: List[Dict[str, Any]]
 ) -> None:
@@ -165,19 +311,6 @@ async def populate_collection(
     documents: List[str] = []
     metadatas: List[Dict[str, Any]] = []
 
-    character_splitter = RecursiveCharacterTextSplitter(
-        separators=SEPARATORS,
-        chunk_size=CHARACTER_SPLIT_CHUNK_SIZE,
-        chunk_overlap=CHUNK_OVERLAP,
-    )
-
-    token_splitter = SentenceTransformersTokenTextSplitter(
-        chunk_overlap=CHUNK_OVERLAP, tokens_per_chunk=TOKENS_PER_CHUNK
-    )
-
-    character_split_chunk_num = 0
-    token_split_chunk_num = 0
-
     for entry in articles:
 
         article = Article(**entry)
@@ -187,26 +320,183 @@ async def populate_collection(
             )
             continue
 
-        character_split_texts = character_splitter.split_text(article.body)
-        character_split_chunk_num += len(character_split_texts)
-        chunks = []
-        for text in character_split_texts:
-            chunks += token_splitter.split_text(text)
-
-        token_split_chunk_num += len(chunks)
-
-        for chunk in chunks:
-            uid = str(uuid.uuid4())
-            ids.append(uid)
-            documents.append(chunk)
-            metadatas.append({"title": article.title})
+        chunks = split_article(article.body)
+        ids += chunk_ids(article.title, chunks)
+        documents += chunks
+        metadatas += [{"title": article.title}] * len(chunks)
 
     try:
-        collection.add(ids=ids, documents=documents, metadatas=metadatas)
+        await upsert_chunks(collection, ids, documents, metadatas)
         Logger.info(
             f"Added {len(ids)} document chunks to collection '{collection.name}'."
         )
-        Logger.info(f"Character split chunks = {character_split_chunk_num}.")
     except chromadb.APIError as e:
         Logger.error(f"Error populating collection: {e}")
         raise
+
+
+def _read_manifest(manifest_path: Path) -> Dict[str, Dict[str, Any]] | None:
+    try:
+        return json.loads(manifest_path.read_text())
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        Logger.warning(f"Ignoring unreadable ingestion manifest {manifest_path}: {e}")
+        return None
+
+
+def _write_manifest(manifest_path: Path, manifest: Dict[str, Dict[str, Any]]) -> None:
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = manifest_path.with_suffix(".tmp")
+    temporary_path.write_text(json.dumps(manifest, indent=2))
+    temporary_path.replace(manifest_path)
+
+
+async def sync_collection(
+    collection: Collection,
+    directory_path: Path,
+    manifest_path: str | Path | None = None,
+    version_path: str | Path | None = None,
+    max_workers: int | None = None,
+    batch_size: int | None = None,
+) -> IngestionStats:
+    """Brings the collection in sync with the PDFs of a directory, processing only what changed.
+
+    Each PDF is identified by its content hash. New and changed PDFs are parsed in a process pool, chunked
+    with the splitters of this process and their chunks upserted under deterministic IDs, chunks of changed and removed PDFs are deleted.
+    A collection populated without a manifest (e.g. by an older version) is rebuilt once.
+
+    Args:
+        collection (Collection): The ChromaDB collection.
+        directory_path (Path): The directory containing the PDF files.
+        manifest_path (str | Path | None, optional): The manifest of ingested PDFs. Defaults to INGESTION_MANIFEST_PATH.
+        version_path (str | Path | None, optional): The collection version file, bumped when anything changed.
+            Defaults to COLLECTION_VERSION_PATH.
+        max_workers (int | None, optional): The process pool size. Defaults to INGESTION_WORKERS, or one worker
+            per CPU core up to INGESTION_MAX_DEFAULT_WORKERS.
+        batch_size (int | None, optional): Chunks embedded per call. Defaults to INGESTION_BATCH_SIZE.
+
+    Returns:
+        IngestionStats: What changed and how long every stage took.
+
+    Raises:
+        FileNotFoundError: If the directory is not found.
+        chromadb.APIError: If there is an error updating the collection.
+    """
+
+    if not directory_path.is_dir():
+        raise FileNotFoundError(f"Directory not found: {directory_path}")
+    manifest_path = Path(manifest_path or INGESTION_MANIFEST_PATH)
+    version_path = version_path or COLLECTION_VERSION_PATH
+    stats = IngestionStats()
+
+    start = time.perf_counter()
+    filepaths = {path.name: path for path in sorted(directory_path.glob("*.pdf"))}
+    hashes = dict(
+        zip(
+            filepaths,
+            await asyncio.gather(
+                *(asyncio.to_thread(hash_file, path) for path in filepaths.values())
+            ),
+        )
+    )
+    stats.stage_seconds["hashing"] = time.perf_counter() - start
+
+    manifest = _read_manifest(manifest_path)
+    stale_ids: List[str] = []
+    if manifest is None:
+        manifest = {}
+        if collection.count():
+            Logger.info("No ingestion manifest found, rebuilding the collection.")
+            stale_ids = collection.get(include=[])["ids"]
+
+    to_process: List[str] = []
+    for name, file_hash in hashes.items():
+        entry = manifest.get(name)
+        if entry is None:
+            stats.files_added += 1
+            to_process.append(name)
+        elif entry["hash"] != file_hash:
+            stats.files_changed += 1
+            stale_ids += entry["chunk_ids"]
+            to_process.append(name)
+        else:
+            stats.files_unchanged += 1
+    for name in set(manifest) - set(hashes):
+        stats.files_removed += 1
+        stale_ids += manifest.pop(name)["chunk_ids"]
+
+    start = time.perf_counter()
+    for batch_start in range(0, len(stale_ids), batch_size or INGESTION_BATCH_SIZE):
+        batch = stale_ids[batch_start : batch_start + (batch_size or INGESTION_BATCH_SIZE)]
+        await asyncio.to_thread(collection.delete, ids=batch)
+    stats.chunks_deleted = len(stale_ids)
+    stats.stage_seconds["deletion"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results: List[Any] = []
+    if to_process:
+        loop = asyncio.get_running_loop()
+        with _process_pool(max_workers, len(to_process)) as pool:
+            results = await asyncio.gather(
+                *(loop.run_in_executor(pool, _process_pdf, filepaths[name]) for name in to_process),
+                return_exceptions=True,
+            )
+    stats.stage_seconds["extraction"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for name, result in zip(to_process, results):
+        if isinstance(result, Exception):
+            Logger.error(f"Failed to process PDF {name}: {result}")
+            stats.files_failed += 1
+            #* Not recorded in the manifest, so it is retried on the next run
+            manifest.pop(name, None)
+            continue
+
+        title = filepaths[name].stem
+        stats.pages_extracted += result["pages"]
+        #* Summed worker time, so it exceeds the wall time of the extraction stage when workers run in parallel
+        stats.stage_seconds["worker_extract"] = (
+            stats.stage_seconds.get("worker_extract", 0.0) + result["extract_seconds"]
+        )
+        chunk_start = time.perf_counter()
+        chunks = await asyncio.to_thread(split_article, result["body"]) if result["body"] else []
+        stats.stage_seconds["chunking"] = (
+            stats.stage_seconds.get("chunking", 0.0) + time.perf_counter() - chunk_start
+        )
+        if not chunks:
+            Logger.warning(f"Article '{title}' has no body text content. Skipping.")
+        ids = chunk_ids(title, chunks)
+        await upsert_chunks(
+            collection,
+            ids,
+            chunks,
+            [{"title": title}] * len(ids),
+            batch_size,
+        )
+        stats.chunks_added += len(ids)
+        manifest[name] = {"hash": hashes[name], "chunk_ids": ids}
+        #* Written after every file, so an interrupted run does not redo finished files
+        _write_manifest(manifest_path, manifest)
+    stats.stage_seconds["embedding"] = time.perf_counter() - start
+
+    _write_manifest(manifest_path, manifest)
+    if stats.changed:
+        write_collection_version(version_path)
+    Logger.info(f"Collection '{collection.name}' synced: {stats.summary()}")
+    return stats
+
+
+if __name__ == "__main__":
+    from chatbot.config import CHROMA_DB_PERSIST_DIR, COLLECTION_NAME, DATA_ARTICLES_PATH
+
+    async def main() -> None:
+        client = await create_chroma_client(persist_directory=CHROMA_DB_PERSIST_DIR)
+        collection = await get_or_create_collection(
+            client=client,
+            collection_name=COLLECTION_NAME,
+            embedding_function=await create_embedding_function(),
+        )
+        await sync_collection(collection, Path(DATA_ARTICLES_PATH))
+
+    asyncio.run(main())
@@ -1,32 +1,64 @@
 import asyncio
+import threading
+from contextlib import aclosing
 from pathlib import Path
-from typing import Dict, List
+from typing import Any, AsyncIterator, Dict, List, Tuple
 
 import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer
+from transformers import (
+    AutoModelForCausalLM,
+    AutoTokenizer,
+    StoppingCriteria,
+    StoppingCriteriaList,
+    TextIteratorStreamer,
+)
 from huggingface_hub.errors import HFValidationError
 
+from chatbot.batching import BatchingEngine
+from chatbot.context_packer import DOCUMENT_SEPARATOR, ContextPacker
 from chatbot.config import (
     ANSWER_SYSTEM_PROMPT,
     GENERAL_SYSTEM_PROMPT,
     HF_CACHE_DIR,
     HF_LLM_MODEL_ID,
+    LLM_CONTINUOUS_BATCHING,
     MAX_NEW_TOKENS,
+    PREFIX_CACHE_ENABLED,
     QUESTIONS_SYSTEM_PROMPT,
     RAG_SYSTEM_PROMPT,
 )
+from chatbot.prefix_cache import PrefixCache
+from chatbot.streaming import TokenStream
 from chatbot.utils.logging_config import configure_logging
 
 Logger = configure_logging()
 
 
+class _StopOnEvent(StoppingCriteria):
+    """Stops model.generate() once the event is set, e.g. when a stream is closed."""
+
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def __call__(self, input_ids: torch.Tensor, scores: torch.Tensor, **kwargs) -> bool:
+        return self.event.is_set()
+
+
 class LLM:
 
-    def __init__(self, pretrained_model_name_or_path: str | Path | None = None):
+    def __init__(
+        self,
+        pretrained_model_name_or_path: str | Path | None = None,
+        continuous_batching: bool | None = None,
+        max_new_tokens: int | None = None,
+    ):
         """Initializes an LLM instance.
 
         Args:
             pretrained_model_name_or_path (str | Path | None, optional): The path or name of the pretrained model. Defaults to None.
+            continuous_batching (bool | None, optional): Whether concurrent calls share decode steps through
+                a BatchingEngine, instead of one model.generate() per call. Defaults to LLM_CONTINUOUS_BATCHING.
+            max_new_tokens (int | None, optional): The default max number of tokens to generate per call. Defaults to MAX_NEW_TOKENS.
 
         Raises:
             OSError: If the model or tokenizer cannot be loaded.
@@ -34,6 +66,7 @@ class LLM:
 
         if not pretrained_model_name_or_path:
             pretrained_model_name_or_path = HF_LLM_MODEL_ID
+        self.max_new_tokens = max_new_tokens or MAX_NEW_TOKENS
 
         Logger.info(
             f"Loading model and tokenizer from {pretrained_model_name_or_path}"
@@ -57,12 +90,111 @@ class LLM:
             Logger.error(f"Error loading model or tokenizer: {e}")
             raise
 
+        if continuous_batching is None:
+            continuous_batching = LLM_CONTINUOUS_BATCHING
+        self.engine: BatchingEngine | None = None
+        if continuous_batching:
+            eos_token_ids = self.model.generation_config.eos_token_id
+            if eos_token_ids is None:
+                eos_token_ids = self.tokenizer.eos_token_id
+            if isinstance(eos_token_ids, int):
+                eos_token_ids = [eos_token_ids]
+            pad_token_id = self.tokenizer.pad_token_id
+            if pad_token_id is None:
+                pad_token_id = eos_token_ids[0]
+            self.engine = BatchingEngine(
+                self.model,
+                pad_token_id=pad_token_id,
+                eos_token_ids=eos_token_ids,
+                prefix_cache=PrefixCache() if PREFIX_CACHE_ENABLED else None,
+            )
+        self.context_packer = ContextPacker(self.tokenizer)
+
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Returns the generation engine and prefix cache metrics (empty without continuous batching).
+
+        Returns:
+            Dict[str, Dict[str, Any]]: The metrics keyed by component.
+        """
+
+        metrics: Dict[str, Dict[str, Any]] = {}
+        if self.engine is not None:
+            engine = self.engine.metrics()
+            metrics["engine"] = {
+                **engine.model_dump(),
+                "mean_batch_size": engine.mean_batch_size,
+                "tokens_per_second": engine.tokens_per_second,
+            }
+            if self.engine.prefix_cache is not None:
+                prefix_cache = self.engine.prefix_cache.metrics()
+                metrics["prefix_cache"] = {
+                    **prefix_cache.model_dump(),
+                    "hit_rate": prefix_cache.hit_rate,
+                    "prefill_seconds_saved": prefix_cache.prefill_seconds_saved,
+                }
+        return metrics
+
+    def _build_messages(
+        self,
+        user_prompt: str,
+        conversation_history: List[Dict[str, str]] | None = None,
+        system_prompt: str | None = None,
+    ) -> List[Dict[str, str]]:
+        """Puts the system prompt, conversation history and user prompt into one list of chat messages."""
+
+        if not conversation_history:
+            conversation_history = []
+
+        if not system_prompt:
+            system_prompt = GENERAL_SYSTEM_PROMPT
+
+        return [
+            {"role": "system", "content": system_prompt},
+            *conversation_history,
+            {"role": "user", "content": user_prompt},
+        ]
+
+    def _build_prompt(self, messages: List[Dict[str, str]]) -> str:
+        """Applies the chat template to the messages."""
+
+        return self.tokenizer.apply_chat_template(
+            messages, tokenize=False, add_generation_prompt=True
+        )
+
+    def _engine_inputs(
+        self, messages: List[Dict[str, str]], text: str
+    ) -> Tuple[List[int], List[int]]:
+        """Tokenizes the prompt and finds the prefixes worth keeping in the prefix cache.
+
+        These are the end of the system prompt, shared by all sessions, and the end of the
+        conversation history, which is the start of the next turn's prompt in the same session.
+
+        Returns:
+            Tuple[List[int], List[int]]: The prompt token ids and the cacheable prefix lengths.
+        """
+
+        input_ids = self.tokenizer(text).input_ids
+        boundaries: List[int] = []
+        if self.engine is None or self.engine.prefix_cache is None:
+            return input_ids, boundaries
+
+        for prefix_messages in (messages[:1], messages[:-1]):
+            prefix_text = self.tokenizer.apply_chat_template(prefix_messages, tokenize=False)
+            if not text.startswith(prefix_text):
+                continue
+            prefix_ids = self.tokenizer(prefix_text).input_ids
+            #* Only a prefix that tokenizes the same way on its own can be reused
+            if input_ids[: len(prefix_ids)] == prefix_ids:
+                boundaries.append(len(prefix_ids))
+        return input_ids, boundaries
 
     async def chat(
         self,
         user_prompt: str,
         conversation_history: List[Dict[str, str]] | None = None,
         system_prompt: str | None = None,
+        max_new_tokens: int | None = None,
     ) -> str:
         """Generates a chat response using the language model.
 
@@ -70,6 +202,7 @@ class LLM:
             user_prompt (str): The user's prompt.
             conversation_history (List[Dict[str, str]] | None, optional): The conversation history. Defaults to None.
             system_prompt (str | None, optional): The system prompt. Defaults to None.
+            max_new_tokens (int | None, optional): The max number of tokens to generate. Defaults to the instance's max_new_tokens.
 
         Returns:
             str: The generated chat response.
@@ -78,38 +211,121 @@ class LLM:
             Exception: If there is an error during text generation.
         """
 
-        if not conversation_history:
-            conversation_history = []
+        if not max_new_tokens:
+            max_new_tokens = self.max_new_tokens
 
-        if not system_prompt:
-            system_prompt = GENERAL_SYSTEM_PROMPT
+        messages = self._build_messages(user_prompt, conversation_history, system_prompt)
+        text = self._build_prompt(messages)
+        try:
+            if self.engine is not None:
+                input_ids, cache_boundaries = self._engine_inputs(messages, text)
+                generated_ids = await self.engine.generate(
+                    input_ids, max_new_tokens, cache_boundaries
+                )
+                return self.tokenizer.decode(generated_ids, skip_special_tokens=True)
+            return await self._generate_sequentially(text, max_new_tokens)
+        except Exception as e:
+            Logger.error(f"Error during text generation: {e}")
+            raise
 
-        messages = [
-            {"role": "system", "content": system_prompt},
-            *conversation_history,
-            {"role": "user", "content": user_prompt},
-        ]
+    def stream_chat(
+        self,
+        user_prompt: str,
+        conversation_history: List[Dict[str, str]] | None = None,
+        system_prompt: str | None = None,
+        max_new_tokens: int | None = None,
+    ) -> TokenStream:
+        """Generates a chat response, yielding the text as soon as it is decoded.
 
-        text = self.tokenizer.apply_chat_template(
-            messages, tokenize=False, add_generation_prompt=True
+        Args:
+            user_prompt (str): The user's prompt.
+            conversation_history (List[Dict[str, str]] | None, optional): The conversation history. Defaults to None.
+            system_prompt (str | None, optional): The system prompt. Defaults to None.
+            max_new_tokens (int | None, optional): The max number of tokens to generate. Defaults to the instance's max_new_tokens.
+
+        Returns:
+            TokenStream: An async iterator over the generated text pieces, with latency metrics.
+                Closing it (or cancelling the consuming task) stops the generation.
+        """
+
+        if not max_new_tokens:
+            max_new_tokens = self.max_new_tokens
+
+        messages = self._build_messages(user_prompt, conversation_history, system_prompt)
+        text = self._build_prompt(messages)
+        if self.engine is not None:
+            input_ids, cache_boundaries = self._engine_inputs(messages, text)
+            return TokenStream(
+                self._stream_with_engine(input_ids, cache_boundaries, max_new_tokens)
+            )
+        return TokenStream(self._stream_sequentially(text, max_new_tokens))
+
+    async def _generate_sequentially(self, text: str, max_new_tokens: int) -> str:
+        """Generates a completion with a dedicated model.generate() call, one request at a time."""
+
+        model_inputs = self.tokenizer([text], return_tensors="pt").to(self.model.device)
+        generated_ids = await asyncio.to_thread(
+            self.model.generate, **model_inputs, max_new_tokens=max_new_tokens
         )
+        generated_ids = [
+            output_ids[len(input_ids) :]
+            for input_ids, output_ids in zip(model_inputs.input_ids, generated_ids)
+        ]
+        return self.tokenizer.batch_decode(generated_ids, skip_special_tokens=True)[0]
+
+    async def _stream_with_engine(
+        self, input_ids: List[int], cache_boundaries: List[int], max_new_tokens: int
+    ) -> AsyncIterator[str]:
+        """Decodes the tokens streamed by the batching engine into text pieces."""
+
+        generated_ids: List[int] = []
+        streamed_length = 0
+        async with aclosing(
+            self.engine.stream(input_ids, max_new_tokens, cache_boundaries)
+        ) as tokens:
+            async for token_id in tokens:
+                generated_ids.append(token_id)
+                decoded = self.tokenizer.decode(generated_ids, skip_special_tokens=True)
+                #* Wait for the rest of a multi-token character
+                if decoded.endswith("\ufffd") or len(decoded) <= streamed_length:
+                    continue
+                yield decoded[streamed_length:]
+                streamed_length = len(decoded)
+
+    async def _stream_sequentially(
+        self, text: str, max_new_tokens: int
+    ) -> AsyncIterator[str]:
+        """Streams a dedicated model.generate() call through a TextIteratorStreamer."""
+
         model_inputs = self.tokenizer([text], return_tensors="pt").to(self.model.device)
+        streamer = TextIteratorStreamer(
+            self.tokenizer, skip_prompt=True, skip_special_tokens=True
+        )
+        stop = threading.Event()
 
+        def generate() -> None:
+            try:
+                self.model.generate(
+                    **model_inputs,
+                    max_new_tokens=max_new_tokens,
+                    streamer=streamer,
+                    stopping_criteria=StoppingCriteriaList([_StopOnEvent(stop)]),
+                )
+            finally:
+                #* Unblock the consumer also when generate() fails
+                streamer.end()
+
+        generation = asyncio.ensure_future(asyncio.to_thread(generate))
         try:
-            generated_ids = await asyncio.to_thread(
-                self.model.generate, **model_inputs, max_new_tokens=MAX_NEW_TOKENS
-            )
-            generated_ids = [
-                output_ids[len(input_ids) :]
-                for input_ids, output_ids in zip(model_inputs.input_ids, generated_ids)
-            ]
-            response = self.tokenizer.batch_decode(
-                generated_ids, skip_special_tokens=True
-            )[0]
-            return response
-        except Exception as e:
-            Logger.error(f"Error during text generation: {e}")
-            raise
+            while True:
+                piece = await asyncio.to_thread(next, streamer, None)
+                if piece is None:
+                    break
+                if piece:
+                    yield piece
+            await generation
+        finally:
+            stop.set()
 
     async def rag(
         self,
@@ -122,20 +338,55 @@ class LLM:
         Args:
             query (str): The user's query.
             documents (List[str]): A list of relevant documents.
-            conversation_history (List[Dict[str, str]] | None, optional): The conversation history. Defaults to None.
+            conversation_history (List[Dict[str, str]] | None, optional): The conversation history,
+                trimmed in place to the context token budget. Defaults to None.
 
         Returns:
             str: The generated RAG response.
         """
 
-        context_information = "\\n\\n".join(documents)
-        user_prompt = f"Question: {query}. \\n Information: {context_information}"
         return await self.chat(
-            user_prompt=user_prompt,
+            user_prompt=self._rag_prompt(query, documents, conversation_history),
+            conversation_history=conversation_history,
+            system_prompt=RAG_SYSTEM_PROMPT,
+        )
+
+    def stream_rag(
+        self,
+        query: str,
+        documents: List[str],
+        conversation_history: List[Dict[str, str]] | None = None,
+    ) -> TokenStream:
+        """Performs RAG like rag(), yielding the answer as soon as it is decoded.
+
+        Args:
+            query (str): The user's query.
+            documents (List[str]): A list of relevant documents.
+            conversation_history (List[Dict[str, str]] | None, optional): The conversation history,
+                trimmed in place to the context token budget. Defaults to None.
+
+        Returns:
+            TokenStream: An async iterator over the generated answer pieces, with latency metrics.
+        """
+
+        return self.stream_chat(
+            user_prompt=self._rag_prompt(query, documents, conversation_history),
             conversation_history=conversation_history,
             system_prompt=RAG_SYSTEM_PROMPT,
         )
 
+    def _rag_prompt(
+        self,
+        query: str,
+        documents: List[str],
+        conversation_history: List[Dict[str, str]] | None = None,
+    ) -> str:
+        """Packs the documents and the history into the context token budget and formats the RAG user prompt."""
+
+        documents, _ = self.context_packer.pack(documents, conversation_history)
+        context_information = DOCUMENT_SEPARATOR.join(documents)
+        return f"Question: {query}.\nInformation: {context_information}"
+
     async def expand_querry_question(
         self, user_prompt: str
     ) -> List[str]:
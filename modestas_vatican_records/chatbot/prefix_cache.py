@@ -0,0 +1,152 @@
+import hashlib
+import threading
+from array import array
+from collections import Counter, OrderedDict
+from typing import List, Sequence, Tuple
+
+import torch
+
+from chatbot.config import PREFIX_CACHE_MAX_MB
+from chatbot.utils.data_models import PrefixCacheStats
+
+LegacyCache = Tuple[Tuple[torch.Tensor, torch.Tensor], ...]
+
+
+def hash_prefix(token_ids: Sequence[int]) -> str:
+    """Hashes a token id prefix into a cache key.
+
+    Args:
+        token_ids (Sequence[int]): The token ids of the prefix.
+
+    Returns:
+        str: The hex digest of the prefix.
+    """
+
+    return hashlib.blake2b(array("q", token_ids).tobytes(), digest_size=16).hexdigest()
+
+
+class PrefixCache:
+    """LRU cache of past key-values for token prefixes of single sequences.
+
+    A lookup returns the longest cached prefix of a prompt, so the model only has
+    to prefill the tokens after it.
+    """
+
+    def __init__(self, max_mb: int | None = None):
+        """Initializes a PrefixCache instance.
+
+        Args:
+            max_mb (int | None, optional): The memory cap of the cached key-values in MB. Defaults to PREFIX_CACHE_MAX_MB.
+        """
+
+        self.max_bytes = (max_mb or PREFIX_CACHE_MAX_MB) * 1024 * 1024
+        self.stats = PrefixCacheStats()
+        self._entries: OrderedDict[str, Tuple[int, LegacyCache, int]] = OrderedDict()
+        #* Number of cached entries per prefix length, to know which lengths to probe on lookup
+        self._lengths: Counter[int] = Counter()
+        self._lock = threading.Lock()
+
+    def lookup(self, token_ids: Sequence[int]) -> Tuple[int, LegacyCache | None]:
+        """Finds the longest cached prefix of the prompt, leaving at least one token to prefill.
+
+        Args:
+            token_ids (Sequence[int]): The token ids of the prompt.
+
+        Returns:
+            Tuple[int, LegacyCache | None]: The length of the cached prefix and its key-values (0 and None on a miss).
+        """
+
+        with self._lock:
+            for length in sorted(self._lengths, reverse=True):
+                if length >= len(token_ids):
+                    continue
+                key = hash_prefix(token_ids[:length])
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.stats.hits += 1
+                    self.stats.reused_tokens += length
+                    return length, self._entries[key][1]
+            self.stats.misses += 1
+            return 0, None
+
+    def contains(self, token_ids: Sequence[int]) -> bool:
+        """Checks whether the exact prefix is cached, without counting a lookup."""
+
+        with self._lock:
+            return hash_prefix(token_ids) in self._entries
+
+    def insert(self, token_ids: Sequence[int], cache: LegacyCache) -> None:
+        """Stores the key-values of a prefix, evicting the least recently used prefixes above the memory cap.
+
+        Args:
+            token_ids (Sequence[int]): The token ids of the prefix.
+            cache (LegacyCache): The key-values of exactly these tokens, for a single sequence.
+        """
+
+        size_bytes = sum(
+            key.numel() * key.element_size() + value.numel() * value.element_size()
+            for key, value in cache
+        )
+        if size_bytes > self.max_bytes:
+            return
+
+        key = hash_prefix(token_ids)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = (len(token_ids), cache, size_bytes)
+            self._lengths[len(token_ids)] += 1
+            self.stats.size_bytes += size_bytes
+            while self.stats.size_bytes > self.max_bytes:
+                _, (length, _, evicted_bytes) = self._entries.popitem(last=False)
+                self._lengths[length] -= 1
+                if not self._lengths[length]:
+                    del self._lengths[length]
+                self.stats.size_bytes -= evicted_bytes
+                self.stats.evictions += 1
+            self.stats.entries = len(self._entries)
+
+    def record_prefill(self, tokens: int, seconds: float) -> None:
+        """Records the tokens the model actually prefilled, to estimate the prefill time saved."""
+
+        with self._lock:
+            self.stats.prefilled_tokens += tokens
+            self.stats.prefill_seconds += seconds
+
+    def clear(self) -> None:
+        """Removes all cached prefixes."""
+
+        with self._lock:
+            self._entries.clear()
+            self._lengths.clear()
+            self.stats.entries = 0
+            self.stats.size_bytes = 0
+
+    def metrics(self) -> PrefixCacheStats:
+        """Returns a snapshot of the cache metrics."""
+
+        with self._lock:
+            return self.stats.model_copy()
+
+
+def slice_sequence_cache(
+    cache: LegacyCache, row: int, start: int, end: int
+) -> LegacyCache:
+    """Copies the key-values of positions [start, end) of one row out of a batched cache."""
+
+    return tuple(
+        (
+            key[row : row + 1, :, start:end].clone(),
+            value[row : row + 1, :, start:end].clone(),
+        )
+        for key, value in cache
+    )
+
+
+def prefix_boundaries(boundaries: List[int], cached_length: int, prompt_length: int) -> List[int]:
+    """Keeps the boundaries that are worth caching after a prefill: past the reused prefix and inside the prompt."""
+
+    return sorted(
+        {boundary for boundary in boundaries if cached_length < boundary <= prompt_length}
+    )
@@ -0,0 +1,282 @@
+import asyncio
+import gc
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Tuple
+
+from chatbot.utils.data_models import ResourceStats
+from chatbot.utils.logging_config import configure_logging
+
+Logger = configure_logging()
+
+Loader = Callable[..., Awaitable[Any]]
+SizeFunction = Callable[[Any], int]
+
+#* from_pretrained() creates the weights on the meta device by patching torch process-wide for the duration of the load,
+#* so a model constructed in another thread at the same time can end up with meta tensors
+_construction_lock = threading.Lock()
+
+
+async def construct_model(constructor: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Runs a blocking model constructor in a worker thread, one constructor at a time.
+
+    Args:
+        constructor (Callable[..., Any]): Creates the model, e.g. LLM or Reranker.
+        *args (Any): Positional arguments of the constructor.
+        **kwargs (Any): Keyword arguments of the constructor.
+
+    Returns:
+        Any: The constructed model.
+    """
+
+    def construct() -> Any:
+        with _construction_lock:
+            return constructor(*args, **kwargs)
+
+    return await asyncio.to_thread(construct)
+
+
+def torch_module_nbytes(module: Any) -> int:
+    """Estimates the memory taken by the parameters and buffers of a torch module.
+
+    Args:
+        module (Any): A torch.nn.Module (or anything exposing parameters() and buffers()).
+
+    Returns:
+        int: The size of the module weights in bytes, 0 if it can not be estimated.
+    """
+
+    if module is None or not hasattr(module, "parameters"):
+        return 0
+    tensors = list(module.parameters())
+    if hasattr(module, "buffers"):
+        tensors += list(module.buffers())
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+
+
+class _Entry:
+    """Bookkeeping of a single registered resource."""
+
+    def __init__(
+        self,
+        name: str,
+        loader: Loader,
+        dependencies: Tuple[str, ...],
+        size_function: SizeFunction | None,
+    ):
+        self.name = name
+        self.loader = loader
+        self.dependencies = dependencies
+        self.size_function = size_function
+        self.future: Future | None = None
+        self.last_used = 0.0
+        self.stats = ResourceStats(name=name)
+
+    @property
+    def loaded(self) -> bool:
+        return (
+            self.future is not None
+            and self.future.done()
+            and self.future.exception() is None
+        )
+
+
+class ModelRegistry:
+    """Process-wide registry of lazily loaded, reference-counted models and clients.
+
+    Every resource is loaded once, by the first session that asks for it, and then shared.
+    Concurrent requests for a resource that is still loading wait for the same load,
+    also when they come from another thread (e.g. the warm-up thread).
+    """
+
+    def __init__(self, memory_budget_mb: int | None = None):
+        """Initializes a ModelRegistry instance.
+
+        Args:
+            memory_budget_mb (int | None, optional): The memory budget of all loaded resources in MB.
+                Resources not used by any session are evicted (least recently used first) when exceeded.
+                Defaults to None (no budget).
+        """
+
+        self.memory_budget_bytes = (
+            memory_budget_mb * 1024 * 1024 if memory_budget_mb else None
+        )
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+
+    def register(
+        self,
+        name: str,
+        loader: Loader,
+        dependencies: Iterable[str] = (),
+        size_function: SizeFunction | None = None,
+    ) -> None:
+        """Registers a resource without loading it.
+
+        Args:
+            name (str): The name of the resource.
+            loader (Loader): An async callable creating the resource.
+                It receives the loaded dependencies as keyword arguments.
+            dependencies (Iterable[str], optional): Names of the resources the loader needs. Defaults to ().
+            size_function (SizeFunction | None, optional): Returns the memory taken by the resource in bytes.
+                Defaults to None (the resource is not counted against the budget).
+        """
+
+        with self._lock:
+            if name in self._entries:
+                raise ValueError(f"Resource '{name}' is already registered.")
+            self._entries[name] = _Entry(
+                name, loader, tuple(dependencies), size_function
+            )
+
+    def _get_entry(self, name: str) -> _Entry:
+        try:
+            return self._entries[name]
+        except KeyError:
+            raise KeyError(f"Resource '{name}' is not registered.") from None
+
+    async def acquire(self, name: str) -> Any:
+        """Returns the resource, loading it on first use, and increments its reference count.
+
+        Args:
+            name (str): The name of the resource.
+
+        Returns:
+            Any: The loaded resource.
+
+        Raises:
+            KeyError: If the resource is not registered.
+            Exception: Whatever the loader raised, if loading failed.
+        """
+
+        with self._lock:
+            entry = self._get_entry(name)
+            entry.stats.ref_count += 1
+            entry.last_used = time.monotonic()
+            is_owner = entry.future is None
+            if is_owner:
+                entry.future = Future()
+            else:
+                entry.stats.hits += 1
+            future = entry.future
+
+        if not is_owner:
+            try:
+                return await asyncio.wrap_future(future)
+            except Exception:
+                with self._lock:
+                    entry.stats.ref_count -= 1
+                raise
+
+        try:
+            resource = await self._load(entry)
+        except BaseException as e:
+            with self._lock:
+                entry.future = None
+                entry.stats.ref_count -= 1
+            future.set_exception(e)
+            raise
+        future.set_result(resource)
+        await self._enforce_memory_budget()
+        return resource
+
+    async def _load(self, entry: _Entry) -> Any:
+        start = time.perf_counter()
+        dependencies: Dict[str, Any] = {}
+        try:
+            for dependency in entry.dependencies:
+                dependencies[dependency] = await self.acquire(dependency)
+            resource = await entry.loader(**dependencies)
+        except BaseException as e:
+            Logger.error(f"Error loading resource '{entry.name}': {e}")
+            for dependency in dependencies:
+                await self.release(dependency)
+            raise
+
+        size_bytes = entry.size_function(resource) if entry.size_function else 0
+        with self._lock:
+            entry.stats.loads += 1
+            entry.stats.load_seconds = time.perf_counter() - start
+            entry.stats.size_bytes = size_bytes
+        Logger.info(
+            f"Resource '{entry.name}' loaded in {entry.stats.load_seconds:.2f} s"
+            f" ({size_bytes / 1024 / 1024:.1f} MB)."
+        )
+        return resource
+
+    async def release(self, name: str) -> None:
+        """Decrements the reference count of a resource acquired before.
+
+        Args:
+            name (str): The name of the resource.
+        """
+
+        with self._lock:
+            entry = self._get_entry(name)
+            entry.stats.ref_count = max(0, entry.stats.ref_count - 1)
+        await self._enforce_memory_budget()
+
+    async def warm_up(self, names: Iterable[str] | None = None) -> None:
+        """Loads resources ahead of the first session, without holding a reference to them.
+
+        Args:
+            names (Iterable[str] | None, optional): The resources to load. Defaults to None (all registered).
+        """
+
+        if names is None:
+            with self._lock:
+                names = list(self._entries)
+        names = list(names)
+        start = time.perf_counter()
+        await asyncio.gather(*(self.acquire(name) for name in names))
+        for name in names:
+            await self.release(name)
+        Logger.info(
+            f"Model registry warmed up in {time.perf_counter() - start:.2f} s."
+        )
+
+    async def _enforce_memory_budget(self) -> None:
+        if not self.memory_budget_bytes:
+            return
+
+        evicted: List[_Entry] = []
+        with self._lock:
+            loaded = [entry for entry in self._entries.values() if entry.loaded]
+            total = sum(entry.stats.size_bytes for entry in loaded)
+            candidates = sorted(
+                (entry for entry in loaded if entry.stats.ref_count == 0),
+                key=lambda entry: entry.last_used,
+            )
+            for entry in candidates:
+                if total <= self.memory_budget_bytes:
+                    break
+                entry.future = None
+                entry.stats.evictions += 1
+                total -= entry.stats.size_bytes
+                evicted.append(entry)
+
+        for entry in evicted:
+            Logger.info(f"Resource '{entry.name}' evicted from the model registry.")
+            for dependency in entry.dependencies:
+                await self.release(dependency)
+        if evicted:
+            gc.collect()
+        if total > self.memory_budget_bytes:
+            Logger.warning(
+                f"Model registry uses {total / 1024 / 1024:.1f} MB, above the budget of"
+                f" {self.memory_budget_bytes / 1024 / 1024:.1f} MB, but every loaded resource is in use."
+            )
+
+    def metrics(self) -> Dict[str, ResourceStats]:
+        """Returns a snapshot of the per-resource load and usage metrics.
+
+        Returns:
+            Dict[str, ResourceStats]: The metrics keyed by resource name.
+        """
+
+        with self._lock:
+            return {
+                name: entry.stats.model_copy(update={"loaded": entry.loaded})
+                for name, entry in self._entries.items()
+            }
@@ -1,71 +1,273 @@
-from typing import List
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
 
 import numpy as np
 import torch
 from sentence_transformers import CrossEncoder
 
-from chatbot.config import CROSS_ENCODER, HF_CACHE_DIR, NUM_RETRIEVE_DOCUMENTS
+from chatbot.config import (
+    CROSS_ENCODER,
+    HF_CACHE_DIR,
+    NUM_RETRIEVE_DOCUMENTS,
+    RERANK_BACKEND,
+    RERANK_BATCH_SIZE,
+    RERANK_CACHE_MAX_ENTRIES,
+    RERANK_DEVICE,
+    RERANK_SCORE_THRESHOLD,
+)
+from chatbot.utils.data_models import RerankStats
 from chatbot.utils.logging_config import configure_logging
 
 Logger = configure_logging()
 
+RERANK_BACKENDS = ("torch", "quantized", "onnx")
+
+
+def hash_document(document: str) -> str:
+    """Hashes a chunk's content into a score cache key."""
+
+    return hashlib.blake2b(document.encode(), digest_size=16).hexdigest()
+
+
+def select_device() -> str:
+    """Returns the fastest available torch device: mps, cuda or cpu."""
+
+    if torch.backends.mps.is_available():
+        return "mps"
+    if torch.cuda.is_available():
+        return "cuda"
+    return "cpu"
+
 
 class Reranker:
-    def __init__(self, model_name: str | None = None):
+    def __init__(
+        self,
+        model_name: str | None = None,
+        backend: str | None = None,
+        device: str | None = None,
+        batch_size: int | None = None,
+        cache_max_entries: int | None = None,
+    ):
         """Initializes an Reranker instance.
 
         Args:
             model_name (str | None, optional): The name of the cross encoder model. Defaults to None.
+            backend (str | None, optional): "torch", "quantized" or "onnx". Defaults to RERANK_BACKEND.
+            device (str | None, optional): The torch device of the "torch" backend.
+                Defaults to RERANK_DEVICE, or the fastest available device.
+            batch_size (int | None, optional): Pairs scored per forward pass. Defaults to RERANK_BATCH_SIZE.
+            cache_max_entries (int | None, optional): Capacity of the score cache. Defaults to RERANK_CACHE_MAX_ENTRIES.
 
         Raises:
+            ValueError: If the backend is unknown.
+            ImportError: If the "onnx" backend is requested without optimum[onnxruntime] installed.
             OSError: If the model or tokenizer cannot be loaded.
         """
 
         if not model_name:
             model_name = CROSS_ENCODER
+        self.backend = backend or RERANK_BACKEND
+        if self.backend not in RERANK_BACKENDS:
+            raise ValueError(
+                f"Unknown reranking backend '{self.backend}', expected one of {RERANK_BACKENDS}."
+            )
+        self.batch_size = batch_size or RERANK_BATCH_SIZE
+        self.cache_max_entries = cache_max_entries or RERANK_CACHE_MAX_ENTRIES
 
-        if torch.backends.mps.is_available():
-            device = "mps"
-        elif torch.cuda.is_available():
-            device = "cuda"
-        else:
-            device = "cpu"
+        self.stats = RerankStats()
+        self._scores: OrderedDict[Tuple[str, str], float] = OrderedDict()
+        self._lock = threading.Lock()
 
+        self.cross_encoder: CrossEncoder | None = None
+        self._onnx_model: Any = None
+        self._tokenizer: Any = None
         try:
-            self.cross_encoder = CrossEncoder(
-                model_name=model_name, cache_dir=HF_CACHE_DIR, device=device
-            )
+            if self.backend == "onnx":
+                self._load_onnx(model_name)
+            else:
+                if self.backend == "quantized":
+                    device = "cpu"
+                self.cross_encoder = CrossEncoder(
+                    model_name=model_name,
+                    cache_dir=HF_CACHE_DIR,
+                    device=device or RERANK_DEVICE or select_device(),
+                )
+                if self.backend == "quantized":
+                    #* int8 weights for the linear layers, activations are quantized on the fly
+                    self.cross_encoder.model = torch.ao.quantization.quantize_dynamic(
+                        self.cross_encoder.model, {torch.nn.Linear}, dtype=torch.qint8
+                    )
             Logger.info(
-                f"CrossEncoder loaded successfully from {model_name}"
+                f"CrossEncoder loaded successfully from {model_name} ({self.backend} backend)"
             )
         except (OSError, FileNotFoundError) as e:
             Logger.error(f"Error loading CrossEncoder model: {e}")
             raise
 
+    def _load_onnx(self, model_name: str) -> None:
+        try:
+            from optimum.onnxruntime import ORTModelForSequenceClassification
+        except ImportError as e:
+            raise ImportError(
+                "The onnx reranking backend requires optimum[onnxruntime] to be installed."
+            ) from e
+        from transformers import AutoTokenizer
+
+        self._tokenizer = AutoTokenizer.from_pretrained(model_name, cache_dir=HF_CACHE_DIR)
+        self._onnx_model = ORTModelForSequenceClassification.from_pretrained(
+            model_name, export=True, cache_dir=HF_CACHE_DIR
+        )
+
+    @property
+    def torch_model(self) -> torch.nn.Module | None:
+        """The torch module scoring the pairs, None for the onnx backend."""
+
+        return self.cross_encoder.model if self.cross_encoder is not None else None
+
+    def _predict(self, pairs: List[List[str]]) -> List[float]:
+        """Scores pairs in batches, blocking. Scores are in [0, 1], like CrossEncoder.predict()."""
+
+        start = time.perf_counter()
+        if self.cross_encoder is not None:
+            scores = self.cross_encoder.predict(
+                pairs, batch_size=self.batch_size, show_progress_bar=False
+            ).tolist()
+        else:
+            scores = []
+            for batch_start in range(0, len(pairs), self.batch_size):
+                batch = pairs[batch_start : batch_start + self.batch_size]
+                features = self._tokenizer(
+                    [query for query, _ in batch],
+                    [document for _, document in batch],
+                    padding=True,
+                    truncation="longest_first",
+                    return_tensors="pt",
+                )
+                with torch.inference_mode():
+                    logits = self._onnx_model(**features).logits
+                scores += torch.sigmoid(logits[:, 0]).tolist()
+
+        with self._lock:
+            self.stats.batches += -(-len(pairs) // self.batch_size)
+            self.stats.predict_seconds += time.perf_counter() - start
+        return scores
+
+    async def score(self, query: str, documents: List[str]) -> List[float]:
+        """Scores the relevance of every document to the query, reusing cached scores.
+
+        Args:
+            query (str): The search query.
+            documents (List[str]): The documents to score.
+
+        Returns:
+            List[float]: The score of every document, in the order of the documents.
+        """
+
+        keys = [(query, hash_document(document)) for document in documents]
+        scores: Dict[Tuple[str, str], float] = {}
+        missing: Dict[Tuple[str, str], str] = {}
+        with self._lock:
+            for key, document in zip(keys, documents):
+                if key in self._scores:
+                    self._scores.move_to_end(key)
+                    scores[key] = self._scores[key]
+                    self.stats.hits += 1
+                elif key not in missing:
+                    missing[key] = document
+                    self.stats.misses += 1
+
+        if missing:
+            #* CrossEncoder.predict() is blocking, run it off the event loop
+            predicted = await asyncio.to_thread(
+                self._predict, [[query, document] for document in missing.values()]
+            )
+            scores.update(zip(missing, predicted))
+            with self._lock:
+                for key, value in zip(missing, predicted):
+                    self._scores[key] = value
+                    self._scores.move_to_end(key)
+                while len(self._scores) > self.cache_max_entries:
+                    self._scores.popitem(last=False)
+                    self.stats.evictions += 1
+                self.stats.entries = len(self._scores)
+
+        return [scores[key] for key in keys]
+
+    async def rerank_with_scores(
+        self,
+        query: str,
+        documents: List[str],
+        num_retrieve_documents: int | None = None,
+        score_threshold: float | None = RERANK_SCORE_THRESHOLD,
+    ) -> List[Tuple[str, float]]:
+        """Returns the most relevant documents to the query with their scores, best first.
+
+        Args:
+            query (str): The search query.
+            documents (List[str]): A list of documents to rerank.
+            num_retrieve_documents (int | None, optional): The number of documents to keep. Defaults to NUM_RETRIEVE_DOCUMENTS.
+            score_threshold (float | None, optional): Documents scoring below it are dropped, except the best one.
+                Defaults to RERANK_SCORE_THRESHOLD.
+
+        Returns:
+            List[Tuple[str, float]]: The kept documents and their scores, sorted by score in descending order.
+        """
+
+        if not documents:
+            return []
+        if not num_retrieve_documents:
+            num_retrieve_documents = NUM_RETRIEVE_DOCUMENTS
+
+        scores = await self.score(query, documents)
+        # Get the indices of the documents sorted by score in descending order
+        sorted_indices = np.argsort(scores, kind="stable")[::-1][:num_retrieve_documents]
+
+        ranked = [(documents[i], scores[i]) for i in sorted_indices]
+        if score_threshold is not None:
+            kept = ranked[:1] + [pair for pair in ranked[1:] if pair[1] >= score_threshold]
+            with self._lock:
+                self.stats.dropped += len(ranked) - len(kept)
+            ranked = kept
+        Logger.info("Documents have been reranked by their relevance to the query.")
+        return ranked
+
     async def rerank(
         self,
         query: str,
         documents: List[str],
         num_retrieve_documents: int | None = None,
+        score_threshold: float | None = RERANK_SCORE_THRESHOLD,
     ) -> List[str]:
         """Returns the most relevant documents to the query using CrossEncoder.
 
         Args:
             query: str - The search query.
             documents: List[str]- A list of documents to rerank.
+            num_retrieve_documents: int | None - The number of documents to keep, NUM_RETRIEVE_DOCUMENTS by default.
+            score_threshold: float | None - Documents scoring below it are dropped, RERANK_SCORE_THRESHOLD by default.
 
         Returns:
             List[str] - A list of the most relevant documents, limited by NUM_RETRIEVE_DOCUMENTS.
         """
-        pairs = [[query, doc] for doc in documents]
-        scores = self.cross_encoder.predict(pairs)
 
-        # Get the indices of the documents sorted by score in descending order
-        sorted_indices = np.argsort(scores)[::-1]
+        ranked = await self.rerank_with_scores(
+            query, documents, num_retrieve_documents, score_threshold
+        )
+        return [document for document, _ in ranked]
 
-        if not num_retrieve_documents:
-            num_retrieve_documents = NUM_RETRIEVE_DOCUMENTS
+    def clear(self) -> None:
+        """Removes all cached scores."""
 
-        top_indices = sorted_indices[:num_retrieve_documents]
-        Logger.info("Documents have been reranked by their relevance to the query.")
-        return [documents[i] for i in top_indices]
+        with self._lock:
+            self._scores.clear()
+            self.stats.entries = 0
+
+    def metrics(self) -> RerankStats:
+        """Returns a snapshot of the reranker metrics."""
+
+        with self._lock:
+            return self.stats.model_copy()
@@ -1,99 +1,240 @@
+import asyncio
+import time
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Tuple
 
 import chromadb
 from chromadb.api.models import Collection
+from chromadb.api.types import QueryResult
 from chromadb.utils.embedding_functions import \
     SentenceTransformerEmbeddingFunction
 
+from chatbot.answer_cache import AnswerCache
 from chatbot.config import (
+    ANSWER_CACHE_ENABLED,
     CHROMA_DB_PERSIST_DIR,
     COLLECTION_NAME,
     CONVERSATION_HISTORY_LIMIT,
     CROSS_ENCODER,
     DATA_ARTICLES_PATH,
+    EXPANSION_SKIP_MAX_DISTANCE,
     HF_LLM_MODEL_ID,
+    MODEL_REGISTRY_MEMORY_BUDGET_MB,
     NUM_RETRIEVE_DOCUMENTS
 )
 from chatbot.database import (
     create_chroma_client,
     create_embedding_function,
     get_or_create_collection,
-    load_articles,
-    populate_collection
+    sync_collection
 )
 from chatbot.llm import LLM
+from chatbot.registry import ModelRegistry, construct_model, torch_module_nbytes
 from chatbot.reranking import Reranker
+from chatbot.streaming import TokenStream
 from chatbot.utils.logging_config import configure_logging
 from chatbot.utils.filter_documents import deduplicate_documents
+from chatbot.utils.timing import time_stage, timed
 
 Logger = configure_logging()
 
+#* Resources every chat session holds a reference to
+SESSION_RESOURCES = ("collection", "llm", "reranker", "answer_cache")
 
-async def prepare_user_session() -> Tuple[chromadb.api.models.Collection, LLM, Reranker]:
-    """Prepares the user session by loading resources and setting up the chatbot.
 
-    Returns:
-        Tuple[chromadb.api.models.Collection, LLM]: A tuple containing the ChromaDB collection and the LLM instance.
-    """
+async def _load_chroma_client() -> chromadb.PersistentClient:
+    return await create_chroma_client(persist_directory=CHROMA_DB_PERSIST_DIR)
 
-    client = await create_chroma_client(persist_directory=CHROMA_DB_PERSIST_DIR)
-    embedding_function: SentenceTransformerEmbeddingFunction = (
-        await create_embedding_function()
-    )
+
+async def _load_collection(
+    chroma_client: chromadb.PersistentClient,
+    embedding_function: SentenceTransformerEmbeddingFunction,
+) -> Collection:
     collection = await get_or_create_collection(
-        client=client,
+        client=chroma_client,
         collection_name=COLLECTION_NAME,
         embedding_function=embedding_function,
     )
-    if collection.count() == 0:
-        articles = await load_articles(Path(DATA_ARTICLES_PATH))
-        await populate_collection(collection=collection, articles=articles)
+    #* Only new, changed or removed PDFs are processed, and the collection version is bumped only when something changed
+    await sync_collection(collection, Path(DATA_ARTICLES_PATH))
+    return collection
 
-    llm = LLM(HF_LLM_MODEL_ID)
-    reranker = Reranker(CROSS_ENCODER)
-    return collection, llm, reranker
 
+async def _load_llm() -> LLM:
+    return await construct_model(LLM, HF_LLM_MODEL_ID)
 
-async def perform_rag(
+
+async def _load_reranker() -> Reranker:
+    return await construct_model(Reranker, CROSS_ENCODER)
+
+
+async def _load_answer_cache(
+    embedding_function: SentenceTransformerEmbeddingFunction, collection: Collection
+) -> AnswerCache | None:
+    #* Depends on the collection, so a repopulation bumps the collection version before the cache is read
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    return await asyncio.to_thread(AnswerCache, embedding_function)
+
+
+model_registry = ModelRegistry(memory_budget_mb=MODEL_REGISTRY_MEMORY_BUDGET_MB)
+model_registry.register("chroma_client", _load_chroma_client)
+model_registry.register(
+    "embedding_function",
+    create_embedding_function,
+    size_function=lambda function: torch_module_nbytes(getattr(function, "_model", None)),
+)
+model_registry.register(
+    "collection",
+    _load_collection,
+    dependencies=("chroma_client", "embedding_function"),
+)
+model_registry.register(
+    "llm", _load_llm, size_function=lambda llm: torch_module_nbytes(llm.model)
+)
+model_registry.register(
+    "reranker",
+    _load_reranker,
+    size_function=lambda reranker: torch_module_nbytes(reranker.torch_model),
+)
+model_registry.register(
+    "answer_cache",
+    _load_answer_cache,
+    dependencies=("embedding_function", "collection"),
+)
+
+
+async def warm_up_models() -> None:
+    """Loads all shared models and clients, so that the first chat session does not wait for them."""
+
+    await model_registry.warm_up()
+
+
+async def prepare_user_session() -> Tuple[
+    chromadb.api.models.Collection, LLM, Reranker, AnswerCache | None
+]:
+    """Prepares the user session by acquiring the shared resources from the model registry.
+
+    Resources are loaded only by the first session (or the warm-up), later sessions reuse them.
+    Every call must be paired with release_user_session() when the chat ends.
+
+    Returns:
+        Tuple[chromadb.api.models.Collection, LLM, Reranker, AnswerCache | None]: A tuple containing
+            the ChromaDB collection, the LLM instance, the reranker and the answer cache (None if disabled).
+    """
+
+    resources = await asyncio.gather(
+        *(model_registry.acquire(name) for name in SESSION_RESOURCES),
+        return_exceptions=True,
+    )
+    errors = [resource for resource in resources if isinstance(resource, BaseException)]
+    if errors:
+        for name, resource in zip(SESSION_RESOURCES, resources):
+            if not isinstance(resource, BaseException):
+                await model_registry.release(name)
+        raise errors[0]
+
+    collection, llm, reranker, answer_cache = resources
+    return collection, llm, reranker, answer_cache
+
+
+async def release_user_session() -> None:
+    """Releases the shared resources acquired by prepare_user_session()."""
+
+    for name in SESSION_RESOURCES:
+        await model_registry.release(name)
+
+
+async def query_collection(
+    collection: Collection, query_texts: List[str]
+) -> QueryResult:
+    """Queries the ChromaDB collection in a worker thread, so embedding the queries does not block the event loop.
+
+    Args:
+        collection (Collection): The ChromaDB collection.
+        query_texts (List[str]): The queries.
+
+    Returns:
+        QueryResult: The documents, metadatas and distances of the closest chunks, per query.
+    """
+
+    return await asyncio.to_thread(
+        collection.query,
+        query_texts=query_texts,
+        n_results=NUM_RETRIEVE_DOCUMENTS,
+        include=["documents", "metadatas", "distances"],
+    )
+
+
+async def retrieve_context(
     query: str,
     collection: Collection,
-    conversation_history: List[Dict[str, str]],
     llm: LLM,
     reranker: Reranker,
-) -> Tuple[str, List[str]]:
-    """Performs RAG (Retrieval Augmented Generation) to answer a user's query.
+    timings: Dict[str, float] | None = None,
+) -> Tuple[List[str], List[str]]:
+    """Retrieves and reranks the documents relevant to a user's query.
+
+    Retrieval for the original query runs while the LLM expands it into related questions,
+    the chunks found for the expanded questions are merged in afterwards.
 
     Args:
         query (str): The user's query.
         collection (Collection): The ChromaDB collection.
-        conversation_history (List[Dict[str, str]]): The conversation history.
-        llm (LLM): The language model instance.
+        llm (LLM): The language model instance, used for query expansion.
+        reranker (Reranker): The reranker instance.
+        timings (Dict[str, float] | None, optional): Filled with the latency of every stage in seconds. Defaults to None.
 
     Returns:
-        Tuple[str, List[str]]: A tuple containing the answer and a list of URLs of retrieved documents.
+        Tuple[List[str], List[str]]: A tuple containing the reranked documents and the titles of retrieved articles.
     """
 
+    if timings is None:
+        timings = {}
+    start = time.perf_counter()
+
     Logger.info("Fetching documents for RAG")
-    # Generate multiple query variations to improve retrieval
-    query_texts = [query]
-    expanded_query = await llm.expand_querry_question(query)
-    if expanded_query:
-        query_texts.extend(expanded_query)
-    
-    # Add query processing and caching
-    results = collection.query(
-        query_texts=query_texts,
-        n_results=NUM_RETRIEVE_DOCUMENTS,
-        include=["documents", "metadatas"]
+    # Generate multiple query variations to improve retrieval, while the original query is already searched for
+    expansion = asyncio.create_task(
+        timed(llm.expand_querry_question(query), timings, "expansion")
     )
-    
+    try:
+        results = await timed(query_collection(collection, [query]), timings, "retrieval")
+        distances = [distance for sublist in results["distances"] for distance in sublist]
+        if (
+            EXPANSION_SKIP_MAX_DISTANCE is not None
+            and distances
+            and min(distances) <= EXPANSION_SKIP_MAX_DISTANCE
+        ):
+            Logger.info("First-pass retrieval is close enough, skipping query expansion.")
+            expansion.cancel()
+            expanded_query = []
+        else:
+            expanded_query = await expansion
+    except BaseException:
+        expansion.cancel()
+        raise
+
+    expanded_query_texts = [
+        text.strip()
+        for text in expanded_query
+        if text.strip() and text.strip() != query
+    ]
+    if expanded_query_texts:
+        expanded_results = await timed(
+            query_collection(collection, expanded_query_texts),
+            timings,
+            "expanded_retrieval",
+        )
+        results["documents"] += expanded_results["documents"]
+        results["metadatas"] += expanded_results["metadatas"]
+
     # Flatten and deduplicate documents from multiple queries
     all_documents = [doc for sublist in results["documents"] for doc in sublist]
-    documents = await deduplicate_documents(all_documents)
+    documents = await timed(deduplicate_documents(all_documents), timings, "deduplication")
     
     # Rerank documents for better relevance
-    documents = await reranker.rerank(query, documents)
+    documents = await timed(reranker.rerank(query, documents), timings, "reranking")
     
     # Extract titles from metadata instead of URLs
     titles = []
@@ -102,14 +243,195 @@ async def perform_rag(
             if metadata.get("title") and metadata.get("title") not in titles:
                 titles.append(metadata.get("title"))
 
-    Logger.info(f"Performing RAG for query:\n{query}")
-    answer = await llm.rag(
-        query=query, documents=documents, conversation_history=conversation_history
+    timings["retrieve_context"] = time.perf_counter() - start
+    Logger.info(
+        "Retrieval stage latency: "
+        + ", ".join(f"{stage} {seconds:.3f} s" for stage, seconds in timings.items())
     )
+    return documents, titles
+
+
+def add_answer_to_history(
+    conversation_history: List[Dict[str, str]], answer: str
+) -> None:
+    """Appends the assistant's answer to the conversation history, keeping it within the limit.
+
+    Args:
+        conversation_history (List[Dict[str, str]]): The conversation history.
+        answer (str): The assistant's answer.
+    """
 
     llm_response = {"role": "assistant", "content": answer}
     conversation_history.append(llm_response)
     while len(conversation_history) > CONVERSATION_HISTORY_LIMIT:
         conversation_history.pop(0)
 
-    return answer, titles
\ No newline at end of file
+
+async def perform_rag(
+    query: str,
+    collection: Collection,
+    conversation_history: List[Dict[str, str]],
+    llm: LLM,
+    reranker: Reranker,
+    timings: Dict[str, float] | None = None,
+    answer_cache: AnswerCache | None = None,
+) -> Tuple[str, List[str]]:
+    """Performs RAG (Retrieval Augmented Generation) to answer a user's query.
+
+    Args:
+        query (str): The user's query.
+        collection (Collection): The ChromaDB collection.
+        conversation_history (List[Dict[str, str]]): The conversation history.
+        llm (LLM): The language model instance.
+        reranker (Reranker): The reranker instance.
+        timings (Dict[str, float] | None, optional): Filled with the latency of every stage in seconds. Defaults to None.
+        answer_cache (AnswerCache | None, optional): Answers similar earlier queries from the cache. Defaults to None.
+
+    Returns:
+        Tuple[str, List[str]]: A tuple containing the answer and a list of URLs of retrieved documents.
+    """
+
+    embedding = None
+    if answer_cache is not None:
+        with time_stage(timings, "answer_cache"):
+            embedding = await answer_cache.embed(query)
+            cached = answer_cache.lookup(embedding)
+        if cached is not None:
+            answer, titles = cached
+            add_answer_to_history(conversation_history, answer)
+            return answer, titles
+
+    documents, titles = await retrieve_context(
+        query, collection, llm, reranker, timings
+    )
+
+    Logger.info(f"Performing RAG for query:\n{query}")
+    with time_stage(timings, "generation"):
+        answer = await llm.rag(
+            query=query, documents=documents, conversation_history=conversation_history
+        )
+
+    if answer_cache is not None:
+        await answer_cache.store(query, embedding, answer, titles)
+    add_answer_to_history(conversation_history, answer)
+    return answer, titles
+
+
+async def _replay(answer: str) -> AsyncIterator[str]:
+    yield answer
+
+
+async def stream_rag(
+    query: str,
+    collection: Collection,
+    conversation_history: List[Dict[str, str]],
+    llm: LLM,
+    reranker: Reranker,
+    timings: Dict[str, float] | None = None,
+    answer_cache: AnswerCache | None = None,
+) -> Tuple[TokenStream, List[str]]:
+    """Performs RAG like perform_rag(), but returns the answer as a stream of text pieces.
+
+    The caller adds the streamed answer to the conversation history with add_answer_to_history(),
+    once it has consumed the stream (answer_turn() does both).
+
+    Args:
+        query (str): The user's query.
+        collection (Collection): The ChromaDB collection.
+        conversation_history (List[Dict[str, str]]): The conversation history.
+        llm (LLM): The language model instance.
+        reranker (Reranker): The reranker instance.
+        timings (Dict[str, float] | None, optional): Filled with the latency of every retrieval stage in seconds.
+            The generation latency is measured by the stream itself. Defaults to None.
+        answer_cache (AnswerCache | None, optional): Answers similar earlier queries from the cache.
+            A fully streamed answer is added to it. Defaults to None.
+
+    Returns:
+        Tuple[TokenStream, List[str]]: A tuple containing the answer stream and the titles of retrieved articles.
+    """
+
+    embedding = None
+    if answer_cache is not None:
+        with time_stage(timings, "answer_cache"):
+            embedding = await answer_cache.embed(query)
+            cached = answer_cache.lookup(embedding)
+        if cached is not None:
+            answer, titles = cached
+            return TokenStream(_replay(answer)), titles
+
+    documents, titles = await retrieve_context(
+        query, collection, llm, reranker, timings
+    )
+
+    Logger.info(f"Streaming RAG answer for query:\n{query}")
+    stream = llm.stream_rag(
+        query=query, documents=documents, conversation_history=conversation_history
+    )
+    if answer_cache is not None:
+        stream.on_complete(
+            lambda answer: answer_cache.store(query, embedding, answer, titles)
+        )
+    return stream, titles
+
+
+async def answer_turn(
+    query: str,
+    collection: Collection,
+    conversation_history: List[Dict[str, str]],
+    llm: LLM,
+    reranker: Reranker,
+    on_piece: Callable[[str], Awaitable[None]],
+    timings: Dict[str, float] | None = None,
+    answer_cache: AnswerCache | None = None,
+) -> Tuple[TokenStream, List[str]]:
+    """Answers one user message: adds it to the history, streams the answer and adds the answer after it.
+
+    An answer cancelled while streaming is added as far as it got, right after its question.
+    A turn cancelled before any answer text is removed from the history,
+    so user and assistant messages keep alternating.
+
+    Args:
+        query (str): The user's query.
+        collection (Collection): The ChromaDB collection.
+        conversation_history (List[Dict[str, str]]): The conversation history.
+        llm (LLM): The language model instance.
+        reranker (Reranker): The reranker instance.
+        on_piece (Callable[[str], Awaitable[None]]): Called with every streamed text piece.
+        timings (Dict[str, float] | None, optional): Filled like in stream_rag(). Defaults to None.
+        answer_cache (AnswerCache | None, optional): Like in stream_rag(). Defaults to None.
+
+    Returns:
+        Tuple[TokenStream, List[str]]: The consumed answer stream and the titles of retrieved articles.
+    """
+
+    user_message = {"role": "user", "content": query}
+    conversation_history.append(user_message)
+    stream = None
+    try:
+        stream, titles = await stream_rag(
+            query, collection, conversation_history, llm, reranker, timings, answer_cache
+        )
+        async for piece in stream:
+            await on_piece(piece)
+    finally:
+        if stream is not None:
+            await stream.aclose()
+        if stream is not None and stream.text:
+            add_answer_to_history(conversation_history, stream.text)
+        elif conversation_history and conversation_history[-1] is user_message:
+            conversation_history.pop()
+    return stream, titles
+
+
+async def cancel_answer(answer_task: asyncio.Task) -> None:
+    """Cancels a running answer_turn() task and waits until it stopped.
+
+    Its partial answer is then in the conversation history before the next user message is added.
+
+    Args:
+        answer_task (asyncio.Task): The task answering the previous user message.
+    """
+
+    answer_task.cancel()
+    #* asyncio.wait() returns once the task is done, without raising the task's CancelledError
+    await asyncio.wait([answer_task])
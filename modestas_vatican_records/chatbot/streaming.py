@@ -0,0 +1,101 @@
+import time
+from typing import AsyncIterator, Awaitable, Callable, List
+
+from chatbot.utils.data_models import StreamMetrics
+from chatbot.utils.logging_config import configure_logging
+
+Logger = configure_logging()
+
+
+class TokenStream:
+    """Async iterator over the text pieces of a generation, measuring its latency.
+
+    The time to first token is measured from the creation of the stream,
+    so it includes queueing and prefill time.
+    """
+
+    def __init__(self, pieces: AsyncIterator[str]):
+        """Initializes a TokenStream instance.
+
+        Args:
+            pieces (AsyncIterator[str]): The decoded text pieces, in generation order.
+        """
+
+        self._pieces = pieces
+        self._parts: List[str] = []
+        self._start = time.perf_counter()
+        self._last: float | None = None
+        self._inter_token_seconds = 0.0
+        self._finished = False
+        self._on_complete: List[Callable[[str], Awaitable[None]]] = []
+        self.metrics = StreamMetrics()
+
+    def on_complete(self, callback: Callable[[str], Awaitable[None]]) -> None:
+        """Registers a coroutine function called with the full text once the generation finished normally.
+
+        Args:
+            callback (Callable[[str], Awaitable[None]]): The callback, not called if the stream is cancelled.
+        """
+
+        self._on_complete.append(callback)
+
+    @property
+    def text(self) -> str:
+        """The text streamed so far."""
+
+        return "".join(self._parts)
+
+    def __aiter__(self) -> "TokenStream":
+        return self
+
+    async def __anext__(self) -> str:
+        try:
+            piece = await self._pieces.__anext__()
+        except StopAsyncIteration:
+            self._finish(cancelled=False)
+            for callback in self._on_complete:
+                await callback(self.text)
+            raise
+        except BaseException:
+            self._finish(cancelled=True)
+            raise
+
+        now = time.perf_counter()
+        if self._last is None:
+            self.metrics.time_to_first_token_seconds = now - self._start
+        else:
+            gap = now - self._last
+            self._inter_token_seconds += gap
+            self.metrics.max_inter_token_seconds = max(
+                gap, self.metrics.max_inter_token_seconds or 0.0
+            )
+        self._last = now
+        self.metrics.tokens += 1
+        self._parts.append(piece)
+        return piece
+
+    async def aclose(self) -> None:
+        """Stops the generation, if it is still running."""
+
+        if not self._finished:
+            await self._pieces.aclose()
+            self._finish(cancelled=True)
+
+    def _finish(self, cancelled: bool) -> None:
+        if self._finished:
+            return
+        self._finished = True
+        self.metrics.cancelled = cancelled
+        self.metrics.total_seconds = time.perf_counter() - self._start
+        if self.metrics.tokens > 1:
+            self.metrics.mean_inter_token_seconds = self._inter_token_seconds / (
+                self.metrics.tokens - 1
+            )
+        ttft = self.metrics.time_to_first_token_seconds
+        itl = self.metrics.mean_inter_token_seconds
+        Logger.info(
+            f"Stream {'cancelled' if cancelled else 'finished'}: {self.metrics.tokens} tokens"
+            f" in {self.metrics.total_seconds:.2f} s, time to first token "
+            f"{f'{ttft:.3f} s' if ttft is not None else '-'}, mean inter-token latency "
+            f"{f'{itl * 1000:.1f} ms' if itl is not None else '-'}."
+        )
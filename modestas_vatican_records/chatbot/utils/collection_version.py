@@ -0,0 +1,40 @@
+import uuid
+from pathlib import Path
+
+from chatbot.utils.logging_config import configure_logging
+
+Logger = configure_logging()
+
+
+def write_collection_version(version_path: str | Path) -> str:
+    """Marks the collection content as changed, by writing a new random version next to the database.
+
+    Args:
+        version_path (str | Path): The path of the version file.
+
+    Returns:
+        str: The new version.
+    """
+
+    version = uuid.uuid4().hex
+    version_path = Path(version_path)
+    version_path.parent.mkdir(parents=True, exist_ok=True)
+    version_path.write_text(version)
+    Logger.info(f"Collection version updated to {version}.")
+    return version
+
+
+def read_collection_version(version_path: str | Path) -> str | None:
+    """Reads the current collection version.
+
+    Args:
+        version_path (str | Path): The path of the version file.
+
+    Returns:
+        str | None: The version, or None if the collection was never populated by this application.
+    """
+
+    try:
+        return Path(version_path).read_text().strip()
+    except FileNotFoundError:
+        return None
@@ -1,3 +1,5 @@
+from typing import Dict, List
+
 from pydantic import BaseModel
 
 
@@ -6,3 +8,181 @@ class Article(BaseModel):
 
     title: str
     body: str
+
+
+class ResourceStats(BaseModel):
+    """Load and usage metrics of a shared model registry resource"""
+
+    name: str
+    loaded: bool = False
+    ref_count: int = 0
+    loads: int = 0
+    hits: int = 0
+    evictions: int = 0
+    load_seconds: float = 0.0
+    size_bytes: int = 0
+
+
+class GenerationStats(BaseModel):
+    """Throughput metrics of the continuous batching generation engine"""
+
+    requests: int = 0
+    active_requests: int = 0
+    completed: int = 0
+    failed: int = 0
+    rejected: int = 0
+    generated_tokens: int = 0
+    decode_steps: int = 0
+    batched_sequences: int = 0
+    queue_wait_seconds: float = 0.0
+    busy_seconds: float = 0.0
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.batched_sequences / self.decode_steps if self.decode_steps else 0.0
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.generated_tokens / self.busy_seconds if self.busy_seconds else 0.0
+
+
+class StreamMetrics(BaseModel):
+    """Latency metrics of a single streamed generation"""
+
+    tokens: int = 0
+    time_to_first_token_seconds: float | None = None
+    mean_inter_token_seconds: float | None = None
+    max_inter_token_seconds: float | None = None
+    total_seconds: float = 0.0
+    cancelled: bool = False
+
+
+class PrefixCacheStats(BaseModel):
+    """Hit/miss metrics of the prompt prefix KV-cache"""
+
+    hits: int = 0
+    misses: int = 0
+    reused_tokens: int = 0
+    prefilled_tokens: int = 0
+    prefill_seconds: float = 0.0
+    entries: int = 0
+    size_bytes: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    @property
+    def prefill_seconds_saved(self) -> float:
+        """Estimated from the average prefill time per token of the tokens that were prefilled."""
+
+        if not self.prefilled_tokens:
+            return 0.0
+        return self.reused_tokens * self.prefill_seconds / self.prefilled_tokens
+
+
+class CachedAnswer(BaseModel):
+    """An answer stored in the semantic answer cache"""
+
+    query: str
+    embedding: List[float]
+    answer: str
+    titles: List[str]
+    created_at: float
+    last_used: float
+
+
+class AnswerCacheStats(BaseModel):
+    """Hit-rate metrics of the semantic answer cache"""
+
+    hits: int = 0
+    misses: int = 0
+    expired: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+    entries: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class RerankStats(BaseModel):
+    """Cache and throughput metrics of the cross-encoder reranker"""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    entries: int = 0
+    #* Candidates below the score threshold that were kept out of the RAG prompt
+    dropped: int = 0
+    batches: int = 0
+    predict_seconds: float = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    @property
+    def pairs_per_second(self) -> float:
+        return self.misses / self.predict_seconds if self.predict_seconds else 0.0
+
+
+class ContextPackStats(BaseModel):
+    """Token counts of a RAG prompt's context before and after packing it into the token budget"""
+
+    document_tokens_before: int = 0
+    document_tokens_after: int = 0
+    history_tokens_before: int = 0
+    history_tokens_after: int = 0
+    documents_dropped: int = 0
+    messages_trimmed: int = 0
+    overlap_chars_removed: int = 0
+
+    @property
+    def tokens_before(self) -> int:
+        return self.document_tokens_before + self.history_tokens_before
+
+    @property
+    def tokens_after(self) -> int:
+        return self.document_tokens_after + self.history_tokens_after
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+
+class IngestionStats(BaseModel):
+    """Outcome and per-stage throughput of a PDF ingestion run"""
+
+    files_added: int = 0
+    files_changed: int = 0
+    files_removed: int = 0
+    files_unchanged: int = 0
+    files_failed: int = 0
+    pages_extracted: int = 0
+    chunks_added: int = 0
+    chunks_deleted: int = 0
+    #* Wall time per stage: hashing, deletion, extraction, embedding (incl. chunking and upsert),
+    #* plus the summed chunking and worker_extract (per PDF, in the worker processes) times
+    stage_seconds: Dict[str, float] = {}
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.files_added or self.files_changed or self.files_removed)
+
+    def summary(self) -> str:
+        extraction = self.stage_seconds.get("extraction", 0.0)
+        embedding = self.stage_seconds.get("embedding", 0.0)
+        return (
+            f"{self.files_added} added, {self.files_changed} changed, {self.files_removed} removed,"
+            f" {self.files_unchanged} unchanged, {self.files_failed} failed PDFs;"
+            f" {self.chunks_added} chunks upserted, {self.chunks_deleted} deleted;"
+            f" extraction {self.pages_extracted / extraction if extraction else 0:.1f} pages/s,"
+            f" embedding {self.chunks_added / embedding if embedding else 0:.1f} chunks/s;"
+            f" stages: " + ", ".join(f"{stage} {seconds:.2f} s" for stage, seconds in self.stage_seconds.items())
+        )
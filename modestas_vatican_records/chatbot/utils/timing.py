@@ -0,0 +1,40 @@
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Dict, Iterator, TypeVar
+
+T = TypeVar("T")
+
+
+@contextmanager
+def time_stage(timings: Dict[str, float] | None, stage: str) -> Iterator[None]:
+    """Adds the wall time spent inside the block to timings[stage].
+
+    Args:
+        timings (Dict[str, float] | None): The per-stage timings in seconds. Nothing is recorded if None.
+        stage (str): The name of the stage.
+    """
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+
+async def timed(
+    awaitable: Awaitable[T], timings: Dict[str, float] | None, stage: str
+) -> T:
+    """Awaits the awaitable, adding its wall time to timings[stage]. Useful for stages started as tasks.
+
+    Args:
+        awaitable (Awaitable[T]): The stage to await.
+        timings (Dict[str, float] | None): The per-stage timings in seconds. Nothing is recorded if None.
+        stage (str): The name of the stage.
+
+    Returns:
+        T: The result of the awaitable.
+    """
+
+    with time_stage(timings, stage):
+        return await awaitable
@@ -0,0 +1,88 @@
+import asyncio
+from pathlib import Path
+from typing import List
+
+from chatbot.answer_cache import AnswerCache
+from chatbot.utils.collection_version import write_collection_version
+
+VECTORS = {
+    "how do i connect to the vpn?": [1.0, 0.0, 0.0],
+    "how can i connect to the vpn?": [0.99, 0.05, 0.0],
+    "what is a proxy?": [0.0, 1.0, 0.0],
+}
+
+
+def embedding_function(texts: List[str]) -> List[List[float]]:
+    return [VECTORS[text] for text in texts]
+
+
+def make_cache(directory: Path, **kwargs) -> AnswerCache:
+    return AnswerCache(
+        embedding_function,
+        path=directory / "answer_cache.json",
+        version_path=directory / "collection.version",
+        similarity_threshold=0.95,
+        **kwargs,
+    )
+
+
+async def async_test_similar_query_hits_and_survives_restart(directory: Path) -> None:
+    """A paraphrased query gets the cached answer, also from a new cache instance reading the file."""
+
+    write_collection_version(directory / "collection.version")
+    cache = make_cache(directory)
+    embedding = await cache.embed("how do i connect to the vpn?")
+    assert cache.lookup(embedding) is None
+    await cache.store("how do i connect to the vpn?", embedding, "Open the app.", ["vpn_setup"])
+
+    restarted = make_cache(directory)
+    assert restarted.lookup(await restarted.embed("how can i connect to the vpn?")) == (
+        "Open the app.",
+        ["vpn_setup"],
+    )
+    assert restarted.lookup(await restarted.embed("what is a proxy?")) is None
+    stats = restarted.metrics()
+    assert stats.hits == 1 and stats.misses == 1 and stats.hit_rate == 0.5
+
+
+async def async_test_repopulated_collection_invalidates_entries(directory: Path) -> None:
+    """Answers cached for an older collection version are never served."""
+
+    write_collection_version(directory / "collection.version")
+    cache = make_cache(directory)
+    embedding = await cache.embed("how do i connect to the vpn?")
+    await cache.store("how do i connect to the vpn?", embedding, "Open the app.", [])
+
+    write_collection_version(directory / "collection.version")
+
+    assert cache.lookup(embedding) is None
+    assert cache.metrics().invalidations == 1
+    assert make_cache(directory).metrics().entries == 0
+
+
+async def async_test_expired_and_evicted_entries(directory: Path) -> None:
+    """Entries older than the TTL are dropped, and the least recently used go above the max entries."""
+
+    cache = make_cache(directory, ttl_seconds=0, max_entries=1)
+    vpn = await cache.embed("how do i connect to the vpn?")
+    proxy = await cache.embed("what is a proxy?")
+    await cache.store("how do i connect to the vpn?", vpn, "Open the app.", [])
+    await cache.store("what is a proxy?", proxy, "A server in between.", [])
+    await asyncio.sleep(0.01)
+
+    assert cache.lookup(vpn) is None
+    assert cache.lookup(proxy) is None
+    stats = cache.metrics()
+    assert stats.evictions == 1 and stats.expired == 1 and stats.entries == 0
+
+
+def test_similar_query_hits_and_survives_restart(tmp_path: Path) -> None:
+    asyncio.run(async_test_similar_query_hits_and_survives_restart(tmp_path))
+
+
+def test_repopulated_collection_invalidates_entries(tmp_path: Path) -> None:
+    asyncio.run(async_test_repopulated_collection_invalidates_entries(tmp_path))
+
+
+def test_expired_and_evicted_entries(tmp_path: Path) -> None:
+    asyncio.run(async_test_expired_and_evicted_entries(tmp_path))
@@ -0,0 +1,174 @@
+import asyncio
+
+import torch
+from transformers import Qwen2Config, Qwen2ForCausalLM
+
+from chatbot.batching import BatchingEngine
+from chatbot.prefix_cache import PrefixCache
+from chatbot.streaming import TokenStream
+
+PAD_TOKEN_ID = 0
+EOS_TOKEN_ID = 1
+
+
+def make_tiny_model() -> Qwen2ForCausalLM:
+    """A randomly initialized, tiny Qwen2 model, so the test needs no download."""
+
+    torch.manual_seed(0)
+    config = Qwen2Config(
+        vocab_size=64,
+        hidden_size=32,
+        intermediate_size=64,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        num_key_value_heads=2,
+        max_position_embeddings=256,
+    )
+    model = Qwen2ForCausalLM(config).eval()
+    model.generation_config.do_sample = False
+    model.generation_config.repetition_penalty = 1.0
+    return model
+
+
+def reference_completion(model: Qwen2ForCausalLM, input_ids: list, max_new_tokens: int) -> list:
+    """Greedy completion of a single unpadded prompt with model.generate()."""
+
+    output = model.generate(
+        torch.tensor([input_ids]),
+        attention_mask=torch.ones((1, len(input_ids)), dtype=torch.long),
+        max_new_tokens=max_new_tokens,
+        eos_token_id=EOS_TOKEN_ID,
+        pad_token_id=PAD_TOKEN_ID,
+        do_sample=False,
+    )[0, len(input_ids):].tolist()
+    if output and output[-1] == EOS_TOKEN_ID:
+        output.pop()
+    return output
+
+
+async def async_test_each_caller_gets_its_own_completion() -> None:
+    """Prompts of different lengths and budgets, arriving at different times, match unbatched greedy decoding."""
+
+    model = make_tiny_model()
+    engine = BatchingEngine(
+        model, pad_token_id=PAD_TOKEN_ID, eos_token_ids=[EOS_TOKEN_ID], max_batch_size=3
+    )
+    prompts = [
+        ([5, 6, 7, 8, 9, 10, 11], 12),
+        ([12, 13], 5),
+        ([20, 21, 22, 23], 20),
+        ([30, 31, 32, 33, 34], 8),
+        ([40], 15),
+    ]
+
+    async def delayed(index: int, input_ids: list, max_new_tokens: int) -> list:
+        await asyncio.sleep(0.01 * index)
+        return await engine.generate(input_ids, max_new_tokens)
+
+    completions = await asyncio.gather(
+        *(delayed(index, *prompt) for index, prompt in enumerate(prompts))
+    )
+
+    for (input_ids, max_new_tokens), completion in zip(prompts, completions):
+        assert completion == reference_completion(model, input_ids, max_new_tokens)
+
+    stats = engine.metrics()
+    assert stats.completed == len(prompts) and stats.failed == 0
+    assert stats.mean_batch_size > 1
+
+
+async def async_test_closed_stream_leaves_the_batch() -> None:
+    """A stream closed early stops its sequence while the other caller finishes normally."""
+
+    model = make_tiny_model()
+    engine = BatchingEngine(model, pad_token_id=PAD_TOKEN_ID, eos_token_ids=[EOS_TOKEN_ID])
+
+    async def pieces():
+        async for token_id in engine.stream([20, 21, 22, 23], 20):
+            yield str(token_id)
+
+    stream = TokenStream(pieces())
+    other = asyncio.create_task(engine.generate([5, 6, 7, 8, 9, 10, 11], 12))
+    received = [await stream.__anext__() for _ in range(3)]
+    await stream.aclose()
+
+    assert received == [str(token_id) for token_id in reference_completion(model, [20, 21, 22, 23], 3)]
+    assert stream.metrics.cancelled and stream.metrics.tokens == 3
+    assert stream.metrics.time_to_first_token_seconds is not None
+    assert await other == reference_completion(model, [5, 6, 7, 8, 9, 10, 11], 12)
+
+
+async def async_test_cached_prefix_is_not_prefilled_again() -> None:
+    """A prompt sharing a cached prefix only prefills its new tokens and still decodes the same completion."""
+
+    model = make_tiny_model()
+    prefix_cache = PrefixCache(max_mb=16)
+    engine = BatchingEngine(
+        model,
+        pad_token_id=PAD_TOKEN_ID,
+        eos_token_ids=[EOS_TOKEN_ID],
+        prefix_cache=prefix_cache,
+    )
+    system = [5, 6, 7, 8]
+    first_turn = system + [12, 13]
+    second_turn = first_turn + [20, 21, 22]
+
+    await engine.generate(first_turn, 10, cache_boundaries=[len(system), len(first_turn)])
+    completions = await asyncio.gather(
+        engine.generate(second_turn, 10, cache_boundaries=[len(system)]),
+        engine.generate(system + [30, 31], 10),
+    )
+
+    assert completions[0] == reference_completion(model, second_turn, 10)
+    assert completions[1] == reference_completion(model, system + [30, 31], 10)
+    stats = prefix_cache.metrics()
+    assert stats.hits == 2 and stats.misses == 1
+    assert stats.reused_tokens == len(first_turn) + len(system)
+    assert stats.prefilled_tokens == len(first_turn) + 3 + 2
+    assert stats.entries == 2 and stats.prefill_seconds_saved > 0
+
+
+async def async_test_cancelled_queued_stream_frees_its_slot() -> None:
+    """A caller cancelled while waiting for a slot holds none, so later callers are not rejected."""
+
+    model = make_tiny_model()
+    engine = BatchingEngine(
+        model,
+        pad_token_id=PAD_TOKEN_ID,
+        eos_token_ids=[EOS_TOKEN_ID],
+        max_queue_size=1,
+        queue_timeout=2,
+    )
+
+    running = engine.stream([20, 21, 22, 23], 20)
+    await running.__anext__()
+    assert engine.metrics().active_requests == 1
+
+    queued = asyncio.create_task(engine.generate([5, 6, 7], 5))
+    await asyncio.sleep(0.05)
+    queued.cancel()
+    try:
+        await queued
+    except asyncio.CancelledError:
+        pass
+    await running.aclose()
+
+    assert engine.metrics().active_requests == 0
+    assert await engine.generate([5, 6, 7], 5) == reference_completion(model, [5, 6, 7], 5)
+    assert engine.metrics().active_requests == 0 and engine.metrics().rejected == 0
+
+
+def test_each_caller_gets_its_own_completion() -> None:
+    asyncio.run(async_test_each_caller_gets_its_own_completion())
+
+
+def test_closed_stream_leaves_the_batch() -> None:
+    asyncio.run(async_test_closed_stream_leaves_the_batch())
+
+
+def test_cached_prefix_is_not_prefilled_again() -> None:
+    asyncio.run(async_test_cached_prefix_is_not_prefilled_again())
+
+
+def test_cancelled_queued_stream_frees_its_slot() -> None:
+    asyncio.run(async_test_cancelled_queued_stream_frees_its_slot())
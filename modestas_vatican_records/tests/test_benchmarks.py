@@ -0,0 +1,33 @@
+import argparse
+import asyncio
+import json
+from pathlib import Path
+
+from benchmarks import rag
+
+
+def test_rag_benchmark_writes_a_report(tmp_path: Path) -> None:
+    """A minimal run with the stand-in models reports every stage, throughput, load time and memory."""
+
+    output = tmp_path / "benchmark_rag.json"
+    args = argparse.Namespace(
+        sessions=[1, 2],
+        queries_per_session=1,
+        max_new_tokens=4,
+        llm=None,
+        cross_encoder=None,
+        embedding_model=None,
+        output=output,
+    )
+
+    asyncio.run(rag.main(args))
+
+    report = json.loads(output.read_text())
+    assert [level["sessions"] for level in report["levels"]] == [1, 2]
+    for level in report["levels"]:
+        assert level["queries"] == level["sessions"]
+        assert level["queries_per_second"] > 0
+        for stage in ("expansion", "retrieval", "deduplication", "reranking", "generation", "total"):
+            assert level["latency"][stage]["p50_ms"] > 0
+    assert report["model_load_seconds"]["llm"] > 0
+    assert report["peak_rss_mb"] > 0
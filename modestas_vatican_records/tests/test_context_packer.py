@@ -0,0 +1,62 @@
+from tokenizers import Tokenizer
+from tokenizers.models import WordLevel
+from tokenizers.pre_tokenizers import Whitespace
+from transformers import PreTrainedTokenizerFast
+
+from chatbot.context_packer import ContextPacker, remove_overlaps
+
+
+def make_word_tokenizer() -> PreTrainedTokenizerFast:
+    """One token per whitespace-separated word, so token counts are easy to reason about."""
+
+    tokenizer = Tokenizer(WordLevel({"[UNK]": 0}, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = Whitespace()
+    return PreTrainedTokenizerFast(tokenizer_object=tokenizer, unk_token="[UNK]")
+
+
+def test_overlap_of_neighbouring_chunks_is_kept_once() -> None:
+    """Text shared with a better ranked chunk is stripped, contained chunks are dropped."""
+
+    shared = "the archive opens at nine in the morning"
+    first = f"Visitors register online. {shared}"
+    second = f"{shared} and closes at five."
+    contained = "register online"
+
+    documents, removed = remove_overlaps([second, first, contained], min_overlap=10)
+
+    assert documents == [second, "Visitors register online."]
+    assert removed == len(shared) + 1 + len(contained)
+
+
+def test_documents_are_packed_by_rank_until_the_budget() -> None:
+    """The best documents that fit are kept, in rank order."""
+
+    packer = ContextPacker(make_word_tokenizer(), token_budget=100, documents_token_budget=10)
+    documents = ["one two three four", "five six seven", "eight nine ten eleven", "twelve"]
+
+    packed, stats = packer.pack(documents)
+
+    assert packed == documents[:2]
+    assert stats.documents_dropped == 2
+    #* The separator is whitespace only, so it costs no tokens here
+    assert stats.document_tokens_before == 12 and stats.document_tokens_after == 7
+
+
+def test_history_is_trimmed_oldest_first() -> None:
+    """Once over budget, the history is cut to a share of it and the latest message is always kept."""
+
+    packer = ContextPacker(
+        make_word_tokenizer(), token_budget=40, documents_token_budget=10, history_trim_ratio=0.5
+    )
+    history = [{"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i} " + "word " * 4} for i in range(6)]
+
+    _, stats = packer.pack(["a b c d e"], history)
+
+    #* Every message is 6 words plus 4 template tokens, the history gets 40 - 5 = 35 tokens and is cut to 17
+    assert [message["content"].split()[1] for message in history] == ["5"]
+    assert stats.messages_trimmed == 5
+    assert stats.history_tokens_before == 60 and stats.history_tokens_after == 10
+    assert stats.tokens_saved == 50
+
+    _, stats = packer.pack(["a b c d e"], history)
+    assert stats.messages_trimmed == 0 and len(history) == 1
@@ -0,0 +1,118 @@
+import asyncio
+import json
+from pathlib import Path
+from typing import List
+
+import chromadb
+import pytest
+from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+from langchain.text_splitter import (
+    RecursiveCharacterTextSplitter,
+    SentenceTransformersTokenTextSplitter,
+)
+from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+from benchmarks.stand_in import CORPUS, build_tiny_sentence_transformer
+from chatbot import database
+from chatbot.config import CHARACTER_SPLIT_CHUNK_SIZE, CHUNK_OVERLAP, SEPARATORS, TOKENS_PER_CHUNK
+from chatbot.database import sync_collection
+from chatbot.utils.data_models import IngestionStats
+
+HELVETICA = DictionaryObject(
+    {
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    }
+)
+
+
+def write_pdf(path: Path, pages: List[str]) -> None:
+    """Writes a PDF with one line of text per page."""
+
+    writer = PdfWriter()
+    for text in pages:
+        page = writer.add_blank_page(612, 792)
+        page[NameObject("/Resources")] = DictionaryObject(
+            {NameObject("/Font"): DictionaryObject({NameObject("/F1"): HELVETICA})}
+        )
+        content = DecodedStreamObject()
+        content.set_data(f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode())
+        page.replace_contents(content)
+    writer.write(path)
+
+
+async def async_test_sync_processes_only_what_changed(directory: Path) -> None:
+    """An unchanged PDF is skipped, a changed one re-chunked without its old chunks, a removed one purged."""
+
+    embedding_model = build_tiny_sentence_transformer(directory / "embedding")
+    collection = chromadb.EphemeralClient().get_or_create_collection(
+        name=f"test_database_{directory.name}",
+        embedding_function=SentenceTransformerEmbeddingFunction(model_name=embedding_model),
+    )
+    articles = directory / "articles"
+    articles.mkdir()
+    manifest_path = directory / "ingestion_manifest.json"
+    version_path = directory / "collection.version"
+    titles = list(CORPUS)[:3]
+    for title in titles:
+        write_pdf(articles / f"{title}.pdf", CORPUS[title])
+
+    async def sync() -> IngestionStats:
+        return await sync_collection(
+            collection, articles, manifest_path, version_path, max_workers=1, batch_size=2
+        )
+
+    first = await sync()
+    assert first.files_added == 3 and first.files_failed == 0 and first.pages_extracted == 9
+    manifest = json.loads(manifest_path.read_text())
+    assert set(manifest) == {f"{title}.pdf" for title in titles}
+    assert sorted(collection.get(include=[])["ids"]) == sorted(
+        chunk_id for entry in manifest.values() for chunk_id in entry["chunk_ids"]
+    )
+
+    unchanged, changed, removed = (f"{title}.pdf" for title in titles)
+    write_pdf(articles / changed, CORPUS[titles[1]][:1] + ["Lockers are closed on Sundays."])
+    (articles / removed).unlink()
+    version = version_path.read_text()
+
+    second = await sync()
+    assert (second.files_unchanged, second.files_changed, second.files_removed, second.files_added) == (1, 1, 1, 0)
+    assert second.pages_extracted == 2
+    assert second.chunks_deleted == len(manifest[changed]["chunk_ids"]) + len(manifest[removed]["chunk_ids"])
+    rewritten = json.loads(manifest_path.read_text())
+    assert set(rewritten) == {unchanged, changed}
+    assert rewritten[unchanged] == manifest[unchanged]
+    assert rewritten[changed]["hash"] != manifest[changed]["hash"]
+    stored = collection.get(include=["documents"])
+    assert sorted(stored["ids"]) == sorted(
+        chunk_id for entry in rewritten.values() for chunk_id in entry["chunk_ids"]
+    )
+    assert any("closed on sundays" in document for document in stored["documents"])
+    assert version_path.read_text() != version
+
+    version = version_path.read_text()
+    third = await sync()
+    assert third.files_unchanged == 2 and not third.changed
+    assert third.pages_extracted == 0 and third.chunks_deleted == 0
+    assert version_path.read_text() == version
+
+
+def test_sync_processes_only_what_changed(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    #* The stand-in tokenizer for the token splitter, so the test needs no download
+    monkeypatch.setattr(
+        database,
+        "_SPLITTERS",
+        (
+            RecursiveCharacterTextSplitter(
+                separators=SEPARATORS, chunk_size=CHARACTER_SPLIT_CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP
+            ),
+            SentenceTransformersTokenTextSplitter(
+                model_name=build_tiny_sentence_transformer(tmp_path / "splitter"),
+                chunk_overlap=CHUNK_OVERLAP,
+                tokens_per_chunk=TOKENS_PER_CHUNK,
+            ),
+        ),
+    )
+    asyncio.run(async_test_sync_processes_only_what_changed(tmp_path))
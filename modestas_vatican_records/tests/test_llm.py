@@ -1,6 +1,7 @@
 import asyncio
-import time
+from pathlib import Path
 
+from benchmarks.stand_in import QUERIES, build_tiny_llm
 from chatbot.llm import LLM
 from chatbot.utils.free_torch_cache import free_torch_cache
 from chatbot.utils.logging_config import configure_logging
@@ -8,85 +9,65 @@ from chatbot.utils.logging_config import configure_logging
 Logger = configure_logging()
 
 
-async def async_test_extract_connectivity_details() -> None:
-    """Tests the extract_connectivity_details method asynchronously."""
+async def async_test_batched_and_sequential_answers_match(model_path: str) -> None:
+    """Greedy answers are the same with and without the continuous batching engine."""
 
-    llm_instance = LLM()
+    llm_instance = LLM(model_path, continuous_batching=True, max_new_tokens=16)
+    batched = await asyncio.gather(*(llm_instance.chat(query) for query in QUERIES[:3]))
 
-    start = time.time()
-    response = await llm_instance.extract_connectivity_details(
-        user_prompt="My sister lives in USA, my father resides in London and my mother is in Sweden, my sister uses Linux Ubuntu, my mother uses Windows, but I use macOS and I am from Japan"
-    )
-    Logger.info(f"Response: {response}")
-    Logger.info(f"Time taken: {time.time() - start:.2f} seconds")
-
-    start = time.time()
-    response = await llm_instance.extract_connectivity_details(
-        user_prompt="I'm using Windows"
-    )
-    Logger.info(f"Response: {response}")
-    Logger.info(f"Time taken: {time.time() - start:.2f} seconds")
-
-    start = time.time()
-    response = await llm_instance.extract_connectivity_details(
-        user_prompt="I'm from Lithuania"
-    )
-    Logger.info(f"Response: {response}")
-    Logger.info(f"Time taken: {time.time() - start:.2f} seconds")
+    llm_instance.engine = None
+    sequential = [await llm_instance.chat(query) for query in QUERIES[:3]]
 
-    start = time.time()
-    response = await llm_instance.extract_connectivity_details(
-        user_prompt="I've bought some discounted bananas"
-    )
-    Logger.info(f"Response: {response}")
-    Logger.info(f"Time taken: {time.time() - start:.2f} seconds")
+    assert batched == sequential
+    assert all(isinstance(answer, str) for answer in batched)
 
     device = llm_instance.device
     del llm_instance
     await free_torch_cache(device)
 
 
-async def async_test_determine_connectivity_issue_case() -> None:
-    """Tests the determine_connectivity_issue_case method asynchronously."""
-    
-    llm_instance = LLM()
+async def async_test_expand_querry_question(model_path: str) -> None:
+    """The original question comes first, followed by one entry per generated line."""
 
-    start = time.time()
-    response = await llm_instance.determine_connectivity_issue_case(
-        user_prompt="Hey, It seems that I am unable to connect to the VPN for some reason"
-    )
-    Logger.info(f"Response: {response}, Expected: True")
-    Logger.info(f"Time taken: {time.time() - start:.2f} seconds")
+    llm_instance = LLM(model_path, max_new_tokens=32)
 
-    start = time.time()
-    response = await llm_instance.determine_connectivity_issue_case(
-        user_prompt="Hey, my web browser says that there are no connection"
-    )
-    Logger.info(f"Response: {response}, Expected: True")
-    Logger.info(f"Time taken: {time.time() - start:.2f} seconds")
+    response = await llm_instance.expand_querry_question(user_prompt=QUERIES[0])
 
-    start = time.time()
-    response = await llm_instance.determine_connectivity_issue_case(
-        user_prompt="How to setup proxy on Deluge?"
+    assert response[0] == QUERIES[0]
+    assert len(response) >= 1
+
+
+async def async_test_rag_keeps_the_prompt_within_budget(model_path: str) -> None:
+    """A long conversation history is trimmed before it reaches the model."""
+
+    llm_instance = LLM(model_path, max_new_tokens=8)
+    llm_instance.context_packer.token_budget = 2000
+    conversation_history = [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"{QUERIES[i % len(QUERIES)]} " * 10}
+        for i in range(40)
+    ]
+
+    answer = await llm_instance.rag(
+        query=QUERIES[1],
+        documents=["The reading room opens at eight thirty."],
+        conversation_history=conversation_history,
     )
-    Logger.info(f"Response: {response}, Expected: False")
-    Logger.info(f"Time taken: {time.time() - start:.2f} seconds")
 
-    start = time.time()
-    response = await llm_instance.determine_connectivity_issue_case(
-        user_prompt="What is NordVPN?"
+    assert isinstance(answer, str)
+    assert 1 <= len(conversation_history) < 40
+    history_tokens = sum(
+        llm_instance.context_packer.count_tokens(message["content"]) for message in conversation_history
     )
-    Logger.info(f"Response: {response}, Expected: False")
-    Logger.info(f"Time taken: {time.time() - start:.2f} seconds")
+    assert history_tokens <= 2000
 
-    device = llm_instance.device
-    del llm_instance
-    await free_torch_cache(device)
+
+def test_batched_and_sequential_answers_match(tmp_path: Path) -> None:
+    asyncio.run(async_test_batched_and_sequential_answers_match(build_tiny_llm(tmp_path)))
 
 
-def test_extract_connectivity_details() -> None:
-    asyncio.run(async_test_extract_connectivity_details())
+def test_expand_querry_question(tmp_path: Path) -> None:
+    asyncio.run(async_test_expand_querry_question(build_tiny_llm(tmp_path)))
 
 
-def test_determine_connectivity_issue_case() -> None:
-    asyncio.run(async_test_determine_connectivity_issue_case())
+def test_rag_keeps_the_prompt_within_budget(tmp_path: Path) -> None:
+    asyncio.run(async_test_rag_keeps_the_prompt_within_budget(build_tiny_llm(tmp_path)))
@@ -0,0 +1,123 @@
+import asyncio
+import threading
+
+from chatbot.registry import ModelRegistry
+
+
+def make_loader(calls: list, name: str, delay: float = 0.0):
+    async def loader(**dependencies):
+        calls.append(name)
+        await asyncio.sleep(delay)
+        return {"name": name, **dependencies}
+
+    return loader
+
+
+async def async_test_resource_is_loaded_once() -> None:
+    """Concurrent sessions share one load of the resource."""
+
+    calls = []
+    registry = ModelRegistry()
+    registry.register("llm", make_loader(calls, "llm", delay=0.05))
+
+    resources = await asyncio.gather(*(registry.acquire("llm") for _ in range(5)))
+
+    assert calls == ["llm"]
+    assert all(resource is resources[0] for resource in resources)
+    stats = registry.metrics()["llm"]
+    assert stats.loaded and stats.loads == 1 and stats.hits == 4
+    assert stats.ref_count == 5 and stats.load_seconds > 0
+
+
+async def async_test_dependencies_are_passed_and_ref_counted() -> None:
+    """Dependencies are loaded first and held by the dependent resource."""
+
+    calls = []
+    registry = ModelRegistry()
+    registry.register("client", make_loader(calls, "client"))
+    registry.register("collection", make_loader(calls, "collection"), dependencies=("client",))
+
+    collection = await registry.acquire("collection")
+
+    assert collection["client"]["name"] == "client"
+    assert calls == ["client", "collection"]
+    assert registry.metrics()["client"].ref_count == 1
+
+
+async def async_test_memory_budget_evicts_unused_resources() -> None:
+    """Only resources no session holds are evicted, least recently used first."""
+
+    calls = []
+    registry = ModelRegistry(memory_budget_mb=1)
+    for name in ("llm", "reranker", "embedder"):
+        registry.register(name, make_loader(calls, name), size_function=lambda _: 600 * 1024)
+
+    await registry.acquire("llm")
+    await registry.release("llm")
+    await registry.acquire("reranker")
+    await registry.acquire("embedder")
+
+    metrics = registry.metrics()
+    assert not metrics["llm"].loaded and metrics["llm"].evictions == 1
+    assert metrics["reranker"].loaded and metrics["embedder"].loaded
+
+    await registry.acquire("llm")
+    assert calls.count("llm") == 2
+
+
+async def async_test_failed_load_can_be_retried() -> None:
+    """A failing loader does not leave a broken entry behind."""
+
+    attempts = []
+    registry = ModelRegistry()
+
+    async def loader():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OSError("weights not found")
+        return "llm"
+
+    registry.register("llm", loader)
+    try:
+        await registry.acquire("llm")
+        raise AssertionError("OSError expected")
+    except OSError:
+        pass
+
+    assert await registry.acquire("llm") == "llm"
+    assert registry.metrics()["llm"].ref_count == 1
+
+
+def test_resource_is_loaded_once() -> None:
+    asyncio.run(async_test_resource_is_loaded_once())
+
+
+def test_dependencies_are_passed_and_ref_counted() -> None:
+    asyncio.run(async_test_dependencies_are_passed_and_ref_counted())
+
+
+def test_memory_budget_evicts_unused_resources() -> None:
+    asyncio.run(async_test_memory_budget_evicts_unused_resources())
+
+
+def test_failed_load_can_be_retried() -> None:
+    asyncio.run(async_test_failed_load_can_be_retried())
+
+
+def test_warm_up_from_another_thread() -> None:
+    """A session waits for the load started by the warm-up thread instead of loading again."""
+
+    calls = []
+    registry = ModelRegistry()
+    registry.register("llm", make_loader(calls, "llm", delay=0.1))
+
+    thread = threading.Thread(target=asyncio.run, args=(registry.warm_up(),))
+    thread.start()
+    while not calls:
+        pass
+    resource = asyncio.run(registry.acquire("llm"))
+    thread.join()
+
+    assert resource["name"] == "llm"
+    assert calls == ["llm"]
+    assert registry.metrics()["llm"].ref_count == 1
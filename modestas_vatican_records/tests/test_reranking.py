@@ -0,0 +1,95 @@
+import asyncio
+from pathlib import Path
+
+import torch
+from tokenizers import Tokenizer
+from tokenizers.models import WordLevel
+from tokenizers.pre_tokenizers import Whitespace
+from transformers import BertConfig, BertForSequenceClassification, PreTrainedTokenizerFast
+
+from chatbot.reranking import Reranker
+
+WORDS = ["passport", "visa", "archive", "records", "pope", "letter", "rome", "vatican", "how", "do", "i", "apply"]
+
+
+def make_tiny_cross_encoder(directory: Path) -> str:
+    """Saves a randomly initialized, tiny cross encoder, so the test needs no download."""
+
+    vocab = {"[PAD]": 0, "[UNK]": 1, "[CLS]": 2, "[SEP]": 3}
+    vocab.update({word: index + 4 for index, word in enumerate(WORDS)})
+    tokenizer = Tokenizer(WordLevel(vocab, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = Whitespace()
+    PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer,
+        pad_token="[PAD]",
+        unk_token="[UNK]",
+        cls_token="[CLS]",
+        sep_token="[SEP]",
+        model_max_length=64,
+    ).save_pretrained(directory)
+
+    torch.manual_seed(0)
+    config = BertConfig(
+        vocab_size=len(vocab),
+        hidden_size=32,
+        intermediate_size=64,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        max_position_embeddings=64,
+        num_labels=1,
+    )
+    BertForSequenceClassification(config).eval().save_pretrained(directory)
+    return str(directory)
+
+
+async def async_test_scores_are_cached_per_query_and_chunk(tmp_path: Path) -> None:
+    """Chunks already scored for a query are not scored again, in any order and batch size."""
+
+    reranker = Reranker(make_tiny_cross_encoder(tmp_path), backend="torch", device="cpu", batch_size=2)
+    documents = ["vatican archive records", "pope letter", "rome visa", "how do i apply"]
+
+    reranked = await reranker.rerank("vatican records", documents, num_retrieve_documents=4)
+    reference = reranker.cross_encoder.predict([["vatican records", document] for document in documents])
+    assert reranked == [documents[i] for i in reference.argsort()[::-1]]
+
+    again = await reranker.rerank("vatican records", documents[::-1] + ["passport"], num_retrieve_documents=5)
+    assert [document for document in again if document != "passport"] == reranked
+
+    metrics = reranker.metrics()
+    assert metrics.misses == 5 and metrics.hits == 4
+    assert metrics.batches == 3 and metrics.entries == 5
+
+
+async def async_test_score_threshold_keeps_the_best_chunk(tmp_path: Path) -> None:
+    """Chunks below the threshold are dropped, but the prompt never ends up without context."""
+
+    reranker = Reranker(make_tiny_cross_encoder(tmp_path), backend="torch", device="cpu")
+    documents = ["vatican archive records", "pope letter", "rome visa"]
+
+    ranked = await reranker.rerank_with_scores("vatican records", documents, score_threshold=1.1)
+    assert len(ranked) == 1
+    assert ranked[0][1] == max(score for _, score in await reranker.rerank_with_scores("vatican records", documents, score_threshold=None))
+    assert reranker.metrics().dropped == 2
+
+
+async def async_test_lru_cache_is_bounded(tmp_path: Path) -> None:
+    """The least recently used scores are evicted above the cache capacity."""
+
+    reranker = Reranker(make_tiny_cross_encoder(tmp_path), backend="quantized", cache_max_entries=2)
+    await reranker.score("pope", ["rome", "letter", "visa"])
+
+    metrics = reranker.metrics()
+    assert metrics.entries == 2 and metrics.evictions == 1
+    assert reranker.cross_encoder.device.type == "cpu"
+
+
+def test_scores_are_cached_per_query_and_chunk(tmp_path: Path) -> None:
+    asyncio.run(async_test_scores_are_cached_per_query_and_chunk(tmp_path))
+
+
+def test_score_threshold_keeps_the_best_chunk(tmp_path: Path) -> None:
+    asyncio.run(async_test_score_threshold_keeps_the_best_chunk(tmp_path))
+
+
+def test_lru_cache_is_bounded(tmp_path: Path) -> None:
+    asyncio.run(async_test_lru_cache_is_bounded(tmp_path))
@@ -0,0 +1,197 @@
+import asyncio
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import chromadb
+import pytest
+from chromadb.api.models import Collection
+from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+
+from benchmarks.stand_in import (
+    CORPUS,
+    QUERIES,
+    build_tiny_cross_encoder,
+    build_tiny_llm,
+    build_tiny_sentence_transformer,
+)
+from chatbot import session
+from chatbot.batching import BatchingEngine
+from chatbot.database import chunk_ids, upsert_chunks
+from chatbot.llm import LLM
+from chatbot.reranking import Reranker
+
+
+async def make_pipeline(directory: Path) -> Tuple[Collection, LLM, Reranker]:
+    """The stand-in collection of the fixed corpus, LLM and reranker."""
+
+    embedding_function = SentenceTransformerEmbeddingFunction(
+        model_name=build_tiny_sentence_transformer(directory / "embedding")
+    )
+    collection = chromadb.EphemeralClient().get_or_create_collection(
+        name=f"test_session_{directory.name}", embedding_function=embedding_function
+    )
+    for title, chunks in CORPUS.items():
+        await upsert_chunks(
+            collection, chunk_ids(title, chunks), chunks, [{"title": title}] * len(chunks)
+        )
+    llm = LLM(build_tiny_llm(directory / "llm"), max_new_tokens=16)
+    reranker = Reranker(build_tiny_cross_encoder(directory / "cross_encoder"))
+    return collection, llm, reranker
+
+
+def record_queries(monkeypatch: pytest.MonkeyPatch) -> List[List[str]]:
+    """Records the query texts of every query_collection() call."""
+
+    queries: List[List[str]] = []
+    query_collection = session.query_collection
+
+    async def recording_query_collection(collection: Collection, query_texts: List[str]):
+        queries.append(query_texts)
+        return await query_collection(collection, query_texts)
+
+    monkeypatch.setattr(session, "query_collection", recording_query_collection)
+    return queries
+
+
+async def async_test_expansion_runs_during_first_pass_retrieval(
+    directory: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """The expansion only finishes once the first-pass query started, and its questions are retrieved afterwards."""
+
+    collection, llm, reranker = await make_pipeline(directory)
+    queries = record_queries(monkeypatch)
+    expand_querry_question = llm.expand_querry_question
+    expanded: List[str] = []
+
+    async def waiting_expansion(user_prompt: str) -> List[str]:
+        #* Without a concurrent first pass, this would wait forever
+        while not queries:
+            await asyncio.sleep(0.001)
+        expanded.extend(await expand_querry_question(user_prompt))
+        return expanded
+
+    monkeypatch.setattr(llm, "expand_querry_question", waiting_expansion)
+    timings: Dict[str, float] = {}
+
+    documents, titles = await asyncio.wait_for(
+        session.retrieve_context(QUERIES[1], collection, llm, reranker, timings), timeout=60
+    )
+
+    expanded_texts = [text.strip() for text in expanded if text.strip() and text.strip() != QUERIES[1]]
+    assert queries[0] == [QUERIES[1]]
+    assert queries[1:] == ([expanded_texts] if expanded_texts else [])
+    assert {"expansion", "retrieval", "deduplication", "reranking", "retrieve_context"} <= set(timings)
+    assert documents and titles and set(titles) <= set(CORPUS)
+
+
+async def async_test_close_first_pass_skips_and_cancels_the_expansion(
+    directory: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """A first pass within EXPANSION_SKIP_MAX_DISTANCE cancels the running expansion and frees its engine slot."""
+
+    collection, llm, reranker = await make_pipeline(directory)
+    queries = record_queries(monkeypatch)
+    monkeypatch.setattr(session, "EXPANSION_SKIP_MAX_DISTANCE", float("inf"))
+    expand_querry_question = llm.expand_querry_question
+    cancelled = asyncio.Event()
+
+    async def recording_expansion(user_prompt: str) -> List[str]:
+        try:
+            return await expand_querry_question(user_prompt)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    monkeypatch.setattr(llm, "expand_querry_question", recording_expansion)
+    active_requests = llm.engine.metrics().active_requests
+    timings: Dict[str, float] = {}
+
+    documents, titles = await session.retrieve_context(QUERIES[1], collection, llm, reranker, timings)
+    await asyncio.wait_for(cancelled.wait(), timeout=5)
+    await asyncio.sleep(0.1)
+
+    assert queries == [[QUERIES[1]]]
+    assert "expanded_retrieval" not in timings
+    assert documents and titles
+    assert llm.engine.metrics().active_requests == active_requests
+
+
+async def async_test_expansion_cancelled_while_queued_frees_no_slot(
+    directory: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """An expansion cancelled while waiting for an engine slot leaves the slot count as it was."""
+
+    collection, llm, reranker = await make_pipeline(directory)
+    monkeypatch.setattr(session, "EXPANSION_SKIP_MAX_DISTANCE", float("inf"))
+    llm.engine = BatchingEngine(
+        llm.model,
+        pad_token_id=llm.engine.pad_token_id,
+        eos_token_ids=llm.engine.eos_token_ids,
+        max_queue_size=1,
+    )
+
+    #* Another caller holds the only slot, so the expansion queues until it is cancelled
+    running = llm.engine.stream(llm.tokenizer.encode(QUERIES[0]), 64)
+    await running.__anext__()
+    await session.retrieve_context(QUERIES[1], collection, llm, reranker)
+    await asyncio.sleep(0.1)
+    assert llm.engine.metrics().active_requests == 1 and llm.engine.metrics().requests == 1
+
+    await running.aclose()
+    await asyncio.sleep(0.1)
+
+    assert llm.engine.metrics().active_requests == 0
+    assert await llm.chat(QUERIES[2], max_new_tokens=4) is not None
+    assert llm.engine.metrics().rejected == 0
+
+
+async def async_test_back_to_back_messages_keep_roles_alternating(directory: Path) -> None:
+    """A message sent while the previous answer streams adds that partial answer before the new question."""
+
+    collection, llm, reranker = await make_pipeline(directory)
+    conversation_history: List[Dict[str, str]] = []
+    first_piece = asyncio.Event()
+
+    async def slow_reader(piece: str) -> None:
+        first_piece.set()
+        await asyncio.sleep(3600)
+
+    async def reader(piece: str) -> None:
+        pass
+
+    #* Cancelled while streaming: the partial answer stays, right after its question
+    first = asyncio.create_task(
+        session.answer_turn(QUERIES[0], collection, conversation_history, llm, reranker, slow_reader)
+    )
+    await asyncio.wait_for(first_piece.wait(), timeout=60)
+    await session.cancel_answer(first)
+    await session.answer_turn(QUERIES[1], collection, conversation_history, llm, reranker, reader)
+
+    #* Cancelled before any answer text: the turn is dropped
+    third = asyncio.create_task(
+        session.answer_turn(QUERIES[2], collection, conversation_history, llm, reranker, reader)
+    )
+    await asyncio.sleep(0)
+    await session.cancel_answer(third)
+    await session.answer_turn(QUERIES[3], collection, conversation_history, llm, reranker, reader)
+
+    assert [message["role"] for message in conversation_history] == ["user", "assistant"] * 3
+    assert [message["content"] for message in conversation_history[::2]] == [QUERIES[0], QUERIES[1], QUERIES[3]]
+    assert first.cancelled() and third.cancelled()
+    assert all(message["content"] for message in conversation_history[1::2])
+
+
+def test_expansion_runs_during_first_pass_retrieval(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    asyncio.run(async_test_expansion_runs_during_first_pass_retrieval(tmp_path, monkeypatch))
+
+
+def test_close_first_pass_skips_and_cancels_the_expansion(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    asyncio.run(async_test_close_first_pass_skips_and_cancels_the_expansion(tmp_path, monkeypatch))
+
+
+def test_expansion_cancelled_while_queued_frees_no_slot(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    asyncio.run(async_test_expansion_cancelled_while_queued_frees_no_slot(tmp_path, monkeypatch))
+
+
+def test_back_to_back_messages_keep_roles_alternating(tmp_path: Path) -> None:
+    asyncio.run(async_test_back_to_back_messages_keep_roles_alternating(tmp_path))